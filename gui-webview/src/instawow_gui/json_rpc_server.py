@@ -28,6 +28,7 @@ from yarl import URL
 
 from instawow import __version__, db, matchers, models
 from instawow import results as R
+from instawow.addon_dir_watcher import AddonDirModel, AddonDirWatcher
 from instawow.common import Strategy
 from instawow.config import Config
 from instawow.manager import Manager, TraceRequestCtx, init_web_client, is_outdated
@@ -173,7 +174,7 @@ class ListInstalledParams(_ProfileParamMixin, BaseParams):
             .mappings()
             .all()
         )
-        return [models.Pkg.from_row_mapping(manager.database, p) for p in installed_pkgs]
+        return models.Pkg.from_row_mappings(manager.database, installed_pkgs)
 
 
 class SuccessResult(TypedDict):
@@ -463,21 +464,40 @@ class _ManagerWorkQueue:
     def __init__(self) -> None:
         self._loop = asyncio.get_running_loop()
         self._managers: dict[str, Manager] = {}
+        self._addon_dir_watchers: dict[str, AddonDirWatcher] = {}
         self._queue: asyncio.Queue[_ManagerWorkQueueItem] = asyncio.Queue()
         self._progress_reporters: set[tuple[Manager, models.Pkg, Callable[[], float]]] = set()
         self._web_client = _init_json_rpc_web_client(self._progress_reporters)
         self._locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
     async def cleanup(self) -> None:
+        for addon_dir_watcher in self._addon_dir_watchers.values():
+            addon_dir_watcher.close()
         for manager in self._managers.values():
             manager.database.close()
         await self._web_client.close()
 
     def unload(self, profile: str) -> None:
+        addon_dir_watcher = self._addon_dir_watchers.pop(profile, None)
+        if addon_dir_watcher:
+            addon_dir_watcher.close()
         manager = self._managers.pop(profile, None)
         if manager:
             manager.database.close()
 
+    async def _watch_addon_dir(self, manager: Manager) -> None:
+        addon_dir_watcher = AddonDirWatcher(
+            AddonDirModel(manager.config.addon_dir, manager.config.game_flavour)
+        )
+        try:
+            await addon_dir_watcher.start()
+        except OSError:
+            logger.exception(f'unable to watch {manager.config.addon_dir}')
+            addon_dir_watcher.close()
+        else:
+            self._addon_dir_watchers[manager.config.profile] = addon_dir_watcher
+            manager.addon_dir_model = addon_dir_watcher.model
+
     async def listen(self) -> None:
         async def schedule(
             future: asyncio.Future[Any], profile: str, coro_fn: Callable[..., Awaitable[Any]]
@@ -491,6 +511,8 @@ class _ManagerWorkQueue:
                             config = await t(Config.read)(profile)
 
                         manager = self._managers[profile] = Manager.from_config(config)
+                        if config.watch_addon_dir:
+                            await self._watch_addon_dir(manager)
 
                 result = await coro_fn(manager)
             except BaseException as exc:
@@ -22,70 +22,147 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable
 from itertools import count, islice
 from operator import eq
 import re
 import string
-from typing import Any, Container
+from typing import Any
 
 DIGITS = frozenset(string.digits)
-HEXDIGITS = frozenset(string.hexdigits)
 HEXDELIMS = frozenset('Xx')
 EXPONENTS = frozenset('Ee')
-WHITESPACE = frozenset(string.whitespace)
-WHITESPACE_OR_CLOSING_SQ_BR = WHITESPACE | frozenset(']')
-NEWLINE = frozenset('\r\n')
 KEYWORDS = {'true': True, 'false': False, 'nil': None}
 
-match_bare_word = re.compile(r'^[a-z_]\w*$', flags=re.IGNORECASE)
+# The text is tokenised with regular expressions rather than being read
+# one character at a time.  ``_match_element`` and ``_match_value`` match
+# the tokens which make up the bulk of saved variables; everything else -
+# long strings, unterminated strings, malformed numbers and so on - falls
+# through to the ``_decode_*`` methods
+
+
+def _make_value_pattern(prefix: str) -> str:
+    return rf'''
+    [ \t\n\r\x0b\x0c]*
+    (?:
+        (?P<{prefix}table>\{{)
+        | "(?P<{prefix}dq_string>[^"\\]*(?:\\[\s\S][^"\\]*)*)"
+        | '(?P<{prefix}sq_string>[^'\\]*(?:\\[\s\S][^'\\]*)*)'
+        | (?P<{prefix}number>0[xX][0-9A-Fa-f]*|-?[0-9]+(?:\.[0-9]*)?(?:[eE][\s\S]?[0-9]*)?)
+        | (?P<{prefix}comment>--[^\r\n]*)
+        | (?P<{prefix}word>(?i:[a-z_])\w*\n?)[\s\S]?
+    )
+    '''
+
+
+_match_value = re.compile(_make_value_pattern(''), flags=re.VERBOSE).match
+# Matches ``["key"] = value`` and ``[1] = value``, a key-less value,
+# or the end of the table, skipping over any preceding commas
+_element_pattern = re.compile(
+    rf'''
+    [ \t\n\r\x0b\x0c,]*
+    (?:
+        \[ [ \t\n\r\x0b\x0c]*
+        (?:
+            "(?P<dq_key>[^"\\]*(?:\\[\s\S][^"\\]*)*)"
+            | (?P<number_key>-?[0-9]+(?:\.[0-9]*)?)
+        )
+        [ \t\n\r\x0b\x0c\]]* = {_make_value_pattern('entry_')}
+        | (?P<end>\}})
+        | {_make_value_pattern('item_')}
+    )
+    ''',
+    flags=re.VERBOSE,
+)
+_match_element = _element_pattern.match
+_ELEMENT_END = _element_pattern.groupindex['end']
+_value_kinds = {
+    f'{p}{k}': k
+    for p in ['', 'entry_', 'item_']
+    for k in ['table', 'dq_string', 'sq_string', 'number', 'comment', 'word']
+}
+
+
+def _make_skipper(pattern: str) -> Callable[[str, int], int]:
+    match = re.compile(pattern).match
+
+    def skip(text: str, pos: int) -> int:
+        # The pattern matches the empty string so a match is always found
+        run = match(text, pos)
+        assert run
+        return run.end()
+
+    return skip
+
+
+_skip_whitespace = _make_skipper(r'[ \t\n\r\x0b\x0c]*')
+_skip_whitespace_or_commas = _make_skipper(r'[ \t\n\r\x0b\x0c,]*')
+_skip_whitespace_or_closing_sq_br = _make_skipper(r'[ \t\n\r\x0b\x0c\]]*')
+_skip_closing_sq_brs = _make_skipper(r'\]*')
+_skip_opening_sq_brs = _make_skipper(r'\[*')
+_skip_digits = _make_skipper(r'[0-9]*')
+_skip_hexdigits = _make_skipper(r'[0-9A-Fa-f]*')
+_search_newline = re.compile(r'[\r\n]').search
+# ``$`` matches before a trailing newline - a bare word which is immediately
+# followed by a newline is suffixed with it
+_match_bare_word = re.compile(r'[a-z_]\w*\n?', flags=re.IGNORECASE).match
 
 
 class ParseError(Exception):
     pass
 
 
-class _Sentinel(str):
-    pass
-
-
-_sentinel = _Sentinel()
+def _parse_number(n: str):
+    try:
+        return int(n, 0)
+    except ValueError:
+        return float(n)
 
 
 class SLPP:
     def __init__(self, text: str):
-        self._iter_text = iter(text)
-        self._next()
-
-    def _next(self):
-        self.c = next(self._iter_text, _sentinel)
-
-    def _next_eq(self, includes: Container[str]):
-        if self.c not in includes:
-            for c in self._iter_text:
-                if c in includes:
-                    self.c = c
-                    break
-            else:
-                self.c = _sentinel
-
-    def _next_not_eq(self, excludes: Container[str]):
-        if self.c in excludes:
-            for c in self._iter_text:
-                if c not in excludes:
-                    self.c = c
-                    break
-            else:
-                self.c = _sentinel
+        self._text = text
+        self._pos = 0
+
+    def _decode_matched_value(self, match: re.Match[str]) -> tuple[Any, int]:
+        # The value is always captured by the last group to match
+        lastgroup = match.lastgroup
+        assert lastgroup
+        kind = _value_kinds[lastgroup]
+        if kind == 'dq_string':
+            return (match[lastgroup].replace('\\"', '"'), match.end())
+        elif kind == 'number':
+            return (_parse_number(match[lastgroup]), match.end())
+        elif kind == 'table':
+            return self._decode_table(match.end() - 1)
+        elif kind == 'word':
+            word: str = match[lastgroup]
+            return (KEYWORDS.get(word, word), match.end())
+        elif kind == 'sq_string':
+            return (match[lastgroup].replace("\\'", "'"), match.end())
+        else:
+            return (None, match.end())
 
-    def _decode_table(self):
+    def _decode_table(self, pos: int) -> tuple[Any, int]:
+        text = self._text
         table: dict[Any, Any] | list[Any] = {}
         idx = 0
 
-        self._next()
+        pos += 1
         while True:
-            self._next_not_eq(WHITESPACE)
+            is_val_long_string_literal = False
+
+            element_match = _match_element(text, pos)
+            if element_match is None:
+                pos = _skip_whitespace_or_commas(text, pos)
+                if text[pos : pos + 1] == '[':
+                    pos += 1
+                    if text[pos : pos + 1] == '[':
+                        is_val_long_string_literal = True
+
+                item, pos = self._decode_value(pos)
 
-            if self.c == '}':
+            elif element_match.lastindex == _ELEMENT_END:
 
                 # Convert table to list if k(0) = 1 and k = k(n-1) + 1, ...
                 if (
@@ -96,167 +173,148 @@ class SLPP:
                 ):
                     table = list(table.values())
 
-                self._next()
-                return table
+                return (table, element_match.end())
 
-            elif self.c == ',':
+            elif element_match.lastindex is not None and element_match.lastindex < _ELEMENT_END:
 
-                self._next()
+                value, pos = self._decode_matched_value(element_match)
+                item = element_match['dq_key']
+                if item is not None:
+                    if value is not None:
+                        table[item.replace('\\"', '"')] = value
+                else:
+                    item = _parse_number(element_match['number_key'])
+                    if value is not None and (not isinstance(item, int) or item > idx):
+                        table[item] = value
+                continue
 
             else:
+                item, pos = self._decode_matched_value(element_match)
 
-                is_val_long_string_literal = False
-
-                if self.c == '[':
-                    self._next()
-                    if self.c == '[':
-                        is_val_long_string_literal = True
+            pos = _skip_whitespace_or_closing_sq_br(text, pos)
 
-                item = self.decode()
-                self._next_not_eq(WHITESPACE_OR_CLOSING_SQ_BR)
+            c = text[pos : pos + 1]
+            if c == '=' or c == ',':
+                pos += 1
 
-                c = self.c
-                if c and c in '=,':
-                    self._next()
+                if c == '=':
+                    if is_val_long_string_literal:
+                        raise ParseError('malformed key', item)
 
-                    if c == '=':
-                        if is_val_long_string_literal:
-                            raise ParseError('malformed key', item)
+                    # nil key produces a runtime error in Lua
+                    if item is None:
+                        raise ParseError('table keys cannot be nil')
 
-                        # nil key produces a runtime error in Lua
-                        if item is None:
-                            raise ParseError('table keys cannot be nil')
+                    # Item is a key
+                    value, pos = self._decode_value(pos)
+                    if (
+                        # nil values are not persisted in Lua tables
+                        value is not None
+                        # Where the key is a valid index key-less values take precedence
+                        and (not isinstance(item, int) or isinstance(item, bool) or item > idx)
+                    ):
+                        table[item] = value
+                    continue
 
-                        # Item is a key
-                        value = self.decode()
-                        if (
-                            # nil values are not persisted in Lua tables
-                            value is not None
-                            # Where the key is a valid index key-less values take precedence
-                            and (not isinstance(item, int) or isinstance(item, bool) or item > idx)
-                        ):
-                            table[item] = value
-                        continue
-
-                if item is not None:
-                    idx += 1
-                    table[idx] = item
+            if item is not None:
+                idx += 1
+                table[idx] = item
 
-    def _decode_string(self):
-        s = ''
-        start = self.c
-        end = None
-        prev_was_slash = False
+    def _decode_string(self, pos: int) -> tuple[str, int]:
+        text = self._text
+        start = text[pos]
 
         if start == '[':
-            self._next_not_eq('[')
-            s += self.c
-            end = ']'
-        else:
-            end = start
-
-        for c in self._iter_text:
-            if prev_was_slash:
-                prev_was_slash = False
+            # The first character is taken verbatim, even if it is a closing bracket
+            content_start = _skip_opening_sq_brs(text, pos)
+            end = text.find(']', content_start + 1)
+            if end == -1:
+                return (text[content_start:], len(text))
 
-                if c != end:
-                    s += '\\'
-            elif c == end:
-                break
-            elif c == '\\' and start == end:
-                prev_was_slash = True
-                continue
-
-            s += c
-
-        self._next()
-        if start != end:
             # Strip multiple closing brackets
-            self._next_not_eq(end)
-
-        return s
-
-    def _decode_bare_word(self):
-        s = self.c
-        for c in self._iter_text:
-            new_s = s + c
-            if match_bare_word.match(new_s):
-                s = new_s
-            else:
+            return (text[content_start:end], _skip_closing_sq_brs(text, end))
+
+        content_start = pos + 1
+        end = text.find(start, content_start)
+        while end != -1:
+            # The quote is escaped if it's preceded by an odd number of backslashes
+            backslash_start = end
+            while backslash_start > content_start and text[backslash_start - 1] == '\\':
+                backslash_start -= 1
+            if not (end - backslash_start) % 2:
                 break
+            end = text.find(start, end + 1)
+
+        if end == -1:
+            s = text[content_start:]
+            pos = len(text)
+            # A dangling backslash is discarded
+            if (len(s) - len(s.rstrip('\\'))) % 2:
+                s = s[:-1]
+        else:
+            s = text[content_start:end]
+            pos = end + 1
 
-        self._next()
-        return KEYWORDS.get(s, s)
-
-    def _decode_number(self):
-        def get_digits():
-            n = ''
-
-            for c in self._iter_text:
-                if c in DIGITS:
-                    n += c
-                else:
-                    self.c = c
-                    break
-            else:
-                self.c = _sentinel
+        # Escaped quotes are unescaped but all other escape sequences are left alone
+        return (s.replace('\\' + start, start), pos)
 
-            return n
+    def _decode_bare_word(self, pos: int) -> tuple[Any, int]:
+        text = self._text
+        match = _match_bare_word(text, pos)
+        end = match.end() if match else pos + 1
+        s = text[pos:end]
+        # The character following the word is skipped
+        return (KEYWORDS.get(s, s), min(end + 1, len(text)))
 
-        n = ''
+    def _decode_number(self, pos: int) -> tuple[Any, int]:
+        text = self._text
+        start = pos
 
-        if self.c == '-':
-            c = self.c
-            self._next()
-            if self.c == '-':
+        if text[pos] == '-':
+            pos += 1
+            c = text[pos : pos + 1]
+            if c == '-':
 
                 # This is a comment - skip to the end of the line
-                self._next_eq(NEWLINE)
-                return None
-
-            elif not self.c or self.c not in DIGITS:
-                raise ParseError('malformed number (no digits after minus sign)', c + self.c)
-
-            n += c
+                match = _search_newline(text, pos + 1)
+                return (None, match.start() if match else len(text))
 
-        n += self.c + get_digits()
-        if n == '0' and self.c in HEXDELIMS:
+            elif not c or c not in DIGITS:
+                raise ParseError('malformed number (no digits after minus sign)', '-' + c)
 
-            n += self.c
+        pos = _skip_digits(text, pos)
+        if text[start:pos] == '0' and text[pos : pos + 1] in HEXDELIMS:
 
-            for c in self._iter_text:
-                if c in HEXDIGITS:
-                    n += c
-                else:
-                    self.c = c
-                    break
-            else:
-                self.c = _sentinel
+            pos = _skip_hexdigits(text, pos + 1)
 
         else:
 
-            if self.c == '.':
-                n += self.c + get_digits()
+            if text[pos : pos + 1] == '.':
+                pos = _skip_digits(text, pos + 1)
 
-            if self.c in EXPONENTS:
-                n += self.c
-                self._next()  # +-
-                n += self.c + get_digits()
+            if text[pos : pos + 1] in EXPONENTS:
+                # The exponent's sign, or whatever character is in its place,
+                # is taken verbatim
+                pos = _skip_digits(text, min(pos + 2, len(text)))
 
-        try:
-            return int(n, 0)
-        except ValueError:
-            return float(n)
+        return (_parse_number(text[start:pos]), pos)
 
-    def decode(self):
-        self._next_not_eq(WHITESPACE)
-        if not self.c:
+    def _decode_value(self, pos: int) -> tuple[Any, int]:
+        value_match = _match_value(self._text, pos)
+        if value_match:
+            return self._decode_matched_value(value_match)
+
+        pos = _skip_whitespace(self._text, pos)
+        c = self._text[pos : pos + 1]
+        if not c:
             raise ParseError('input is empty')
-        elif self.c == '{':
-            return self._decode_table()
-        elif self.c in '\'"[':
-            return self._decode_string()
-        elif self.c == '-' or self.c in DIGITS:
-            return self._decode_number()
+        elif c in '\'"[':
+            return self._decode_string(pos)
+        elif c == '-' or c in DIGITS:
+            return self._decode_number(pos)
         else:
-            return self._decode_bare_word()
+            return self._decode_bare_word(pos)
+
+    def decode(self):
+        value, self._pos = self._decode_value(self._pos)
+        return value
@@ -3,5 +3,7 @@
 import typing as _typing
 
 if _typing.TYPE_CHECKING:
+    import zipfile
+
     import aiohttp
     import prompt_toolkit.shortcuts
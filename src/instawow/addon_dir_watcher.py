@@ -0,0 +1,343 @@
+"""Keep track of the contents of the add-on folder.
+
+An ``AddonDirModel`` is a snapshot of the add-on folder and of the TOC files
+of its add-ons, which an ``AddonDirWatcher`` keeps up to date as the folder
+changes.  This spares long-running processes, i.e. the JSON-RPC server, from
+rescanning the add-on folder whenever they need to know what's in it.
+Changes are picked up with inotify on Linux and by polling the add-on folder
+everywhere else.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable, Iterator
+import ctypes
+import ctypes.util
+import errno
+import os
+from pathlib import Path
+import struct
+import sys
+import threading
+
+from loguru import logger
+
+from .config import Flavour
+from .matchers import AddonFolder, get_toc_path
+from .utils import TocReader
+from .utils import run_in_thread as t
+
+# See ``inotify(7)``
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+
+_IN_ADDON_DIR_MASK = (
+    _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+_IN_ADDON_FOLDER_MASK = (
+    _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_MODIFY | _IN_CLOSE_WRITE
+)
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class AddonDirModel:
+    """An in-memory model of the add-on folder.
+
+    Every entry in the add-on folder is tracked by name; add-on folders
+    are mapped to an ``AddonFolder`` and everything else to ``None``.
+    """
+
+    def __init__(self, addon_dir: Path, game_flavour: Flavour) -> None:
+        self.addon_dir = addon_dir
+        self.game_flavour = game_flavour
+        self._entries: dict[str, AddonFolder | None] = {}
+        self._lock = threading.Lock()
+
+    def _read_entry(self, name: str) -> AddonFolder | None:
+        path = self.addon_dir / name
+        if path.is_symlink() or not path.is_dir():
+            return None
+
+        toc_path = get_toc_path(path, self.game_flavour)
+        if toc_path is None:
+            return None
+        try:
+            return AddonFolder(name, TocReader.from_addon_path(path, toc_path.name[len(name) :]))
+        except FileNotFoundError:
+            return None
+
+    def scan(self) -> None:
+        "Scan the add-on folder in its entirety."
+        from concurrent.futures import ThreadPoolExecutor
+
+        try:
+            with os.scandir(self.addon_dir) as dir_entries:
+                names = [e.name for e in dir_entries]
+        except FileNotFoundError:
+            names = []
+
+        with ThreadPoolExecutor() as executor:
+            entries = dict(zip(names, executor.map(self._read_entry, names)))
+        with self._lock:
+            self._entries = entries
+
+    def update(self, names: Iterable[str]) -> None:
+        "Re-examine the named entries in the add-on folder."
+        for name in set(names):
+            exists = os.path.lexists(self.addon_dir / name)
+            entry = self._read_entry(name) if exists else None
+            with self._lock:
+                if exists:
+                    self._entries[name] = entry
+                else:
+                    self._entries.pop(name, None)
+
+    def get_names(self) -> frozenset[str]:
+        "Retrieve the names of every entry in the add-on folder."
+        with self._lock:
+            return frozenset(self._entries)
+
+    def get_addon_folders(self) -> list[AddonFolder]:
+        "Retrieve the add-on folders which have a TOC file for the game flavour."
+        with self._lock:
+            return [a for a in self._entries.values() if a]
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._check(self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+
+    def _check(self, value: int, path: str | None = None) -> int:
+        if value < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return value
+
+    def add_watch(self, path: str, mask: int) -> int:
+        return self._check(self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask), path)
+
+    def read_events(self) -> Iterator[tuple[int, int, str]]:
+        try:
+            buffer = os.read(self.fd, 2**16)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b'\x00'))
+            offset += length
+            yield (wd, mask, name)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class AddonDirWatcher:
+    "Keep an ``AddonDirModel`` up to date with changes to the add-on folder."
+
+    # How long to wait for changes to settle before applying them
+    debounce_interval = 0.1
+    # How often to look for changes when inotify is unavailable
+    poll_interval = 2.0
+
+    def __init__(self, model: AddonDirModel, use_inotify: bool = sys.platform == 'linux') -> None:
+        self.model = model
+        self._use_inotify = use_inotify
+        self._inotify: _Inotify | None = None
+        self._folder_wds: dict[int, str] = {}
+        self._watched_folders: dict[str, int] = {}
+        self._addon_dir_wd: int | None = None
+        self._changed_names: set[str] = set()
+        self._rescan = False
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task[None] | None = None
+        self._poll_task: asyncio.Task[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def is_using_inotify(self) -> bool:
+        return self._inotify is not None
+
+    async def start(self) -> None:
+        "Scan the add-on folder and start watching it."
+        self._loop = asyncio.get_running_loop()
+
+        if self._use_inotify:
+            try:
+                self._inotify = _Inotify()
+                self._addon_dir_wd = self._inotify.add_watch(
+                    str(self.model.addon_dir), _IN_ADDON_DIR_MASK | _IN_ONLYDIR
+                )
+            except (AttributeError, OSError):
+                logger.exception('unable to watch add-on folder with inotify; polling instead')
+                self._stop_inotify()
+
+        if self._inotify:
+            # Events are only collected once the add-on folders are being watched
+            # so that nothing falls through the cracks between scanning and watching
+            try:
+                await t(self._watch_folders)(os.listdir(self.model.addon_dir))
+            except OSError:
+                logger.exception('unable to watch add-on folders with inotify; polling instead')
+                self._stop_inotify()
+            else:
+                self._loop.add_reader(self._inotify.fd, self._read_events)
+
+        if not self._inotify:
+            await self._start_polling()
+        await t(self.model.scan)()
+
+    def close(self) -> None:
+        "Stop watching the add-on folder."
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        for task in (self._flush_task, self._poll_task):
+            if task:
+                task.cancel()
+        self._stop_inotify()
+
+    def _stop_inotify(self) -> None:
+        if self._inotify:
+            if self._loop:
+                self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+            self._folder_wds.clear()
+            self._watched_folders.clear()
+            self._addon_dir_wd = None
+
+    def _watch_folders(self, names: Iterable[str]) -> None:
+        assert self._inotify
+        for name in names:
+            path = self.model.addon_dir / name
+            if name in self._watched_folders or path.is_symlink() or not path.is_dir():
+                continue
+            try:
+                wd = self._inotify.add_watch(str(path), _IN_ADDON_FOLDER_MASK | _IN_ONLYDIR)
+            except OSError as error:
+                # Changes to add-on folders which aren't being watched would go
+                # unnoticed; if we've run out of watches we have to poll instead
+                if error.errno == errno.ENOSPC:
+                    raise
+                # The folder might have been removed in the meantime
+                logger.debug(f'unable to watch {path}: {error}')
+            else:
+                self._folder_wds[wd] = name
+                self._watched_folders[name] = wd
+
+    def _read_events(self) -> None:
+        assert self._inotify
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                self._rescan = True
+            elif wd == self._addon_dir_wd:
+                if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                    self._rescan = True
+                else:
+                    self._changed_names.add(name)
+            elif mask & _IN_IGNORED:
+                folder_name = self._folder_wds.pop(wd, None)
+                if folder_name is not None and self._watched_folders.get(folder_name) == wd:
+                    del self._watched_folders[folder_name]
+            else:
+                folder_name = self._folder_wds.get(wd)
+                if folder_name is not None:
+                    self._changed_names.add(folder_name)
+
+        if self._flush_handle is None and (self._changed_names or self._rescan):
+            assert self._loop
+            self._flush_handle = self._loop.call_later(
+                self.debounce_interval, self._schedule_flush
+            )
+
+    def _schedule_flush(self) -> None:
+        self._flush_handle = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._changed_names or self._rescan:
+            changed_names, self._changed_names = self._changed_names, set()
+            rescan, self._rescan = self._rescan, False
+            try:
+                if self._inotify:
+                    try:
+                        await t(self._watch_folders)(
+                            os.listdir(self.model.addon_dir) if rescan else changed_names
+                        )
+                    except OSError as error:
+                        if error.errno != errno.ENOSPC:
+                            raise
+                        logger.exception('ran out of inotify watches; polling instead')
+                        self._stop_inotify()
+                        await self._start_polling()
+                        rescan = True
+
+                if rescan:
+                    logger.debug(f'rescanning {self.model.addon_dir}')
+                    await t(self.model.scan)()
+                else:
+                    await t(self.model.update)(changed_names)
+            except Exception:
+                logger.exception(f'unable to update model of {self.model.addon_dir}')
+
+    def _take_snapshot(self) -> dict[str, tuple[int, int | None]]:
+        snapshot: dict[str, tuple[int, int | None]] = {}
+        try:
+            with os.scandir(self.model.addon_dir) as dir_entries:
+                for dir_entry in dir_entries:
+                    try:
+                        mtime = dir_entry.stat(follow_symlinks=False).st_mtime_ns
+                        toc_path = (
+                            get_toc_path(Path(dir_entry.path), self.model.game_flavour)
+                            if dir_entry.is_dir(follow_symlinks=False)
+                            else None
+                        )
+                        snapshot[dir_entry.name] = (
+                            mtime,
+                            toc_path.stat().st_mtime_ns if toc_path else None,
+                        )
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    async def _start_polling(self) -> None:
+        # The first snapshot is taken before the model is scanned so that
+        # nothing falls through the cracks between scanning and polling
+        snapshot = await t(self._take_snapshot)()
+        self._poll_task = asyncio.create_task(self._poll(snapshot))
+
+    async def _poll(self, snapshot: dict[str, tuple[int, int | None]]) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                new_snapshot = await t(self._take_snapshot)()
+                changed_names = {
+                    n
+                    for n in snapshot.keys() | new_snapshot.keys()
+                    if snapshot.get(n) != new_snapshot.get(n)
+                }
+                if changed_names:
+                    await t(self.model.update)(changed_names)
+            except Exception:
+                # The snapshot is only replaced once the model has been updated
+                # so that the changes are picked up again on the next go
+                logger.exception(f'unable to update model of {self.model.addon_dir}')
+            else:
+                snapshot = new_snapshot
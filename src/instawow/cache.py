@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterator, Mapping, Sequence
+from contextlib import contextmanager, suppress
+from datetime import timedelta
+from functools import partial
+import os
+from pathlib import Path
+import sqlite3
+from tempfile import NamedTemporaryFile
+import threading
+import time
+from typing import Any, Generic, TypeVar, cast
+
+from loguru import logger
+from typing_extensions import TypedDict
+
+_T = TypeVar('_T')
+
+_SCHEMA = '''\
+CREATE TABLE IF NOT EXISTS blob (
+    digest TEXT NOT NULL PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    access_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_blob_last_access ON blob (last_access);
+CREATE TABLE IF NOT EXISTS entry (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES blob (digest),
+    stored_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS ix_entry_digest ON entry (digest);
+CREATE TABLE IF NOT EXISTS counter (
+    kind TEXT NOT NULL PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+# Blobs which were accessed recently might be in use, e.g. an archive which
+# was downloaded but has yet to be extracted, and are spared by
+# automatic eviction
+EVICTION_GRACE_PERIOD = 10 * 60
+
+# Prefixes of files which are written to the cache folder before being moved
+# into the store; these are left alone for as long as they might be in use
+TEMP_FILE_PREFIXES = ('.download-', '.put-')
+
+
+class CacheKindStats(TypedDict):
+    kind: str
+    entries: int
+    size: int
+    hits: int
+    misses: int
+
+
+class CacheEntry(TypedDict):
+    path: Path
+    stored_at: float
+    is_fresh: bool
+    etag: str | None
+    last_modified: str | None
+
+
+class CacheStats(TypedDict):
+    kinds: list[CacheKindStats]
+    size: int
+    max_size: int
+
+
+def _digest_file(path: Path) -> str:
+    from hashlib import sha256
+
+    hasher = sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(2**20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _digest_bytes(data: bytes) -> str:
+    from hashlib import sha256
+
+    return sha256(data).hexdigest()
+
+
+class CacheStore:
+    """A content-addressed store for downloaded files.
+
+    Files are stored once under their SHA-256 digest however many keys
+    they are stored under.  The index tracks the size of every file,
+    when it was last accessed, and the hit rate for every kind of entry.
+    The store does not evict files on its own when it grows larger than
+    ``max_size``; it's up to the caller to call ``evict`` when
+    ``is_over_budget`` returns true, at a time of its choosing.
+
+    The store holds on to a single connection to the index, which can be
+    shared between threads.
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def index_file(self) -> Path:
+        return self.cache_dir / '.index.sqlite'
+
+    @property
+    def objects_dir(self) -> Path:
+        return self.cache_dir / 'objects'
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            connection = self._connection
+            if connection is None:
+                connection = self._connection = sqlite3.connect(
+                    self.index_file, timeout=30, check_same_thread=False
+                )
+                connection.executescript(_SCHEMA)
+            with connection:
+                yield connection
+
+    def close(self) -> None:
+        "Close the connection to the index."
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _get_blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def _count(self, connection: sqlite3.Connection, kind: str, column: str) -> None:
+        connection.execute('INSERT OR IGNORE INTO counter (kind) VALUES (?)', (kind,))
+        connection.execute(f'UPDATE counter SET {column} = {column} + 1 WHERE kind = ?', (kind,))
+
+    def get(self, kind: str, key: str, ttl: Mapping[str, float] | None = None) -> Path | None:
+        "Retrieve the path to a file stored under ``key``, if it has not expired."
+        entry = self.get_entry(kind, key, ttl)
+        return entry['path'] if entry and entry['is_fresh'] else None
+
+    def get_entry(
+        self, kind: str, key: str, ttl: Mapping[str, float] | None = None
+    ) -> CacheEntry | None:
+        """Retrieve the entry stored under ``key``.
+
+        Expired entries are returned so that they can be revalidated
+        but are counted as misses.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT digest, stored_at, etag, last_modified FROM entry '
+                'WHERE kind = ? AND key = ?',
+                (kind, key),
+            ).fetchone()
+            if row is None:
+                self._count(connection, kind, 'misses')
+                return None
+
+            digest, stored_at, etag, last_modified = row
+            path = self._get_blob_path(digest)
+            if not path.exists():
+                logger.debug(f'{path} has gone missing')
+                connection.execute('DELETE FROM entry WHERE digest = ?', (digest,))
+                connection.execute('DELETE FROM blob WHERE digest = ?', (digest,))
+                self._count(connection, kind, 'misses')
+                return None
+
+            is_fresh = ttl is None or now - stored_at < timedelta(**ttl).total_seconds()
+            if is_fresh:
+                connection.execute(
+                    'UPDATE blob SET last_access = ?, access_count = access_count + 1 '
+                    'WHERE digest = ?',
+                    (now, digest),
+                )
+                self._count(connection, kind, 'hits')
+            else:
+                logger.debug(f'{key} has expired (ttl: {ttl})')
+                self._count(connection, kind, 'misses')
+
+            return CacheEntry(
+                path=path,
+                stored_at=stored_at,
+                is_fresh=is_fresh,
+                etag=etag,
+                last_modified=last_modified,
+            )
+
+    def refresh(self, kind: str, key: str) -> float:
+        "Reset the age of the entry stored under ``key``, e.g. after it's been revalidated."
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE entry SET stored_at = ? WHERE kind = ? AND key = ?', (now, kind, key)
+            )
+            connection.execute(
+                'UPDATE blob SET last_access = ? '
+                'WHERE digest = (SELECT digest FROM entry WHERE kind = ? AND key = ?)',
+                (now, kind, key),
+            )
+        return now
+
+    def put_file(
+        self,
+        kind: str,
+        key: str,
+        path: Path,
+        *,
+        keep_source: bool = False,
+        digest: str | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> Path:
+        """Store a file under ``key``.
+
+        The file is moved into the store unless ``keep_source`` is true,
+        in which case it is copied.  ``digest`` is the SHA-256 digest of
+        the file, if it's already known, e.g. if it was computed
+        as the file was being written.  ``etag`` and ``last_modified``
+        are the HTTP validators of the file, if it was downloaded.
+        The path to the stored file is returned.
+        """
+        from shutil import copyfile
+
+        if digest is None:
+            digest = _digest_file(path)
+        blob_path = self._get_blob_path(digest)
+        if blob_path.exists():
+            logger.debug(f'{key} is a duplicate of {digest}')
+            if not keep_source:
+                path.unlink()
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            if keep_source:
+                copyfile(path, blob_path)
+            else:
+                os.replace(path, blob_path)
+
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO blob (digest, size, last_access) VALUES (?, ?, ?)',
+                (digest, blob_path.stat().st_size, now),
+            )
+            connection.execute('UPDATE blob SET last_access = ? WHERE digest = ?', (now, digest))
+            connection.execute(
+                'INSERT OR REPLACE INTO entry (kind, key, digest, stored_at, etag, last_modified) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, key, digest, now, etag, last_modified),
+            )
+
+        return blob_path
+
+    def put_bytes(
+        self,
+        kind: str,
+        key: str,
+        data: bytes,
+        *,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> Path:
+        "Store ``data`` under ``key``."
+        with NamedTemporaryFile(dir=self.cache_dir, prefix='.put-', delete=False) as file:
+            file.write(data)
+        return self.put_file(
+            kind,
+            key,
+            Path(file.name),
+            digest=_digest_bytes(data),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def evict(self, max_size: int | None = None, *, grace_period: float = 0) -> tuple[int, int]:
+        """Evict the least recently accessed files until the store fits in ``max_size``.
+
+        Returns the number of files evicted and the number of bytes freed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        with self._connect() as connection:
+            (size,) = connection.execute('SELECT ifnull(sum(size), 0) FROM blob').fetchone()
+            candidates = connection.execute(
+                'SELECT digest, size FROM blob WHERE last_access < ? ORDER BY last_access',
+                (time.time() - grace_period,),
+            )
+            evicted: list[tuple[str, int]] = []
+            for digest, blob_size in candidates:
+                if size <= max_size:
+                    break
+                evicted.append((digest, blob_size))
+                size -= blob_size
+
+            connection.executemany(
+                'DELETE FROM entry WHERE digest = ?', ((d,) for d, _ in evicted)
+            )
+            connection.executemany('DELETE FROM blob WHERE digest = ?', ((d,) for d, _ in evicted))
+
+        for digest, _ in evicted:
+            with suppress(FileNotFoundError):
+                self._get_blob_path(digest).unlink()
+
+        freed = sum(s for _, s in evicted)
+        if evicted:
+            logger.debug(f'evicted {len(evicted)} files ({freed} bytes) from cache')
+        return (len(evicted), freed)
+
+    def is_over_budget(self) -> bool:
+        "Whether the store has grown larger than ``max_size``."
+        with self._connect() as connection:
+            (size,) = connection.execute('SELECT ifnull(sum(size), 0) FROM blob').fetchone()
+        return size > self.max_size
+
+    def remove_untracked_files(self) -> int:
+        """Remove files in the cache folder which are not tracked by the store.
+
+        Temporary files which are younger than the eviction grace period
+        might still be being written to and are spared.
+        """
+        with self._connect() as connection:
+            digests = {d for (d,) in connection.execute('SELECT digest FROM blob')}
+
+        def is_in_use(path: Path) -> bool:
+            if not path.name.startswith(TEMP_FILE_PREFIXES):
+                return False
+            try:
+                return path.stat().st_mtime > time.time() - EVICTION_GRACE_PERIOD
+            except FileNotFoundError:
+                return False
+
+        untracked_files = [
+            p
+            for p in self.cache_dir.iterdir()
+            if p.is_file() and not p.name.startswith(self.index_file.name) and not is_in_use(p)
+        ]
+        if self.objects_dir.exists():
+            untracked_files += (p for p in self.objects_dir.glob('*/*') if p.name not in digests)
+
+        for path in untracked_files:
+            with suppress(FileNotFoundError):
+                path.unlink()
+        return len(untracked_files)
+
+    def get_stats(self) -> CacheStats:
+        "Summarise the contents of the store."
+        with self._connect() as connection:
+            kinds = [
+                CacheKindStats(kind=k, entries=e, size=s, hits=h, misses=m)
+                for k, e, s, h, m in connection.execute('''\
+                    SELECT
+                        counter.kind,
+                        count(entry.key),
+                        ifnull(sum(blob.size), 0),
+                        counter.hits,
+                        counter.misses
+                    FROM counter
+                    LEFT JOIN entry ON entry.kind = counter.kind
+                    LEFT JOIN blob ON blob.digest = entry.digest
+                    GROUP BY counter.kind
+                    ORDER BY counter.kind
+                    ''')
+            ]
+            (size,) = connection.execute('SELECT ifnull(sum(size), 0) FROM blob').fetchone()
+
+        return CacheStats(kinds=kinds, size=size, max_size=self.max_size)
+
+
+def _estimate_size(value: Any) -> int:
+    "Approximate the size of ``value`` in memory, in bytes."
+    from sys import getsizeof
+
+    size = getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in cast('dict[Any, Any]', value).items()
+        )
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(v) for v in cast('Sequence[Any]', value))
+    return size
+
+
+class MemoryCache(Generic[_T]):
+    """A bounded, in-memory LRU cache which coalesces concurrent loads.
+
+    Values are expected to be made up of dicts, lists and immutable values,
+    as is decoded JSON.  Callers are handed the stored value itself, which
+    is shared between them and must not be modified.  The cache is bounded
+    both by the number of entries and by their approximate size in bytes.
+    """
+
+    def __init__(self, max_entries: int = 128, max_size: int = 32 * 2**20) -> None:
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, _T, int]] = OrderedDict()
+        self._size = 0
+        self._loads: dict[Hashable, asyncio.Future[tuple[float, _T]]] = {}
+
+    def _discard(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def _store(self, key: Hashable, load: asyncio.Future[tuple[float, _T]]) -> None:
+        del self._loads[key]
+        if load.cancelled() or load.exception() is not None:
+            return
+
+        expires_at, value = load.result()
+        size = _estimate_size(value)
+        if key in self._entries:
+            self._discard(key)
+        if size > self.max_size:
+            return
+
+        self._entries[key] = (expires_at, value, size)
+        self._size += size
+        while len(self._entries) > self.max_entries or self._size > self.max_size:
+            self._discard(next(iter(self._entries)))
+
+    async def get_or_load(
+        self, key: Hashable, load: Callable[[], Awaitable[tuple[float, _T]]]
+    ) -> _T:
+        """Retrieve the value stored under ``key`` or load it.
+
+        ``load`` returns the value and the time at which it expires.
+        If the value is already being loaded the caller will await the
+        pending load.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                return value
+            self._discard(key)
+
+        pending_load = self._loads.get(key)
+        if pending_load is None:
+            pending_load = self._loads[key] = asyncio.ensure_future(load())
+            pending_load.add_done_callback(partial(self._store, key))
+
+        # The load is shielded so that it runs to completion for the benefit
+        # of other callers should this caller be cancelled
+        _, value = await asyncio.shield(pending_load)
+        return value
@@ -7,7 +7,7 @@ from datetime import datetime, timezone
 from enum import Enum
 from functools import partial, wraps
 import importlib.util
-from itertools import chain, repeat
+from itertools import chain
 from pathlib import Path
 import textwrap
 from typing import Any, NoReturn, TypeVar, overload
@@ -664,18 +664,10 @@ def list_installed(
     import sqlalchemy as sa
 
     def format_deps(pkg: models.Pkg):
-        return (
-            Defn(pkg.source, s or e.id).to_urn()
-            for e in pkg.deps
-            for s in (
-                manager.database.execute(
-                    sa.select(db.pkg.c.slug).filter_by(source=pkg.source, id=e.id)
-                ).scalar_one_or_none(),
-            )
-        )
+        return (Defn(pkg.source, slugs.get((pkg.source, e.id)) or e.id).to_urn() for e in pkg.deps)
 
     def row_mappings_to_pkgs():
-        return map(models.Pkg.from_row_mapping, repeat(manager.database), pkg_mappings)
+        return models.Pkg.from_row_mappings(manager.database, pkg_mappings)
 
     pkg_mappings = (
         manager.database.execute(
@@ -703,6 +695,12 @@ def list_installed(
         click.echo(models.PkgList.parse_obj(list(row_mappings_to_pkgs())).json(indent=2))
 
     elif output_format is ListFormats.detailed:
+        slugs = {
+            (s, i): l
+            for s, i, l in manager.database.execute(
+                sa.select(db.pkg.c.source, db.pkg.c.id, db.pkg.c.slug)
+            )
+        }
         formatter = click.HelpFormatter(max_width=99)
         for pkg in row_mappings_to_pkgs():
             with formatter.section(Defn.from_pkg(pkg).to_urn()):
@@ -883,6 +881,62 @@ def configure(ctx: click.Context, promptless: bool) -> Config:
     return config
 
 
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f'{size} B'
+    value = float(size)
+    for unit in ['KiB', 'MiB', 'GiB']:
+        value /= 1024
+        if value < 1024 or unit == 'GiB':
+            break
+    return f'{value:.1f} {unit}'
+
+
+@main.group('cache')
+def _cache_group() -> None:
+    "Manage the download cache."
+
+
+@_cache_group.command('stats')
+@ManagerWrapper.pass_manager
+def show_cache_stats(manager: _manager.Manager) -> None:
+    "Show how much space the cache takes up and its hit rate."
+    stats = manager.cache_store.get_stats()
+    click.echo(
+        tabulate(
+            [
+                ('kind', 'entries', 'size', 'hits', 'misses', 'hit rate'),
+                *(
+                    (
+                        k['kind'],
+                        k['entries'],
+                        _format_size(k['size']),
+                        k['hits'],
+                        k['misses'],
+                        f"{k['hits'] / ((k['hits'] + k['misses']) or 1):.0%}",
+                    )
+                    for k in stats['kinds']
+                ),
+            ]
+        )
+    )
+    click.echo(f"Total: {_format_size(stats['size'])} of {_format_size(stats['max_size'])}")
+
+
+@_cache_group.command('prune')
+@click.option('--all', 'prune_all', is_flag=True, default=False, help='Empty the cache.')
+@ManagerWrapper.pass_manager
+def prune_cache(manager: _manager.Manager, prune_all: bool) -> None:
+    """Evict files from the cache until it fits in the configured budget.
+
+    Files left over from older versions of instawow are also removed.
+    """
+    cache_store = manager.cache_store
+    evicted, freed = cache_store.evict(0 if prune_all else None)
+    untracked = cache_store.remove_untracked_files()
+    click.echo(f'Evicted {evicted} files ({_format_size(freed)}) and {untracked} untracked files')
+
+
 @main.group('weakauras-companion')
 def _weakauras_group() -> None:
     "Manage your WeakAuras."
@@ -924,19 +978,105 @@ def list_installed_wago_auras(manager: _manager.Manager) -> None:
     help='Omit results before this date.',
     metavar='YYYY-MM-DD',
 )
-def generate_catalogue(filename: str, start_date: datetime | None) -> None:
+@click.option(
+    '--previous',
+    type=click.Path(dir_okay=False, exists=True),
+    help='Update a previously generated catalogue and write out the changes in a delta file.',
+)
+@click.option(
+    '--max-patches',
+    default=42,
+    show_default=True,
+    help='The number of patches to retain in the delta file.',
+)
+@click.option(
+    '--refresh',
+    is_flag=True,
+    default=False,
+    help='Retrieve every add-on when updating a previous catalogue to refresh download counts.',
+)
+def generate_catalogue(
+    filename: str,
+    start_date: datetime | None,
+    previous: str | None,
+    max_patches: int,
+    refresh: bool,
+) -> None:
     "Generate the master catalogue."
-    from .resolvers import Catalogue
+    from hashlib import sha256
+    from textwrap import indent
+
+    from .compact_catalogue import CompactCatalogue
+    from .resolvers import Catalogue, CatalogueDelta, CatalogueDeltaPatch, CatalogueEntry
+    from .utils import shasum
 
-    catalogue = asyncio.run(Catalogue.collate(start_date))
     file = Path(filename)
-    file.write_text(
-        catalogue.json(indent=2),
-        encoding='utf-8',
+    # The version of a catalogue is the ``shasum`` of its compact JSON
+    version_hash = sha256()
+
+    def write_entries(entries: Iterable[CatalogueEntry]):
+        # Entries are written out as they are encoded in the compact format
+        with file.open('w', encoding='utf-8') as pretty_file, file.with_suffix(
+            f'.compact{file.suffix}'
+        ).open('w', encoding='utf-8') as compact_file:
+
+            def write_compact(value: str):
+                compact_file.write(value)
+                version_hash.update(value.encode())
+
+            pretty_file.write('[')
+            write_compact('[')
+            is_empty = True
+            for entry in entries:
+                separator = '' if is_empty else ','
+                is_empty = False
+                pretty_file.write(separator + '\n' + indent(entry.json(indent=2), '  '))
+                write_compact(separator + entry.json(separators=(',', ':')))
+                yield entry
+            pretty_file.write(']' if is_empty else '\n]')
+            write_compact(']')
+
+    if previous is None:
+
+        async def collate():
+            async with Catalogue.collate(start_date) as entries:
+                file.with_suffix('.compact.bin').write_bytes(
+                    CompactCatalogue.encode(write_entries(entries))
+                )
+
+        asyncio.run(collate())
+        # Patches leading up to a previous catalogue must not be applied
+        # in place of downloading the catalogue that replaced it
+        file.with_suffix(f'.delta{file.suffix}').write_text(
+            CatalogueDelta.parse_obj([]).json(separators=(',', ':')), encoding='utf-8'
+        )
+        return
+
+    previous_file = Path(previous)
+    raw_previous_catalogue = previous_file.with_suffix(
+        f'.compact{previous_file.suffix}'
+    ).read_text(encoding='utf-8')
+    previous_delta_file = previous_file.with_suffix(f'.delta{previous_file.suffix}')
+    previous_patches = (
+        CatalogueDelta.parse_file(previous_delta_file).__root__
+        if previous_delta_file.exists()
+        else []
+    )
+
+    entries, upserted, removed = asyncio.run(
+        Catalogue.parse_raw(raw_previous_catalogue).update(start_date, refresh=refresh)
+    )
+    file.with_suffix('.compact.bin').write_bytes(CompactCatalogue.encode(write_entries(entries)))
+
+    patch = CatalogueDeltaPatch(
+        base_version=shasum(raw_previous_catalogue),
+        version=version_hash.hexdigest()[:32],
+        upserted=upserted,
+        removed=removed,
     )
-    file.with_suffix(f'.compact{file.suffix}').write_text(
-        catalogue.json(separators=(',', ':')),
-        encoding='utf-8',
+    delta = CatalogueDelta.parse_obj([*previous_patches, patch][-max_patches:])
+    file.with_suffix(f'.delta{file.suffix}').write_text(
+        delta.json(separators=(',', ':')), encoding='utf-8'
     )
 
 
@@ -0,0 +1,413 @@
+"""A compact, columnar encoding of the catalogue.
+
+The catalogue is laid out in typed arrays which can be memory-mapped
+and read without parsing, with strings interned in a shared table.
+Entries are only materialised when they are accessed.
+
+The file begins with a fixed-size header followed by the arrays,
+all of which are in native byte order and aligned to 8 bytes::
+
+    header               magic, byte order and the length of variable-size arrays
+    string_offsets       Q[strings + 1]   string ``i`` spans ``string_offsets[i:i + 2]``
+    string_data          UTF-8 encoded strings
+    source, id,          I[entries]       string indices
+      slug, name
+    game_flavours        B[entries]       bit ``i`` is set for the ``i``th ``Flavour``
+    download_count       q[entries]
+    last_updated         q[entries]       microseconds since the epoch, in UTC
+    derived_download_score d[entries]
+    folder_set_offsets   I[entries + 1]   the folder sets of entry ``i`` span
+                                          ``folder_set_offsets[i:i + 2]``
+    folder_name_offsets  I[folder sets + 1]
+    folder_names         I[folder names]  string indices
+    search_tokens        I[tokens]        string indices of unique normalised names
+    token_entry_offsets  I[tokens + 1]    the entries with token ``i`` span
+                                          ``token_entry_offsets[i:i + 2]``
+    token_entries        I[entries]
+    trigrams             I[trigrams]      string indices
+    trigram_token_offsets I[trigrams + 1]
+    trigram_tokens       I[trigram tokens] an inverted index of trigrams to tokens
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime, timedelta, timezone
+import mmap
+from pathlib import Path
+import struct
+import sys
+import typing
+from typing import Any, overload
+
+from typing_extensions import Literal
+
+from .config import Flavour
+from .resolvers import CatalogueEntry
+from .utils import cached_property, normalise_names
+
+COMPACT_CATALOGUE_VERSION = 2
+
+_MAGIC = b'IWCAT\x00\x00' + bytes([COMPACT_CATALOGUE_VERSION])
+_HEADER = struct.Struct('=8sc7xQQQQQQQ')
+_BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_FLAVOURS = list(Flavour)
+_IntegerFormat = Literal['B', 'I', 'Q', 'q']
+_STRING_COLUMNS = ['source', 'id', 'slug', 'name']
+
+normalise_search_terms = normalise_names('')
+
+
+def _make_trigrams(value: str) -> set[str]:
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+def _align(offset: int) -> int:
+    return -(-offset // 8) * 8
+
+
+class CompactCatalogue(typing.Sequence[CatalogueEntry]):
+    """A lazily-loaded, read-only catalogue.
+
+    A catalogue which was memory-mapped with ``from_file`` should be closed
+    with ``close`` once it is no longer in use, or be used as a context manager.
+    """
+
+    def __init__(self, buffer: bytes | memoryview) -> None:
+        self._mmap: mmap.mmap | None = None
+        self._view = view = memoryview(buffer)
+        (
+            magic,
+            byte_order,
+            entry_count,
+            string_count,
+            folder_set_count,
+            folder_name_count,
+            token_count,
+            trigram_count,
+            trigram_token_count,
+        ) = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError('not a compact catalogue')
+        elif byte_order != _BYTE_ORDER:
+            raise ValueError('compact catalogue byte order does not match system byte order')
+
+        offset = _HEADER.size
+
+        def take(format_: str, count: int):
+            nonlocal offset
+            start = offset
+            end = start + struct.calcsize(format_) * count
+            offset = _align(end)
+            return view[start:end]
+
+        def read(format_: _IntegerFormat, count: int) -> memoryview[int]:
+            return take(format_, count).cast(format_)
+
+        def read_floats(count: int) -> memoryview[float]:
+            return take('d', count).cast('d')
+
+        self._strings: list[str | None] = [None] * string_count
+        self._string_offsets = read('Q', string_count + 1)
+        self._string_data = read('B', self._string_offsets[-1])
+        self._string_columns = {c: read('I', entry_count) for c in _STRING_COLUMNS}
+        self._game_flavours = read('B', entry_count)
+        self._download_count = read('q', entry_count)
+        self._last_updated = read('q', entry_count)
+        self._derived_download_score = read_floats(entry_count)
+        self._folder_set_offsets = read('I', entry_count + 1)
+        self._folder_name_offsets = read('I', folder_set_count + 1)
+        self._folder_names = read('I', folder_name_count)
+        self._search_tokens = read('I', token_count)
+        self._token_entry_offsets = read('I', token_count + 1)
+        self._token_entries = read('I', entry_count)
+        self._trigrams = read('I', trigram_count)
+        self._trigram_token_offsets = read('I', trigram_count + 1)
+        self._trigram_tokens = read('I', trigram_token_count)
+
+        self._columns: dict[str, tuple[str, ...]] = {}
+        self._folder_name_indices: dict[Flavour, dict[str, list[tuple[int, int]]]] = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> CompactCatalogue:
+        "Memory-map a compact catalogue."
+        with open(path, 'rb') as file:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            catalogue = cls(memoryview(mapped_file))
+        except BaseException:
+            mapped_file.close()
+            raise
+        catalogue._mmap = mapped_file
+        return catalogue
+
+    def close(self) -> None:
+        """Release the buffer and unmap the file, if the catalogue was memory-mapped.
+
+        The catalogue cannot be used after it's been closed.
+        """
+        for value in list(vars(self).values()):
+            if isinstance(value, memoryview):
+                value.release()
+            elif isinstance(value, dict):
+                for column in typing.cast('dict[Any, Any]', value).values():
+                    if isinstance(column, memoryview):
+                        column.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> CompactCatalogue:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    @staticmethod
+    def encode(entries: Iterable[CatalogueEntry]) -> bytes:
+        "Encode catalogue entries in the compact format."
+        strings: dict[str, int] = {}
+
+        def intern(value: str) -> int:
+            return strings.setdefault(value, len(strings))
+
+        string_columns = {c: array('I') for c in _STRING_COLUMNS}
+        game_flavours = array('B')
+        download_count = array('q')
+        last_updated = array('q')
+        derived_download_score = array('d')
+        folder_set_offsets = array('I', [0])
+        folder_name_offsets = array('I', [0])
+        folder_names = array('I')
+        token_entries: dict[str, list[int]] = {}
+
+        for index, entry in enumerate(entries):
+            for column, values in string_columns.items():
+                values.append(intern(getattr(entry, column)))
+            game_flavours.append(
+                sum(1 << i for i, f in enumerate(_FLAVOURS) if f in entry.game_flavours)
+            )
+            download_count.append(entry.download_count)
+            last_updated.append((entry.last_updated - _EPOCH) // timedelta(microseconds=1))
+            derived_download_score.append(entry.derived_download_score)
+            for folder_set in entry.folders:
+                folder_names.extend(intern(f) for f in sorted(folder_set))
+                folder_name_offsets.append(len(folder_names))
+            folder_set_offsets.append(len(folder_name_offsets) - 1)
+            token_entries.setdefault(normalise_search_terms(entry.name), []).append(index)
+
+        search_tokens = array('I', map(intern, token_entries))
+        token_entry_offsets = array('I', [0])
+        flat_token_entries = array('I')
+        trigram_tokens: dict[str, list[int]] = {}
+        for token_index, (token, indices) in enumerate(token_entries.items()):
+            flat_token_entries.extend(indices)
+            token_entry_offsets.append(len(flat_token_entries))
+            for trigram in _make_trigrams(token):
+                trigram_tokens.setdefault(trigram, []).append(token_index)
+
+        trigrams = array('I', map(intern, trigram_tokens))
+        trigram_token_offsets = array('I', [0])
+        flat_trigram_tokens = array('I')
+        for tokens in trigram_tokens.values():
+            flat_trigram_tokens.extend(tokens)
+            trigram_token_offsets.append(len(flat_trigram_tokens))
+
+        encoded_strings = [s.encode() for s in strings]
+        string_offsets = array('Q', [0])
+        for encoded_string in encoded_strings:
+            string_offsets.append(string_offsets[-1] + len(encoded_string))
+
+        chunks = [
+            _HEADER.pack(
+                _MAGIC,
+                _BYTE_ORDER,
+                len(download_count),
+                len(strings),
+                len(folder_name_offsets) - 1,
+                len(folder_names),
+                len(search_tokens),
+                len(trigrams),
+                len(flat_trigram_tokens),
+            ),
+            string_offsets.tobytes(),
+            b''.join(encoded_strings),
+            *(v.tobytes() for v in string_columns.values()),
+            game_flavours.tobytes(),
+            download_count.tobytes(),
+            last_updated.tobytes(),
+            derived_download_score.tobytes(),
+            folder_set_offsets.tobytes(),
+            folder_name_offsets.tobytes(),
+            folder_names.tobytes(),
+            search_tokens.tobytes(),
+            token_entry_offsets.tobytes(),
+            flat_token_entries.tobytes(),
+            trigrams.tobytes(),
+            trigram_token_offsets.tobytes(),
+            flat_trigram_tokens.tobytes(),
+        ]
+        return b''.join(c + b'\x00' * (_align(len(c)) - len(c)) for c in chunks)
+
+    def _get_string(self, index: int) -> str:
+        string = self._strings[index]
+        if string is None:
+            string = self._strings[index] = str(
+                self._string_data[self._string_offsets[index] : self._string_offsets[index + 1]],
+                'utf-8',
+            )
+        return string
+
+    def get_column(self, column: str) -> Sequence[str]:
+        """Retrieve the values of a string column (``source``, ``id``, ``slug`` or ``name``).
+
+        Columns are decoded once and are kept for the lifetime of the catalogue.
+        """
+        values = self._columns.get(column)
+        if values is None:
+            values = self._columns[column] = tuple(
+                map(self._get_string, self._string_columns[column])
+            )
+        return values
+
+    def get_game_flavours(self, index: int) -> set[Flavour]:
+        mask = self._game_flavours[index]
+        return {f for i, f in enumerate(_FLAVOURS) if mask & 1 << i}
+
+    def supports_flavour(self, index: int, flavour: Flavour) -> bool:
+        return bool(self._game_flavours[index] & 1 << _FLAVOURS.index(flavour))
+
+    def get_indices_for_flavour(self, flavour: Flavour) -> list[int]:
+        "Retrieve the indices of entries which support ``flavour``."
+        bit = 1 << _FLAVOURS.index(flavour)
+        return [i for i, m in enumerate(self._game_flavours) if m & bit]
+
+    def get_folders(self, index: int) -> list[set[str]]:
+        return [
+            set(self.get_folder_set(s))
+            for s in range(self._folder_set_offsets[index], self._folder_set_offsets[index + 1])
+        ]
+
+    def get_folder_set(self, folder_set_index: int) -> list[str]:
+        start, end = self._folder_name_offsets[folder_set_index : folder_set_index + 2]
+        return list(map(self._get_string, self._folder_names[start:end]))
+
+    def get_folder_set_size(self, folder_set_index: int) -> int:
+        return (
+            self._folder_name_offsets[folder_set_index + 1]
+            - self._folder_name_offsets[folder_set_index]
+        )
+
+    def get_folder_name_index(self, flavour: Flavour) -> dict[str, list[tuple[int, int]]]:
+        """Map folder names to the folder sets of entries which support ``flavour``.
+
+        The values are pairs of entry and folder set indices.  The index
+        is built once per flavour.
+        """
+        folder_name_index = self._folder_name_indices.get(flavour)
+        if folder_name_index is None:
+            folder_name_index = self._folder_name_indices[flavour] = {}
+            for index in self.get_indices_for_flavour(flavour):
+                for folder_set_index in range(
+                    self._folder_set_offsets[index], self._folder_set_offsets[index + 1]
+                ):
+                    for folder_name in self.get_folder_set(folder_set_index):
+                        folder_name_index.setdefault(folder_name, []).append(
+                            (index, folder_set_index)
+                        )
+        return folder_name_index
+
+    def get_last_updated(self, index: int) -> datetime:
+        return _EPOCH + timedelta(microseconds=self._last_updated[index])
+
+    def get_derived_download_score(self, index: int) -> float:
+        return self._derived_download_score[index]
+
+    @cached_property
+    def _trigram_indices(self) -> dict[str, int]:
+        return {self._get_string(s): i for i, s in enumerate(self._trigrams)}
+
+    def find_search_tokens(self, search_terms: str, limit: int) -> list[int]:
+        """Shortlist the search tokens which share the most trigrams with ``search_terms``.
+
+        ``search_terms`` must have been normalised with ``normalise_search_terms``.
+        If ``search_terms`` is too short to be broken up into trigrams,
+        the tokens which contain it are returned.
+        """
+        if len(search_terms) < 3:
+            return [
+                t
+                for t in range(len(self._search_tokens))
+                if search_terms in self.get_search_token(t)
+            ][:limit]
+
+        counter: Counter[int] = Counter()
+        for trigram in _make_trigrams(search_terms):
+            index = self._trigram_indices.get(trigram)
+            if index is not None:
+                counter.update(
+                    self._trigram_tokens[
+                        self._trigram_token_offsets[index] : self._trigram_token_offsets[index + 1]
+                    ]
+                )
+        return [t for t, _ in counter.most_common(limit)]
+
+    def get_search_token(self, token_index: int) -> str:
+        return self._get_string(self._search_tokens[token_index])
+
+    def get_search_token_entries(self, token_index: int) -> Sequence[int]:
+        "Retrieve the indices of entries whose normalised name is the token."
+        return self._token_entries[
+            self._token_entry_offsets[token_index] : self._token_entry_offsets[token_index + 1]
+        ]
+
+    @cached_property
+    def curse_slugs(self) -> dict[str, str]:
+        sources = self._string_columns['source']
+        slugs = self._string_columns['slug']
+        ids = self._string_columns['id']
+        return {
+            self._get_string(slugs[i]): self._get_string(ids[i])
+            for i, s in enumerate(sources)
+            if self._get_string(s) == 'curse'
+        }
+
+    def __len__(self) -> int:
+        return len(self._download_count)
+
+    @overload
+    def __getitem__(self, index: int) -> CatalogueEntry: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[CatalogueEntry]: ...
+
+    def __getitem__(self, index: int | slice) -> CatalogueEntry | list[CatalogueEntry]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('catalogue index out of range')
+
+        values: dict[str, Any] = {
+            c: self._get_string(v[index]) for c, v in self._string_columns.items()
+        }
+        # The catalogue was validated when it was encoded
+        return CatalogueEntry.construct(
+            **values,
+            game_flavours=self.get_game_flavours(index),
+            folders=self.get_folders(index),
+            download_count=self._download_count[index],
+            last_updated=self.get_last_updated(index),
+            derived_download_score=self._derived_download_score[index],
+        )
+
+    def __iter__(self) -> Iterator[CatalogueEntry]:
+        return map(self.__getitem__, range(len(self)))
@@ -71,6 +71,11 @@ class Config(BaseConfig):
     game_flavour: Flavour
     temp_dir: Path = Field(default_factory=_get_default_temp_dir)
     auto_update_check: bool = True
+    # Keep track of changes to the add-on folder in long-running processes.
+    # This is only honoured by the JSON-RPC server of the GUI; the CLI
+    # scans the add-on folder whenever it needs to
+    watch_addon_dir: bool = True
+    cache_max_size: int = Field(default=2 * 2**30, ge=0)
 
     @validator('config_dir', 'addon_dir', 'temp_dir')
     def _expand_path(cls, value: Path) -> Path:
@@ -131,6 +136,7 @@ class Config(BaseConfig):
             self.plugin_dir,
             self.temp_dir,
             self.cache_dir,
+            self.staging_dir,
         ]:
             dir_.mkdir(exist_ok=True, parents=True)
         return self
@@ -176,6 +182,10 @@ class Config(BaseConfig):
     def cache_dir(self) -> Path:
         return self.temp_dir / 'cache'
 
+    @property
+    def staging_dir(self) -> Path:
+        return self.temp_dir / 'staging' / self.profile
+
 
 def setup_logging(
     config: Config, log_level: str = 'INFO', log_to_stderr: bool = False
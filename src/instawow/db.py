@@ -6,7 +6,10 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKeyConstraint,
+    Index,
+    Integer,
     MetaData,
+    PrimaryKeyConstraint,
     String,
     Table,
     TypeDecorator,
@@ -51,6 +54,7 @@ pkg = Table(
     Column('date_published', TZDateTime, nullable=False),
     Column('version', String, nullable=False),
     Column('changelog_url', String, nullable=False),
+    Index('ix_pkg_slug', 'slug'),
 )
 
 pkg_options = Table(
@@ -77,6 +81,7 @@ pkg_folder = Table(
         ['pkg.source', 'pkg.id'],
         name='fk_pkg_folder_pkg_source_and_id',
     ),
+    Index('ix_pkg_folder_pkg_source_and_id', 'pkg_source', 'pkg_id'),
 )
 
 pkg_dep = Table(
@@ -90,6 +95,7 @@ pkg_dep = Table(
         ['pkg.source', 'pkg.id'],
         name='fk_pkg_dep_pkg_source_and_id',
     ),
+    Index('ix_pkg_dep_pkg_source_and_id', 'pkg_source', 'pkg_id'),
 )
 
 pkg_version_log = Table(
@@ -104,4 +110,27 @@ pkg_version_log = Table(
         ['pkg.source', 'pkg.id'],
         name='fk_pkg_version_log_pkg_source_and_id',
     ),
+    Index(
+        'ix_pkg_version_log_pkg_source_and_id_and_install_time',
+        'pkg_source',
+        'pkg_id',
+        'install_time',
+    ),
+)
+
+pkg_file = Table(
+    'pkg_file',
+    metadata,
+    Column('name', String, nullable=False),  # Path relative to the add-on folder
+    Column('crc32', Integer, nullable=False),
+    Column('size', Integer, nullable=False),
+    Column('mtime_ns', Integer, nullable=False),  # As of installation
+    Column('pkg_source', String, nullable=False),
+    Column('pkg_id', String, nullable=False),
+    PrimaryKeyConstraint('pkg_source', 'pkg_id', 'name'),
+    ForeignKeyConstraint(
+        ['pkg_source', 'pkg_id'],
+        ['pkg.source', 'pkg.id'],
+        name='fk_pkg_file_pkg_source_and_id',
+    ),
 )
@@ -19,9 +19,13 @@ from enum import IntEnum
 from functools import lru_cache, partial, wraps
 from itertools import chain, compress, filterfalse, repeat, starmap, takewhile
 import json
+import os
 from pathlib import Path, PurePath
-from shutil import copy
-from tempfile import NamedTemporaryFile
+import posixpath
+from shutil import copy2, rmtree
+from stat import S_ISREG
+from tempfile import NamedTemporaryFile, mkdtemp
+import time
 from typing import TYPE_CHECKING, Any, TypeVar
 import urllib.parse
 
@@ -34,12 +38,20 @@ from yarl import URL
 
 from . import _deferred_types, db, models
 from . import results as R
+from .cache import EVICTION_GRACE_PERIOD, CacheEntry, CacheStore, MemoryCache
 from .common import Strategy
+from .compact_catalogue import (
+    COMPACT_CATALOGUE_VERSION,
+    CompactCatalogue,
+    normalise_search_terms,
+)
 from .config import Config
 from .plugins import load_plugins
+from .request_scheduler import RequestPriority, schedule_request
 from .resolvers import (
     BaseResolver,
     Catalogue,
+    CatalogueDelta,
     CatalogueEntry,
     CurseResolver,
     Defn,
@@ -51,19 +63,20 @@ from .resolvers import (
 )
 from .utils import (
     bucketise,
+    cached_property,
     chain_dict,
     file_uri_to_path,
     find_addon_zip_base_dirs,
     gather,
     is_not_stale,
     make_zip_member_filter,
-    move,
-    normalise_names,
 )
 from .utils import run_in_thread as t
 from .utils import shasum, trash, uniq
 
 if TYPE_CHECKING:  # pragma: no cover
+    from .addon_dir_watcher import AddonDirModel
+
     _BaseResolverDict: TypeAlias = 'dict[str, Resolver]'
 else:
     _BaseResolverDict = dict
@@ -75,7 +88,25 @@ _CManager: TypeAlias = 'Callable[Concatenate[Manager, _P], Awaitable[_T]]'
 
 USER_AGENT = 'instawow (https://github.com/layday/instawow)'
 
-DB_REVISION = '75f69831f74f'
+DB_REVISION = 'c5d2e8f41a7b'
+
+# The number of packages whose changes are committed together in a unit of work
+COMMIT_CHECKPOINT_INTERVAL = 50
+
+# The number of definitions which are looked up in one query.  SQLite caps
+# the number of terms in a compound select at 500 and, prior to 3.32,
+# the number of parameters at 999; each definition binds four parameters
+DEFN_LOOKUP_CHUNK_SIZE = 200
+
+# Staging folders older than this are taken to have been left behind
+# by a process which did not exit cleanly
+STAGING_GRACE_PERIOD = 60 * 60
+
+CATALOGUE_URL = URL(
+    'https://raw.githubusercontent.com/layday/instawow-data/data/master-catalogue-v4.compact.json'
+)  # v4
+CATALOGUE_DELTA_URL = CATALOGUE_URL.with_name('master-catalogue-v4.delta.json')
+CATALOGUE_TTL = {'hours': 4}
 
 
 class _GenericDownloadTraceRequestCtx(TypedDict):
@@ -93,61 +124,216 @@ TraceRequestCtx: TypeAlias = '_GenericDownloadTraceRequestCtx | _PkgDownloadTrac
 
 
 _AsyncNamedTemporaryFile = t(NamedTemporaryFile)
-_copy_async = t(copy)
-_move_async = t(move)
 
 
 @asynccontextmanager
-async def _open_temp_writer() -> AsyncIterator[tuple[Path, Callable[[bytes], Awaitable[int]]]]:
-    fh = await _AsyncNamedTemporaryFile(delete=False)
+async def _open_temp_writer(
+    dir: PurePath, *, buffer_size: int = 2**20
+) -> AsyncIterator[tuple[Path, Callable[[bytes], Awaitable[None]]]]:
+    """Open a temporary file in ``dir`` for writing.
+
+    Writes are buffered in memory and flushed to disk ``buffer_size``
+    bytes at a time so that we're not hopping onto a thread for every chunk.
+    """
+    fh = await _AsyncNamedTemporaryFile(dir=dir, prefix='.download-', delete=False)
     path = Path(fh.name)
+    buffer = bytearray()
+
+    async def write(chunk: bytes) -> None:
+        buffer.extend(chunk)
+        if len(buffer) >= buffer_size:
+            await t(fh.write)(buffer)
+            buffer.clear()
+
+    def flush_and_close():
+        with fh:
+            fh.write(buffer)
+
+    def close_and_unlink():
+        fh.close()
+        path.unlink()
+
     try:
-        yield (path, t(fh.write))
+        yield (path, write)
     except BaseException:
-        await t(fh.close)()
-        await t(path.unlink)()
+        await t(close_and_unlink)()
         raise
     else:
-        await t(fh.close)()
+        await t(flush_and_close)()
+
+
+# Characters which are stripped or substituted by ``ZipFile.extract``, on Windows
+_unsafe_zip_member_name_chars = frozenset('\\:<>"|?*')
+
+
+def _extract_zip_members(
+    archive: _deferred_types.zipfile.ZipFile,
+    members: Sequence[_deferred_types.zipfile.ZipInfo],
+    parent: Path,
+    max_workers: int,
+) -> None:
+    """Extract ZIP members in parallel from a shared ``ZipFile``.
+
+    Member names must be safe (see ``_is_safe_zip_member_name``) so that
+    they are extracted to the paths their names spell out.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Create the directory tree up front so that worker threads
+    # aren't racing each other to create the same folders
+    for dirname in uniq(
+        m.filename.rstrip('/') if m.is_dir() else posixpath.dirname(m.filename) for m in members
+    ):
+        parent.joinpath(*dirname.split('/')).mkdir(parents=True, exist_ok=True)
+
+    def extract_batch(batch: Sequence[_deferred_types.zipfile.ZipInfo]):
+        for member in batch:
+            archive.extract(member, parent)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        batches = (members[i::max_workers] for i in range(max_workers))
+        for _ in executor.map(extract_batch, batches):
+            pass
+
+
+def _is_safe_zip_member_name(name: str) -> bool:
+    "Whether ``ZipFile.extract`` will extract the member verbatim on every platform."
+    return not _unsafe_zip_member_name_chars.intersection(name) and all(
+        p not in {'', '.', '..'} and not p.endswith('.') for p in name.rstrip('/').split('/')
+    )
+
+
+class _PkgArchive:
+    def __init__(self, archive: _deferred_types.zipfile.ZipFile, parallel_threshold: int) -> None:
+        self.archive = archive
+        self.parallel_threshold = parallel_threshold
+        self.base_dirs = set(find_addon_zip_base_dirs(archive.namelist()))
+        is_member = make_zip_member_filter(self.base_dirs)
+        self.members = [i for i in archive.infolist() if is_member(i.filename)]
+
+    @property
+    def file_manifest(self) -> dict[str, tuple[int, int]]:
+        "A mapping of file paths to their CRC-32 checksum and size in the archive."
+        return {m.filename: (m.CRC, m.file_size) for m in self.members if not m.is_dir()}
+
+    @property
+    def is_patchable(self) -> bool:
+        return all(_is_safe_zip_member_name(m.filename) for m in self.members)
+
+    def extract(self, parent: Path, base_dirs: Set[str] | None = None) -> None:
+        "Extract the archive, or ``base_dirs`` if specified, into ``parent``."
+        members = (
+            self.members
+            if base_dirs is None
+            else [m for m in self.members if m.filename.partition('/')[0] in base_dirs]
+        )
+        max_workers = min(os.cpu_count() or 1, 8)
+        # Not worth spinning up threads for the typical small add-on
+        if (
+            len(members) < self.parallel_threshold
+            or max_workers == 1
+            or not all(_is_safe_zip_member_name(m.filename) for m in members)
+        ):
+            self.archive.extractall(parent, members=members)
+        else:
+            _extract_zip_members(self.archive, members, parent, max_workers)
+
+    def patch(
+        self,
+        parent: Path,
+        base_dir: str,
+        installed_files: Mapping[str, tuple[int, int, int]],
+        staging_dir: Path,
+        trash_dir: PurePath,
+    ) -> None:
+        """Replace the installed ``base_dir`` with its counterpart in the archive.
+
+        The folder is assembled in ``staging_dir``, which must be on the same
+        file system as ``parent``, from which it is then swapped in.  Files which
+        haven't changed, either in the archive or on disk, are linked from
+        the installed folder and only new and modified files are extracted
+        from the archive.
+        """
+        stage = Path(mkdtemp(dir=staging_dir, prefix=f'{base_dir}-'))
+        try:
+            for member in self.members:
+                if member.filename.partition('/')[0] != base_dir:
+                    continue
+
+                staged_path = stage / member.filename
+                installed_path = parent / member.filename
+                installed_file = installed_files.get(member.filename)
+                if member.is_dir():
+                    staged_path.mkdir(parents=True, exist_ok=True)
+                elif (
+                    installed_file
+                    and installed_file[:2] == (member.CRC, member.file_size)
+                    and _stat_file(installed_path) == installed_file[1:]
+                ):
+                    staged_path.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        os.link(installed_path, staged_path)
+                    except OSError:
+                        copy2(installed_path, staged_path)
+                else:
+                    self.archive.extract(member, stage)
+
+            trash([parent / base_dir], dest=trash_dir, missing_ok=True)
+            (stage / base_dir).rename(parent / base_dir)
+        finally:
+            rmtree(stage, ignore_errors=True)
+
+
+def _stat_file(path: Path) -> tuple[int, int] | None:
+    "Retrieve the size of a file and its modification time in nanoseconds."
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    if S_ISREG(stat.st_mode):
+        return (stat.st_size, stat.st_mtime_ns)
 
 
 @contextmanager
-def _open_pkg_archive(path: PurePath) -> Iterator[tuple[set[str], Callable[[Path], None]]]:
+def _open_pkg_archive(path: PurePath, *, parallel_threshold: int = 100) -> Iterator[_PkgArchive]:
     from zipfile import ZipFile
 
     with ZipFile(path) as archive:
+        yield _PkgArchive(archive, parallel_threshold)
 
-        def extract(parent: Path) -> None:
-            archive.extractall(parent, members=filter(make_zip_member_filter(base_dirs), names))
-
-        names = archive.namelist()
-        base_dirs = set(find_addon_zip_base_dirs(names))
-        yield (base_dirs, extract)
 
-
-async def _download_pkg_archive(
-    manager: Manager, pkg: models.Pkg, *, chunk_size: int = 4096
-) -> Path:
+async def _download_pkg_archive(manager: Manager, pkg: models.Pkg) -> Path:
     url = pkg.download_url
-    dest = manager.config.cache_dir / shasum(
-        pkg.source, pkg.id, pkg.version, manager.config.game_flavour
-    )
-    if await t(dest.exists)():
+    key = shasum(pkg.source, pkg.id, pkg.version, manager.config.game_flavour)
+    cache_store = manager.cache_store
+    dest = await t(cache_store.get)('archive', key)
+    if dest:
         logger.debug(f'{url} is cached at {dest}')
     elif url.startswith('file://'):
-        await _copy_async(file_uri_to_path(url), dest)
+        dest = await t(cache_store.put_file)(
+            'archive', key, Path(file_uri_to_path(url)), keep_source=True
+        )
     else:
-        async with manager.web_client.get(
+        from hashlib import sha256
+
+        hasher = sha256()
+        async with schedule_request(
+            manager.web_client,
+            'GET',
             url,
             raise_for_status=True,
             trace_request_ctx=_PkgDownloadTraceRequestCtx(
                 report_progress='pkg_download', manager=manager, pkg=pkg
             ),
-        ) as response, _open_temp_writer() as (temp_path, write):
-            async for chunk in response.content.iter_chunked(chunk_size):
+        ) as response, _open_temp_writer(cache_store.cache_dir) as (temp_path, write):
+            # Chunks are yielded as soon as they're received and are as big
+            # as what's accumulated in the stream buffer since the last read
+            async for chunk in response.content.iter_any():
+                hasher.update(chunk)
                 await write(chunk)
 
-        await _move_async(temp_path, dest)
+        # The temporary file is created alongside the store; this is a rename
+        dest = await t(cache_store.put_file)('archive', key, temp_path, digest=hasher.hexdigest())
 
     return dest
 
@@ -160,30 +346,67 @@ async def cache_response(
     label: str | None = None,
     is_json: bool = True,
     request_extra: Mapping[str, Any] = {},
+    priority: RequestPriority = RequestPriority.interactive,
 ) -> Any:
-    async def make_request():
+    async def make_request(entry: CacheEntry | None):
         kwargs: dict[str, Any] = {
             'method': 'GET',
             'url': url,
             'raise_for_status': True,
             **request_extra,
         }
+        if entry:
+            # Ask the server to forgo sending the body if it hasn't changed
+            validators = {
+                k: v
+                for k, v in [
+                    ('If-None-Match', entry['etag']),
+                    ('If-Modified-Since', entry['last_modified']),
+                ]
+                if v
+            }
+            if validators:
+                kwargs['headers'] = {**kwargs.get('headers', {}), **validators}
         if label:
             kwargs['trace_request_ctx'] = _GenericDownloadTraceRequestCtx(
                 report_progress='generic', label=label
             )
-        async with manager.web_client.request(**kwargs) as response:
-            return await response.text()
+        async with schedule_request(manager.web_client, priority=priority, **kwargs) as response:
+            if response.status == 304 and entry:
+                return None
+            return (
+                await response.text(),
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+            )
 
-    dest = manager.config.cache_dir / shasum(url, request_extra)
-    if await t(is_not_stale)(dest, ttl):
-        logger.debug(f'{url} is cached at {dest} (ttl: {ttl})')
-        text = await t(dest.read_text)(encoding='utf-8')
-    else:
-        text = await make_request()
-        await t(dest.write_text)(text, encoding='utf-8')
+    async def load():
+        entry = await t(cache_store.get_entry)('response', key, ttl)
+        if entry and entry['is_fresh']:
+            logger.debug(f'{url} is cached at {entry["path"]} (ttl: {ttl})')
+            stored_at = entry['stored_at']
+            text = await t(entry['path'].read_text)(encoding='utf-8')
+        else:
+            result = await make_request(entry)
+            if entry and result is None:
+                logger.debug(f'{url} has not been modified since it was cached')
+                stored_at = await t(cache_store.refresh)('response', key)
+                text = await t(entry['path'].read_text)(encoding='utf-8')
+            else:
+                stored_at = time.time()
+                text, etag, last_modified = result
+                await t(cache_store.put_bytes)(
+                    'response', key, text.encode('utf-8'), etag=etag, last_modified=last_modified
+                )
 
-    return json.loads(text) if is_json else text
+        expires_at = stored_at + datetime.timedelta(**ttl).total_seconds()
+        return (expires_at, json.loads(text) if is_json else text)
+
+    key = shasum(url, request_extra)
+    cache_store = manager.cache_store
+    return await manager.response_cache.get_or_load(
+        (key, is_json, tuple(sorted(ttl.items()))), load
+    )
 
 
 class DatabaseState(IntEnum):
@@ -228,6 +451,28 @@ def migrate_database(engine: sa_future.Engine) -> None:
             alembic.command.upgrade(alembic_config, DB_REVISION)
 
 
+_SQLITE_PRAGMAS = {
+    # The write-ahead log lets readers carry on while a write is in progress
+    # and does away with the rollback journal's fsyncs on every commit;
+    # ``synchronous = NORMAL`` is durable enough in WAL mode
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    # In KiB when negative
+    'cache_size': -16_384,
+    'mmap_size': 64 * 2**20,
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, connection_record: object) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in _SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    finally:
+        cursor.close()
+
+
 def prepare_database(config: Config) -> sa_future.Engine:
     engine = sa.create_engine(
         f'sqlite:///{config.db_file}',
@@ -237,6 +482,7 @@ def prepare_database(config: Config) -> sa_future.Engine:
         # echo=True,
         future=True,
     )
+    sa.event.listen(engine, 'connect', _set_sqlite_pragmas)
     migrate_database(engine)
     return engine
 
@@ -254,10 +500,27 @@ def _load_certifi_certs():
         return read_text(certifi, 'cacert.pem', encoding='ascii')
 
 
-def init_web_client(**kwargs: Any) -> _deferred_types.aiohttp.ClientSession:
+def init_web_client(
+    *, pooled: bool = True, **kwargs: Any
+) -> _deferred_types.aiohttp.ClientSession:
+    """Create a web client session.
+
+    A ``pooled`` session keeps connections alive between requests
+    so that requests to the same host do not each pay for a new TCP
+    and TLS handshake.  DNS lookups are cached for the lifetime of the pool.
+    """
     from aiohttp import ClientSession, ClientTimeout, TCPConnector
 
-    make_connector = partial(TCPConnector, force_close=True, limit_per_host=10)
+    if pooled:
+        make_connector = partial(
+            TCPConnector,
+            limit_per_host=10,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+    else:
+        make_connector = partial(TCPConnector, force_close=True, limit_per_host=10)
+
     certifi_certs = _load_certifi_certs()
     if certifi_certs:
         import ssl
@@ -365,7 +628,16 @@ class Manager:
             (r.source, r(self)) for r in resolver_classes
         )
 
-        self._catalogue = None
+        self._catalogue: CompactCatalogue | None = None
+        self._catalogue_key: str | None = None
+        self._catalogue_expires_at = 0.0
+        # Set by long-running processes which keep track of the add-on folder
+        # so that we don't have to read it from disk
+        self.addon_dir_model: AddonDirModel | None = None
+
+        self._unit_of_work_depth = 0
+        # ``None`` while there isn't a unit of work transaction open
+        self._uncommitted_pkg_changes: int | None = None
 
     @classmethod
     def contextualise(
@@ -381,7 +653,54 @@ class Manager:
 
     @classmethod
     def from_config(cls, config: Config) -> Manager:
-        return cls(config, prepare_database(config).connect())
+        manager = cls(config, prepare_database(config).connect())
+        manager._remove_stale_staging_dirs()
+        return manager
+
+    def _remove_stale_staging_dirs(self) -> None:
+        staging_dir = self.config.staging_dir
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        for path in staging_dir.iterdir():
+            try:
+                is_stale = path.stat().st_mtime < time.time() - STAGING_GRACE_PERIOD
+            except FileNotFoundError:
+                continue
+            if is_stale:
+                logger.debug(f'removing stale staging folder {path}')
+                rmtree(path, ignore_errors=True)
+
+    def _can_stage_pkg_folders(self) -> bool:
+        # Folders are only patched if they can be renamed from the staging folder
+        # and if installed files can be linked into it
+        try:
+            return os.stat(self.config.staging_dir).st_dev == os.stat(self.config.addon_dir).st_dev
+        except OSError:
+            return False
+
+    def _schedule_cache_eviction(self) -> None:
+        # Eviction is run on a worker thread after a batch of downloads
+        # so that it holds up neither the downloads nor the caller
+        cache_store = self.cache_store
+
+        def evict():
+            if cache_store.is_over_budget():
+                cache_store.evict(grace_period=EVICTION_GRACE_PERIOD)
+
+        def log_exc(future: asyncio.Future[None]):
+            if not future.cancelled() and future.exception():
+                logger.opt(exception=future.exception()).error('cache eviction failed')
+
+        asyncio.get_running_loop().run_in_executor(None, evict).add_done_callback(log_exc)
+
+    @cached_property
+    def cache_store(self) -> CacheStore:
+        "The content-addressed store for downloaded archives and responses."
+        return CacheStore(self.config.cache_dir, self.config.cache_max_size)
+
+    @cached_property
+    def response_cache(self) -> MemoryCache[Any]:
+        "The in-memory cache of decoded responses which sits in front of ``cache_store``."
+        return MemoryCache()
 
     @property
     def web_client(self) -> _deferred_types.aiohttp.ClientSession:
@@ -393,6 +712,57 @@ class Manager:
         "Lock factory used to synchronise async operations."
         return _locks.get()
 
+    def _begin(self) -> None:
+        self.database.commit()
+        # pysqlite only opens a transaction in front of DML statements which would
+        # have savepoints begin and end transactions of their own
+        self.database.exec_driver_sql('BEGIN')
+        self._uncommitted_pkg_changes = 0
+
+    def _checkpoint(self) -> None:
+        "Commit the changes made in the current unit of work so far."
+        if self._uncommitted_pkg_changes is not None:
+            self.database.commit()
+            self._uncommitted_pkg_changes = None
+
+    @contextmanager
+    def _unit_of_work(self) -> Iterator[None]:
+        """Collect database changes in a single transaction.
+
+        The transaction is only opened once a package is changed.  It's
+        committed when the outermost unit of work exits cleanly and is
+        rolled back if it doesn't; it's also checkpointed every
+        ``COMMIT_CHECKPOINT_INTERVAL`` packages and whenever ``_checkpoint``
+        is called.  Changes to individual packages are rolled back
+        in ``_pkg_changes``.
+        """
+        self._unit_of_work_depth += 1
+        try:
+            yield
+        except BaseException:
+            if self._unit_of_work_depth == 1 and self._uncommitted_pkg_changes is not None:
+                self.database.rollback()
+                self._uncommitted_pkg_changes = None
+            raise
+        else:
+            if self._unit_of_work_depth == 1:
+                self._checkpoint()
+        finally:
+            self._unit_of_work_depth -= 1
+
+    @contextmanager
+    def _pkg_changes(self) -> Iterator[None]:
+        "Apply the database changes to a package atomically."
+        with self._unit_of_work():
+            if self._uncommitted_pkg_changes is None:
+                self._begin()
+            with self.database.begin_nested():
+                yield
+
+            self._uncommitted_pkg_changes = (self._uncommitted_pkg_changes or 0) + 1
+            if self._uncommitted_pkg_changes >= COMMIT_CHECKPOINT_INTERVAL:
+                self._begin()
+
     def pair_uri(self, value: str) -> tuple[str, str] | None:
         "Attempt to extract the package source and alias from a URI."
 
@@ -409,35 +779,58 @@ class Manager:
         )
         return next(chain(aliases_from_url, from_urn(), (None,)))
 
-    def check_pkg_exists(self, defn: Defn) -> bool:
-        return (
-            self.database.execute(
-                sa.select(sa.func.count())
-                .select_from(db.pkg)
-                .filter(
-                    db.pkg.c.source == defn.source,
-                    (db.pkg.c.id == defn.alias)
-                    | (db.pkg.c.id == defn.id)
-                    | (db.pkg.c.slug == defn.alias),
+    def _get_pkg_row_mappings(self, defns: Sequence[Defn]) -> list[Mapping[str, Any] | None]:
+        from sqlalchemy.exc import MultipleResultsFound
+
+        row_mappings: list[Mapping[str, Any] | None] = [None] * len(defns)
+        for offset in range(0, len(defns), DEFN_LOOKUP_CHUNK_SIZE):
+            defn_values = sa.union_all(
+                *(
+                    sa.select(
+                        sa.literal(i).label('index'),
+                        sa.literal(d.source).label('source'),
+                        sa.literal(d.alias).label('alias'),
+                        sa.literal(d.id, sa.String).label('id'),
+                    )
+                    for i, d in enumerate(
+                        defns[offset : offset + DEFN_LOOKUP_CHUNK_SIZE], start=offset
+                    )
                 )
-            ).scalar()
-            != 0
+            ).cte('defn')
+            for index, *values in self.database.execute(
+                sa.select(defn_values.c.index, db.pkg).join(
+                    db.pkg,
+                    (db.pkg.c.source == defn_values.c.source)
+                    & (
+                        (db.pkg.c.id == defn_values.c.alias)
+                        | (db.pkg.c.id == defn_values.c.id)
+                        | (db.pkg.c.slug == defn_values.c.alias)
+                    ),
+                )
+            ):
+                if row_mappings[index] is not None:
+                    raise MultipleResultsFound(f'more than one package matches {defns[index]}')
+                row_mappings[index] = dict(zip(db.pkg.c.keys(), values))
+        return row_mappings
+
+    def check_pkgs_exist(self, defns: Sequence[Defn]) -> list[bool]:
+        "Check whether the packages of a definition list are installed in one go."
+        return [m is not None for m in self._get_pkg_row_mappings(defns)]
+
+    def check_pkg_exists(self, defn: Defn) -> bool:
+        return self.check_pkgs_exist([defn])[0]
+
+    def get_pkgs(self, defns: Sequence[Defn]) -> list[models.Pkg | None]:
+        "Retrieve the installed packages of a definition list in one go."
+        row_mappings = self._get_pkg_row_mappings(defns)
+        pkgs = iter(
+            models.Pkg.from_row_mappings(self.database, [m for m in row_mappings if m is not None])
         )
+        return [None if m is None else next(pkgs) for m in row_mappings]
 
     def get_pkg(self, defn: Defn, partial_match: bool = False) -> models.Pkg | None:
         "Retrieve an installed package from a definition."
-        maybe_row_mapping = (
-            self.database.execute(
-                sa.select(db.pkg).filter(
-                    db.pkg.c.source == defn.source,
-                    (db.pkg.c.id == defn.alias)
-                    | (db.pkg.c.id == defn.id)
-                    | (db.pkg.c.slug == defn.alias),
-                )
-            )
-            .mappings()
-            .one_or_none()
-        )
+        (maybe_row_mapping,) = self._get_pkg_row_mappings([defn])
         if maybe_row_mapping is None and partial_match:
             maybe_row_mapping = (
                 self.database.execute(
@@ -451,9 +844,54 @@ class Manager:
         if maybe_row_mapping is not None:
             return models.Pkg.from_row_mapping(self.database, maybe_row_mapping)
 
+    def _get_pkg_files(self, pkg: models.Pkg) -> dict[str, tuple[int, int, int]]:
+        "Retrieve the CRC-32 checksum, size and modification time of installed files."
+        return {
+            f['name']: (f['crc32'], f['size'], f['mtime_ns'])
+            for f in self.database.execute(
+                sa.select(db.pkg_file).filter_by(pkg_source=pkg.source, pkg_id=pkg.id)
+            ).mappings()
+        }
+
+    def _insert_pkg_files(
+        self, pkg: models.Pkg, file_manifest: Mapping[str, tuple[int, int]]
+    ) -> None:
+        # Files are recorded as they are on disk after extraction so that
+        # we can tell whether they've since been modified
+        pkg_files: list[dict[str, object]] = []
+        for name, (crc32, _) in file_manifest.items():
+            stat = _stat_file(self.config.addon_dir / name)
+            if stat:
+                size, mtime_ns = stat
+                pkg_files.append(
+                    {
+                        'name': name,
+                        'crc32': crc32,
+                        'size': size,
+                        'mtime_ns': mtime_ns,
+                        'pkg_source': pkg.source,
+                        'pkg_id': pkg.id,
+                    }
+                )
+        if pkg_files:
+            self.database.execute(sa.insert(db.pkg_file), pkg_files)
+
+    def _get_addon_dir_names(self) -> Set[str]:
+        if self.addon_dir_model is not None:
+            return self.addon_dir_model.get_names()
+        return {f.name for f in self.config.addon_dir.iterdir()}
+
+    def _update_addon_dir_model(self, names: Iterable[str]) -> None:
+        # Changes are written through to the model for them to be reflected
+        # in the model straight away, ahead of the watcher catching up
+        if self.addon_dir_model is not None:
+            self.addon_dir_model.update(names)
+
     def install_pkg(self, pkg: models.Pkg, archive: Path, replace: bool) -> R.PkgInstalled:
         "Install a package."
-        with _open_pkg_archive(archive) as (top_level_folders, extract):
+        with _open_pkg_archive(archive) as pkg_archive:
+            top_level_folders = pkg_archive.base_dirs
+
             installed_conflicts = self.database.execute(
                 sa.select(db.pkg)
                 .distinct()
@@ -470,23 +908,31 @@ class Manager:
                     missing_ok=True,
                 )
             else:
-                unreconciled_conflicts = top_level_folders & {
-                    f.name for f in self.config.addon_dir.iterdir()
-                }
+                unreconciled_conflicts = top_level_folders & self._get_addon_dir_names()
                 if unreconciled_conflicts:
                     raise R.PkgConflictsWithUnreconciled(unreconciled_conflicts)
 
-            extract(self.config.addon_dir)
+            pkg_archive.extract(self.config.addon_dir)
+            self._update_addon_dir_model(top_level_folders)
 
         pkg = models.Pkg.parse_obj(
             {**pkg.__dict__, 'folders': [{'name': f} for f in sorted(top_level_folders)]}
         )
-        pkg.insert(self.database)
+        with self._pkg_changes():
+            pkg.insert(self.database)
+            self._insert_pkg_files(pkg, pkg_archive.file_manifest)
         return R.PkgInstalled(pkg)
 
     def update_pkg(self, pkg1: models.Pkg, pkg2: models.Pkg, archive: Path) -> R.PkgUpdated:
-        "Update a package."
-        with _open_pkg_archive(archive) as (top_level_folders, extract):
+        """Update a package.
+
+        Folders which are carried over from the installed version are patched
+        in place of being replaced wholesale, provided that we've kept
+        a record of the installed files.
+        """
+        with _open_pkg_archive(archive) as pkg_archive:
+            top_level_folders = pkg_archive.base_dirs
+
             installed_conflicts = self.database.execute(
                 sa.select(db.pkg)
                 .distinct()
@@ -500,24 +946,46 @@ class Manager:
             if installed_conflicts:
                 raise R.PkgConflictsWithInstalled(installed_conflicts)
 
-            unreconciled_conflicts = top_level_folders - {f.name for f in pkg1.folders} & {
-                f.name for f in self.config.addon_dir.iterdir()
-            }
+            unreconciled_conflicts = (
+                top_level_folders - {f.name for f in pkg1.folders} & self._get_addon_dir_names()
+            )
             if unreconciled_conflicts:
                 raise R.PkgConflictsWithUnreconciled(unreconciled_conflicts)
 
+            installed_files = self._get_pkg_files(pkg1)
+            patchable_folders = (
+                top_level_folders & {f.name for f in pkg1.folders}
+                if installed_files and pkg_archive.is_patchable and self._can_stage_pkg_folders()
+                else set()
+            )
+
             trash(
-                [self.config.addon_dir / f.name for f in pkg1.folders],
+                [
+                    self.config.addon_dir / f.name
+                    for f in pkg1.folders
+                    if f.name not in patchable_folders
+                ],
                 dest=self.config.temp_dir,
                 missing_ok=True,
             )
-            extract(self.config.addon_dir)
+            pkg_archive.extract(self.config.addon_dir, top_level_folders - patchable_folders)
+            for folder in patchable_folders:
+                pkg_archive.patch(
+                    self.config.addon_dir,
+                    folder,
+                    installed_files,
+                    self.config.staging_dir,
+                    self.config.temp_dir,
+                )
+            self._update_addon_dir_model(top_level_folders | {f.name for f in pkg1.folders})
 
         pkg2 = models.Pkg.parse_obj(
             {**pkg2.__dict__, 'folders': [{'name': f} for f in sorted(top_level_folders)]}
         )
-        pkg1.delete(self.database)
-        pkg2.insert(self.database)
+        with self._pkg_changes():
+            pkg1.delete(self.database)
+            pkg2.insert(self.database)
+            self._insert_pkg_files(pkg2, pkg_archive.file_manifest)
         return R.PkgUpdated(pkg1, pkg2)
 
     def remove_pkg(self, pkg: models.Pkg, keep_folders: bool) -> R.PkgRemoved:
@@ -528,21 +996,113 @@ class Manager:
                 dest=self.config.temp_dir,
                 missing_ok=True,
             )
+            self._update_addon_dir_model(f.name for f in pkg.folders)
 
-        pkg.delete(self.database)
+        with self._pkg_changes():
+            pkg.delete(self.database)
         return R.PkgRemoved(pkg)
 
+    async def _patch_raw_catalogue(self, raw_catalogue: str) -> str | None:
+        "Bring a previously downloaded catalogue up to date using the catalogue delta."
+        from aiohttp import ClientError
+
+        try:
+            delta = CatalogueDelta.parse_obj(
+                await cache_response(
+                    self,
+                    CATALOGUE_DELTA_URL,
+                    CATALOGUE_TTL,
+                    label='Synchronising catalogue',
+                    priority=RequestPriority.background,
+                )
+            )
+        except (ClientError, asyncio.TimeoutError, ValueError) as error:
+            logger.debug(f'unable to retrieve catalogue delta: {error!r}')
+            return None
+
+        patches = delta.get_patches_since(shasum(raw_catalogue))
+        if patches is None:
+            logger.debug('catalogue is too old to be patched')
+            return None
+        elif not patches:
+            return raw_catalogue
+
+        def apply_patches():
+            entries = Catalogue.parse_raw(raw_catalogue).__root__
+            for patch in patches:
+                entries = patch.apply(entries)
+            return Catalogue.parse_obj(entries).json(separators=(',', ':'))
+
+        patched_raw_catalogue = await t(apply_patches)()
+        if shasum(patched_raw_catalogue) != patches[-1].version:
+            logger.warning('patched catalogue does not match catalogue delta')
+            return None
+
+        logger.debug(f'applied {len(patches)} patches to catalogue')
+        return patched_raw_catalogue
+
+    async def _synchronise_raw_catalogue(self) -> str:
+        """Retrieve the latest catalogue in JSON.
+
+        The previously downloaded catalogue is patched if possible and
+        the catalogue is only downloaded in full if it can't be.
+        """
+        stored_raw_catalogue = raw_catalogue = None
+        raw_catalogue_path = await t(self.cache_store.get)('catalogue', CATALOGUE_URL.name)
+        if raw_catalogue_path is not None:
+            stored_raw_catalogue = await t(raw_catalogue_path.read_text)(encoding='utf-8')
+            raw_catalogue = await self._patch_raw_catalogue(stored_raw_catalogue)
+
+        if raw_catalogue is None:
+            raw_catalogue = await cache_response(
+                self,
+                CATALOGUE_URL,
+                CATALOGUE_TTL,
+                label='Synchronising catalogue',
+                is_json=False,
+                priority=RequestPriority.background,
+            )
+
+        if raw_catalogue != stored_raw_catalogue:
+            await t(self.cache_store.put_bytes)(
+                'catalogue', CATALOGUE_URL.name, raw_catalogue.encode('utf-8')
+            )
+        return raw_catalogue
+
     @_with_lock('load catalogue', False)
-    async def synchronise(self) -> Catalogue:
-        "Fetch the catalogue from the interwebs and load it."
-        if self._catalogue is None:
-            label = 'Synchronising catalogue'
-            url = (
-                'https://raw.githubusercontent.com/layday/instawow-data/data/'
-                'master-catalogue-v4.compact.json'
-            )  # v4
-            raw_catalogue = await cache_response(self, url, {'hours': 4}, label=label)
-            self._catalogue = Catalogue.parse_obj(raw_catalogue)
+    async def synchronise(self) -> CompactCatalogue:
+        """Fetch the catalogue from the interwebs and load it.
+
+        The catalogue is converted to the compact format once per download
+        and is memory-mapped from then on.  The catalogue is re-synchronised
+        once it's expired and the previous catalogue is closed if it's been
+        superseded.  Callers should therefore not hold on to the catalogue
+        past an ``await``.
+        """
+        if self._catalogue is None or self._catalogue_expires_at <= time.time():
+            raw_catalogue = await self._synchronise_raw_catalogue()
+            key = shasum(COMPACT_CATALOGUE_VERSION, raw_catalogue)
+            if self._catalogue is None or key != self._catalogue_key:
+                compact_catalogue = await t(self.cache_store.get)('catalogue', key)
+                if compact_catalogue is None:
+
+                    def encode_catalogue():
+                        catalogue = Catalogue.parse_raw(raw_catalogue)
+                        return CompactCatalogue.encode(catalogue.__root__)
+
+                    compact_catalogue = await t(self.cache_store.put_bytes)(
+                        'catalogue', key, await t(encode_catalogue)()
+                    )
+
+                catalogue = await t(CompactCatalogue.from_file)(compact_catalogue)
+                if self._catalogue is not None:
+                    self._catalogue.close()
+                self._catalogue = catalogue
+                self._catalogue_key = key
+
+            self._catalogue_expires_at = (
+                time.time() + datetime.timedelta(**CATALOGUE_TTL).total_seconds()
+            )
         return self._catalogue
 
     async def _resolve_deps(self, results: Iterable[Any]) -> dict[Defn, Any]:
@@ -623,8 +1183,6 @@ class Manager:
         ew = 0.5
         dw = 1 - ew
 
-        normalise = normalise_names('')
-
         if not sources:
             sources = self.resolvers.keys()
         else:
@@ -633,46 +1191,126 @@ class Manager:
                 raise ValueError(f'Unknown sources: {", ".join(unknown_sources)}')
 
         def make_filter():
-            def filter_game_flavour(entry: CatalogueEntry):
-                return self.config.game_flavour in entry.game_flavours
+            game_flavour = self.config.game_flavour
+
+            def filter_game_flavour(index: int):
+                return catalogue.supports_flavour(index, game_flavour)
 
             yield filter_game_flavour
 
             if sources is not None:
+                source_column = catalogue.get_column('source')
 
-                def filter_sources(entry: CatalogueEntry):
-                    return entry.source in sources
+                def filter_sources(index: int):
+                    return source_column[index] in sources
 
                 yield filter_sources
 
             if start_date is not None:
                 start_date_ = start_date
 
-                def filter_age(entry: CatalogueEntry):
-                    return entry.last_updated >= start_date_
+                def filter_age(index: int):
+                    return catalogue.get_last_updated(index) >= start_date_
 
                 yield filter_age
 
         filter_fns = list(make_filter())
 
-        s = normalise(search_terms)
-
-        tokens_to_entries = bucketise(
-            ((normalise(e.name), e) for e in catalogue.__root__ if all(f(e) for f in filter_fns)),
-            key=lambda v: v[0],
-        )
+        s = normalise_search_terms(search_terms)
+
+        def filter_token_entries(token_index: int):
+            return [
+                i
+                for i in catalogue.get_search_token_entries(token_index)
+                if all(f(i) for f in filter_fns)
+            ]
+
+        # Only names which share the most trigrams with the search terms
+        # are scored; this is a fraction of the catalogue for all but
+        # the shortest of search terms
+        tokens_to_indices = {
+            catalogue.get_search_token(t): i
+            for t in catalogue.find_search_tokens(s, max(limit * 50, 500))
+            for i in (filter_token_entries(t),)
+            if i
+        }
         matches = rapidfuzz.process.extract(
-            s, list(tokens_to_entries), scorer=rapidfuzz.fuzz.WRatio, limit=limit * 2
+            s, list(tokens_to_indices), scorer=rapidfuzz.fuzz.WRatio, limit=limit * 2
         )
-        weighted_entries = sorted(
+        weighted_indices = sorted(
             (
-                (-((s / 100) * ew + e.derived_download_score * dw), e)
+                (-((s / 100) * ew + catalogue.get_derived_download_score(i) * dw), i)
                 for m, s, _ in matches
-                for _, e in tokens_to_entries[m]
+                for i in tokens_to_indices[m]
             ),
             key=lambda v: v[0],
         )
-        return [e for _, e in weighted_entries[:limit]]
+        return [catalogue[i] for _, i in weighted_indices[:limit]]
+
+    async def _download_and_apply(
+        self, items: Iterable[tuple[Defn, models.Pkg, Callable[[Path], _T]]]
+    ) -> list[tuple[Defn, _T | R.ManagerError | R.InternalError]]:
+        """Download package archives concurrently and apply them as they arrive.
+
+        Each archive is handed over to ``apply`` as soon as its own download
+        has completed rather than after every download has.  Archives are
+        applied one at a time on a worker thread: the folder conflict checks
+        and the database writes of one package must not interleave with another's.
+        Where the same package is given more than once, e.g. with different
+        strategies, its archives are applied in the order given so that
+        the first of them wins.  The database changes of archives which
+        are applied back to back are committed together; the transaction is
+        not held open while waiting on downloads.
+        """
+        apply_lock = asyncio.Lock()
+        # The number of archives which are waiting to be applied or are being applied
+        queued_archives = 0
+
+        async def apply_queued(apply: Callable[[Path], _T], archive: Path):
+            nonlocal queued_archives
+            queued_archives += 1
+            async with apply_lock:
+                try:
+                    return await t(apply)(archive)
+                finally:
+                    queued_archives -= 1
+                    if not queued_archives:
+                        await t(self._checkpoint)()
+
+        async def download_and_apply(
+            pkg: models.Pkg,
+            apply: Callable[[Path], _T],
+            preceding: asyncio.Event | None,
+            done: asyncio.Event,
+        ):
+            try:
+                archive = await _download_pkg_archive(self, pkg)
+                if preceding:
+                    await preceding.wait()
+                return await apply_queued(apply, archive)
+            finally:
+                if preceding:
+                    await preceding.wait()
+                done.set()
+
+        items = list(items)
+        dones = [asyncio.Event() for _ in items]
+        precedings: list[asyncio.Event | None] = []
+        last_dones: dict[tuple[str, str], asyncio.Event] = {}
+        for (_, pkg, _), done in zip(items, dones):
+            precedings.append(last_dones.get((pkg.source, pkg.id)))
+            last_dones[pkg.source, pkg.id] = done
+
+        with self._unit_of_work():
+            results = await gather(
+                (
+                    download_and_apply(p, a, r, d)
+                    for (_, p, a), r, d in zip(items, precedings, dones)
+                ),
+                capture_manager_exc_async,
+            )
+        self._schedule_cache_eviction()
+        return [(d, r) for (d, _, _), r in zip(items, results)]
 
     @_with_lock('change state')
     async def install(
@@ -683,29 +1321,24 @@ class Manager:
         # doing it this way isn't particularly efficient but avoids having to
         # deal with local state in `resolve()`
         resolve_results = await self.resolve(
-            list(compress(defns, (not self.check_pkg_exists(d) for d in defns))),
+            list(compress(defns, (not e for e in self.check_pkgs_exist(defns)))),
             with_deps=True,
         )
         resolve_results = dict(
             compress(
-                resolve_results.items(), (not self.check_pkg_exists(d) for d in resolve_results)
+                resolve_results.items(),
+                (not e for e in self.check_pkgs_exist(list(resolve_results))),
             )
         )
         installables = {d: r for d, r in resolve_results.items() if models.is_pkg(r)}
-        archives = await gather(
-            (_download_pkg_archive(self, r) for r in installables.values()),
-            capture_manager_exc_async,
-        )
         results = chain_dict(
             defns,
             R.PkgAlreadyInstalled(),
             resolve_results.items(),
-            [
-                (d, await capture_manager_exc_async(t(self.install_pkg)(p, a, replace)))
-                if isinstance(a, PurePath)
-                else (d, a)
-                for (d, p), a in zip(installables.items(), archives)
-            ],
+            await self._download_and_apply(
+                (d, p, partial(self.install_pkg, p, replace=replace))
+                for d, p in installables.items()
+            ),
         )
         return results
 
@@ -719,7 +1352,7 @@ class Manager:
         to extract the strategy from the installed package; otherwise
         the ``Defn`` strategy will be used.
         """
-        defns_to_pkgs = {d: p for d in defns for p in (self.get_pkg(d),) if p}
+        defns_to_pkgs = {d: p for d, p in zip(defns, self.get_pkgs(defns)) if p}
         resolve_defns = {
             # Attach the source ID to each ``Defn`` from the
             # corresponding installed package.  Using the ID has the benefit
@@ -739,10 +1372,6 @@ class Manager:
             for o in (defns_to_pkgs[d],)
             if n.version != o.version
         }
-        archives = await gather(
-            (_download_pkg_archive(self, n) for _, n in updatables.values()),
-            capture_manager_exc_async,
-        )
         results = chain_dict(
             defns,
             R.PkgNotInstalled(),
@@ -751,12 +1380,9 @@ class Manager:
                 (d, R.PkgUpToDate(is_pinned=p.options.strategy == Strategy.version))
                 for d, p in installables.items()
             ),
-            [
-                (d, await capture_manager_exc_async(t(self.update_pkg)(o, n, a)))
-                if isinstance(a, PurePath)
-                else (d, a)
-                for (d, (o, n)), a in zip(updatables.items(), archives)
-            ],
+            await self._download_and_apply(
+                (d, n, partial(self.update_pkg, o, n)) for d, (o, n) in updatables.items()
+            ),
         )
         return results
 
@@ -765,22 +1391,20 @@ class Manager:
         self, defns: Sequence[Defn], keep_folders: bool
     ) -> dict[Defn, R.PkgRemoved | R.ManagerError | R.InternalError]:
         "Remove packages by their definition."
-        results = chain_dict(
-            defns,
-            R.PkgNotInstalled(),
-            [
-                (d, await capture_manager_exc_async(t(self.remove_pkg)(p, keep_folders)))
-                for d in defns
-                for p in (self.get_pkg(d),)
-                if p
-            ],
-        )
+        with self._unit_of_work():
+            results = chain_dict(
+                defns,
+                R.PkgNotInstalled(),
+                [
+                    (d, await capture_manager_exc_async(t(self.remove_pkg)(p, keep_folders)))
+                    for d, p in zip(defns, self.get_pkgs(defns))
+                    if p
+                ],
+            )
         return results
 
     @_with_lock('change state')
-    async def pin(
-        self, defns: Sequence[Defn]
-    ) -> dict[
+    async def pin(self, defns: Sequence[Defn]) -> dict[
         Defn,
         R.PkgNotInstalled
         | R.PkgInstalled
@@ -805,12 +1429,12 @@ class Manager:
                 raise R.PkgNotInstalled
 
             elif {defn.strategy} <= strategies <= self.resolvers[pkg.source].strategies:
-                self.database.execute(
-                    sa.update(db.pkg_options)
-                    .filter_by(pkg_source=pkg.source, pkg_id=pkg.id)
-                    .values(strategy=defn.strategy)
-                )
-                self.database.commit()
+                with self._pkg_changes():
+                    self.database.execute(
+                        sa.update(db.pkg_options)
+                        .filter_by(pkg_source=pkg.source, pkg_id=pkg.id)
+                        .values(strategy=defn.strategy)
+                    )
                 row_mapping = (
                     self.database.execute(
                         sa.select(db.pkg).filter_by(source=pkg.source, id=pkg.id)
@@ -823,7 +1447,11 @@ class Manager:
             else:
                 raise R.PkgStrategyUnsupported(Strategy.version)
 
-        return {d: await capture_manager_exc_async(t(pin)(d, self.get_pkg(d))) for d in defns}
+        with self._unit_of_work():
+            return {
+                d: await capture_manager_exc_async(t(pin)(d, p))
+                for d, p in zip(defns, self.get_pkgs(defns))
+            }
 
 
 async def is_outdated() -> tuple[bool, str]:
@@ -851,9 +1479,9 @@ async def is_outdated() -> tuple[bool, str]:
         version = cache_file.read_text(encoding='utf-8')
     else:
         try:
-            async with init_web_client(raise_for_status=True) as web_client, web_client.get(
-                'https://pypi.org/pypi/instawow/json'
-            ) as response:
+            async with init_web_client(
+                pooled=False, raise_for_status=True
+            ) as web_client, web_client.get('https://pypi.org/pypi/instawow/json') as response:
                 version = (await response.json())['info']['version']
         except ClientError:
             version = __version__
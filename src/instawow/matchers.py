@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+from collections import Counter
 from collections.abc import Iterable
-from contextlib import suppress
 from functools import total_ordering
+import json
+import os
+from pathlib import Path
 import re
 
 import sqlalchemy as sa
@@ -19,9 +22,11 @@ from .resolvers import (
     TukuiResolver,
     WowiResolver,
 )
-from .utils import TocReader, bucketise, cached_property, merge_intersecting_sets, uniq
+from .utils import DisjointSet, TocReader, bucketise, cached_property, uniq
 
 FolderAndDefnPairs: TypeAlias = 'list[tuple[list[AddonFolder], list[Defn]]]'
+# Maps TOC file paths to their modification time, size and entries
+_TocCache: TypeAlias = 'dict[str, tuple[int, int, dict[str, str]]]'
 
 
 _source_toc_ids = {
@@ -97,20 +102,95 @@ class AddonFolder:
         return self.toc_reader['Version', 'X-Packaged-Version', 'X-Curse-Packaged-Version'] or ''
 
 
+def get_toc_path(folder_path: Path, game_flavour: Flavour) -> Path | None:
+    "Find the TOC file of an add-on folder which is loaded by the game flavour."
+    for suffix in _flavour_toc_suffixes[game_flavour]:
+        toc_path = folder_path / (folder_path.name + suffix)
+        if toc_path.is_file():
+            return toc_path
+
+
+def _load_toc_cache(path: Path) -> _TocCache:
+    try:
+        return {k: tuple(v) for k, v in json.loads(path.read_text(encoding='utf-8')).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_toc_cache(path: Path, toc_cache: _TocCache) -> None:
+    from tempfile import NamedTemporaryFile
+
+    with NamedTemporaryFile(
+        'w', encoding='utf-8', dir=path.parent, prefix=f'{path.name}-', delete=False
+    ) as file:
+        json.dump(toc_cache, file)
+    os.replace(file.name, path)
+
+
 def get_unreconciled_folders(manager: manager.Manager) -> Iterable[AddonFolder]:
-    pkg_folders = manager.database.execute(sa.select(pkg_folder.c.name)).scalars().all()
-    unreconciled_folder_paths = (
-        p
-        for p in manager.config.addon_dir.iterdir()
-        if p.name not in pkg_folders and p.is_dir() and not p.is_symlink()
-    )
-    suppress_not_found_error = suppress(FileNotFoundError)
-    for path in unreconciled_folder_paths:
-        for suffix in _flavour_toc_suffixes[manager.config.game_flavour]:
-            with suppress_not_found_error:
-                toc_reader = TocReader.from_addon_path(path, suffix)
-                yield AddonFolder(path.name, toc_reader)
-                break
+    """Find the add-on folders which do not belong to a package.
+
+    TOC files are read concurrently and are cached for as long
+    as their modification time and size remain the same.  If the manager
+    is attached to an add-on folder model, the add-on folder is not
+    read at all.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    addon_dir = str(manager.config.addon_dir)
+    toc_suffixes = _flavour_toc_suffixes[manager.config.game_flavour]
+    pkg_folders = set(manager.database.execute(sa.select(pkg_folder.c.name)).scalars())
+    if manager.addon_dir_model is not None:
+        return [
+            a for a in manager.addon_dir_model.get_addon_folders() if a.name not in pkg_folders
+        ]
+
+    with os.scandir(addon_dir) as dir_entries:
+        unreconciled_folder_names = [
+            e.name
+            for e in dir_entries
+            if e.name not in pkg_folders and e.is_dir(follow_symlinks=False)
+        ]
+
+    toc_cache_path = manager.config.temp_dir / '.toc_cache.json'
+    toc_cache = _load_toc_cache(toc_cache_path)
+    new_toc_cache: _TocCache = {}
+
+    def read_toc(folder_name: str) -> AddonFolder | None:
+        for suffix in toc_suffixes:
+            toc_path = os.path.join(addon_dir, folder_name, folder_name + suffix)
+            try:
+                stat = os.stat(toc_path)
+                cached_toc = toc_cache.get(toc_path)
+                if cached_toc and cached_toc[:2] == (stat.st_mtime_ns, stat.st_size):
+                    entries = cached_toc[2]
+                else:
+                    entries = TocReader.from_addon_path(
+                        Path(addon_dir, folder_name), suffix
+                    ).entries
+            except FileNotFoundError:
+                continue
+
+            new_toc_cache[toc_path] = (stat.st_mtime_ns, stat.st_size, entries)
+            return AddonFolder(folder_name, TocReader.from_entries(entries))
+
+    with ThreadPoolExecutor() as executor:
+        addon_folders = list(executor.map(read_toc, unreconciled_folder_names))
+
+    # TOC files in other add-on folders are retained; those in this one which
+    # have gone missing or which belong to a package are discarded
+    addon_dir_prefix = os.path.join(addon_dir, '')
+    stale_toc_cache = {k: v for k, v in toc_cache.items() if k.startswith(addon_dir_prefix)}
+    if new_toc_cache != stale_toc_cache:
+        _save_toc_cache(
+            toc_cache_path,
+            {
+                **{k: v for k, v in toc_cache.items() if k not in stale_toc_cache},
+                **new_toc_cache,
+            },
+        )
+
+    return [a for a in addon_folders if a]
 
 
 def get_unreconciled_folder_set(manager: manager.Manager) -> frozenset[AddonFolder]:
@@ -121,11 +201,12 @@ async def match_toc_source_ids(
     manager: manager.Manager, leftovers: frozenset[AddonFolder]
 ) -> FolderAndDefnPairs:
     addons_with_toc_source_ids = [a for a in sorted(leftovers) if a.defns_from_toc]
-    merged_defns = list(
-        merge_intersecting_sets(a.defns_from_toc for a in addons_with_toc_source_ids)
-    )
+    overlapping_defns = DisjointSet[Defn]()
+    for addon in addons_with_toc_source_ids:
+        overlapping_defns.union(*addon.defns_from_toc)
+    merged_defns = overlapping_defns.components()
     folders_grouped_by_overlapping_defns = bucketise(
-        addons_with_toc_source_ids, lambda a: next(d for d in merged_defns if a.defns_from_toc & d)
+        addons_with_toc_source_ids, lambda a: merged_defns[next(iter(a.defns_from_toc))]
     )
     return [
         (f, sorted(b, key=lambda d: _source_sort_order.index(d.source)))
@@ -141,16 +222,28 @@ async def match_folder_name_subsets(
         return (-len(folders), _source_sort_order.index(defn.source))
 
     catalogue = await manager.synchronise()
+    source_column = catalogue.get_column('source')
+    id_column = catalogue.get_column('id')
+    folder_name_index = catalogue.get_folder_name_index(manager.config.game_flavour)
+
+    # A folder set is a subset of the leftovers if all of its folders are among them
+    folder_set_hits = Counter(p for a in leftovers for p in folder_name_index.get(a.name, ()))
+    leftovers_by_name = {a.name: a for a in leftovers}
     matches = [
-        (frozenset(e for e in leftovers if e.name in f), Defn(i.source, i.id))
-        for i in catalogue.__root__
-        if manager.config.game_flavour in i.game_flavours
-        for f in i.folders
-        if f <= leftovers
+        (
+            frozenset(leftovers_by_name[n] for n in catalogue.get_folder_set(s)),
+            Defn(source_column[i], id_column[i]),
+        )
+        for (i, s), c in sorted(folder_set_hits.items())
+        if c == catalogue.get_folder_set_size(s)
     ]
-    merged_folders = list(merge_intersecting_sets(f for f, _ in matches))
+
+    overlapping_folders = DisjointSet[AddonFolder]()
+    for folders, _ in matches:
+        overlapping_folders.union(*folders)
+    merged_folders = overlapping_folders.components()
     matches_grouped_by_overlapping_folder_names = bucketise(
-        matches, lambda v: next(f for f in merged_folders if v[0] & f)
+        matches, lambda v: merged_folders[next(iter(v[0]))]
     )
     return [
         (sorted(f), uniq(d for _, d in sorted(b, key=sort_key)))
@@ -165,10 +258,13 @@ async def match_addon_names_with_folder_names(
         return re.sub(r'[^0-9A-Za-z]', '', value.casefold())
 
     catalogue = await manager.synchronise()
+    source_column = catalogue.get_column('source')
+    id_column = catalogue.get_column('id')
+    name_column = catalogue.get_column('name')
     addon_names_to_catalogue_entries = bucketise(
-        catalogue.__root__, key=lambda i: normalise(i.name)
+        range(len(catalogue)), key=lambda i: normalise(name_column[i])
     )
     matches = (
         (a, addon_names_to_catalogue_entries.get(normalise(a.name))) for a in sorted(leftovers)
     )
-    return [([a], uniq(Defn(i.source, i.id) for i in m)) for a, m in matches if m]
+    return [([a], uniq(Defn(source_column[i], id_column[i]) for i in m)) for a, m in matches if m]
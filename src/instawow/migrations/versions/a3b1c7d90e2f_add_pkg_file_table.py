@@ -0,0 +1,39 @@
+"""
+Create the ``pkg_file`` table to track the files of installed packages.
+
+Revision ID: a3b1c7d90e2f
+Revises: 75f69831f74f
+Create Date: 2026-10-18 02:05:41.318204
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a3b1c7d90e2f'
+down_revision = '75f69831f74f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'pkg_file',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('crc32', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('mtime_ns', sa.Integer(), nullable=False),
+        sa.Column('pkg_source', sa.String(), nullable=False),
+        sa.Column('pkg_id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('pkg_source', 'pkg_id', 'name'),
+        sa.ForeignKeyConstraint(
+            ['pkg_source', 'pkg_id'],
+            ['pkg.source', 'pkg.id'],
+            name='fk_pkg_file_pkg_source_and_id',
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table('pkg_file')
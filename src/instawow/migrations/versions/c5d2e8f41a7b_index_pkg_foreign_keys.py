@@ -0,0 +1,34 @@
+"""
+Index ``pkg.slug`` and the foreign keys of the package tables.
+
+Revision ID: c5d2e8f41a7b
+Revises: a3b1c7d90e2f
+Create Date: 2026-10-18 09:12:27.604815
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8f41a7b'
+down_revision = 'a3b1c7d90e2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_pkg_slug', 'pkg', ['slug'])
+    op.create_index('ix_pkg_folder_pkg_source_and_id', 'pkg_folder', ['pkg_source', 'pkg_id'])
+    op.create_index('ix_pkg_dep_pkg_source_and_id', 'pkg_dep', ['pkg_source', 'pkg_id'])
+    op.create_index(
+        'ix_pkg_version_log_pkg_source_and_id_and_install_time',
+        'pkg_version_log',
+        ['pkg_source', 'pkg_id', 'install_time'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_pkg_version_log_pkg_source_and_id_and_install_time', 'pkg_version_log')
+    op.drop_index('ix_pkg_dep_pkg_source_and_id', 'pkg_dep')
+    op.drop_index('ix_pkg_folder_pkg_source_and_id', 'pkg_folder')
+    op.drop_index('ix_pkg_slug', 'pkg')
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
 from datetime import datetime
+from itertools import chain
+from operator import itemgetter
 import typing
 from typing import Any, Mapping
 
@@ -11,6 +15,7 @@ from typing_extensions import TypeAlias, TypeGuard
 
 from . import db
 from .common import Strategy
+from .utils import bucketise
 
 
 class _PkgOptions(BaseModel):
@@ -50,40 +55,73 @@ class Pkg(BaseModel):
     def from_row_mapping(
         cls, connection: sa_future.Connection, row_mapping: Mapping[str, Any]
     ) -> Pkg:
-        return cls.parse_obj(
-            {
-                **row_mapping,
-                'folders': connection.execute(
-                    sa.select(db.pkg_folder.c.name).filter_by(
-                        pkg_source=row_mapping['source'], pkg_id=row_mapping['id']
-                    )
-                )
-                .mappings()
-                .all(),
-                'options': connection.execute(
-                    sa.select(db.pkg_options.c.strategy).filter_by(
-                        pkg_source=row_mapping['source'], pkg_id=row_mapping['id']
-                    )
-                )
-                .mappings()
-                .one(),
-                'deps': connection.execute(
-                    sa.select(db.pkg_dep.c.id).filter_by(
-                        pkg_source=row_mapping['source'], pkg_id=row_mapping['id']
+        (pkg,) = cls.from_row_mappings(connection, [row_mapping])
+        return pkg
+
+    @classmethod
+    def from_row_mappings(
+        cls, connection: sa_future.Connection, row_mappings: Sequence[Mapping[str, Any]]
+    ) -> list[Pkg]:
+        "Load packages and their related rows in bulk, one query per table."
+
+        def select_related(
+            table: Any, *columns: Any, where: Sequence[Any] = (), order_by: Sequence[Any] = ()
+        ) -> defaultdict[tuple[str, str], list[Mapping[str, Any]]]:
+            # Chunked to stay within SQLite's default limit of 999 bound parameters
+            rows: Iterable[Mapping[str, Any]] = chain.from_iterable(
+                connection.execute(
+                    sa.select(table.c.pkg_source, table.c.pkg_id, *columns)
+                    .filter(
+                        sa.tuple_(table.c.pkg_source, table.c.pkg_id).in_(keys[i : i + 450]),
+                        *where,
                     )
-                )
-                .mappings()
-                .all(),
-                'logged_versions': connection.execute(
-                    sa.select(db.pkg_version_log)
-                    .filter_by(pkg_source=row_mapping['source'], pkg_id=row_mapping['id'])
-                    .order_by(db.pkg_version_log.c.install_time.desc())
-                    .limit(10)
-                )
-                .mappings()
-                .all(),
-            }
+                    .order_by(*order_by)
+                ).mappings()
+                for i in range(0, len(keys), 450)
+            )
+            return bucketise(rows, key=itemgetter('pkg_source', 'pkg_id'))
+
+        keys = [(r['source'], r['id']) for r in row_mappings]
+        if not keys:
+            return []
+
+        pkg_version_log = typing.cast(Any, db.pkg_version_log)
+        # Versions are ranked from newest to oldest so that only the last 10
+        # versions of every package are retrieved.  The package filter is applied
+        # to the ranked versions; SQLite pushes it down into the subquery
+        # because it only constrains the partition columns
+        ranked_versions: Any = sa.select(
+            pkg_version_log,
+            sa.func.row_number()
+            .over(
+                partition_by=(pkg_version_log.c.pkg_source, pkg_version_log.c.pkg_id),
+                order_by=pkg_version_log.c.install_time.desc(),
+            )
+            .label('rank'),
+        ).subquery()
+
+        folders = select_related(db.pkg_folder, db.pkg_folder.c.name)
+        options = select_related(db.pkg_options, db.pkg_options.c.strategy)
+        deps = select_related(db.pkg_dep, db.pkg_dep.c.id)
+        logged_versions = select_related(
+            ranked_versions,
+            ranked_versions.c.version,
+            ranked_versions.c.install_time,
+            where=[ranked_versions.c.rank <= 10],
+            order_by=[ranked_versions.c.install_time.desc()],
         )
+        return [
+            cls.parse_obj(
+                {
+                    **r,
+                    'folders': folders[k],
+                    'options': options[k][0],
+                    'deps': deps[k],
+                    'logged_versions': logged_versions[k],
+                }
+            )
+            for r, k in zip(row_mappings, keys)
+        ]
 
     def insert(self, connection: sa_future.Connection) -> None:
         pkg_dict = self.dict()
@@ -126,9 +164,11 @@ class Pkg(BaseModel):
                 }
             ],
         )
-        connection.commit()
 
     def delete(self, connection: sa_future.Connection) -> None:
+        connection.execute(
+            sa.delete(db.pkg_file).filter_by(pkg_source=self.source, pkg_id=self.id),
+        )
         connection.execute(
             sa.delete(db.pkg_dep).filter_by(pkg_source=self.source, pkg_id=self.id),
         )
@@ -141,7 +181,6 @@ class Pkg(BaseModel):
         connection.execute(
             sa.delete(db.pkg).filter_by(source=self.source, id=self.id),
         )
-        connection.commit()
 
     # Pydantic sets this to ``None`` unless the model is marked as "frozen",
     # presumably because it overrides ``__eq__``, which we're not interested in.
@@ -0,0 +1,221 @@
+"""Schedule web requests within per-host budgets.
+
+Requests to a host are admitted through a token bucket and a concurrency
+limit, in order of priority.  Hosts which signal that they are rate limiting
+us are left alone until the limit is reset and requests which fail with
+a 429 or a 5xx status are retried with jittered exponential backoff.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from enum import IntEnum
+import heapq
+from itertools import count
+import random
+import time
+from typing import Any, AsyncContextManager
+from weakref import WeakKeyDictionary
+
+from loguru import logger
+from yarl import URL
+
+from . import _deferred_types
+
+
+class RequestPriority(IntEnum):
+    "Requests of a higher priority are admitted ahead of those of a lower priority."
+    interactive = 0
+    background = 1
+
+
+def parse_rate_limit_delay(headers: Mapping[str, str]) -> float | None:
+    """Extract the number of seconds until we're allowed to make another request
+    from ``Retry-After`` or from ``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``.
+    """
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+            except (TypeError, ValueError):
+                pass
+
+    if headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            return max(float(headers['X-RateLimit-Reset']) - time.time(), 0)
+        except (KeyError, ValueError):
+            pass
+
+
+class _HostQueue:
+    def __init__(self, burst: int) -> None:
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self.wakeup: asyncio.TimerHandle | None = None
+
+
+class RequestScheduler:
+    # Requests per second and the number of requests which can be made in quick succession
+    rate = 10.0
+    burst = 20
+    # The same as the connector's ``limit_per_host``; requests are queued here
+    # rather than in the connector so that they can be ordered by priority
+    max_concurrency = 10
+    max_retries = 3
+    retry_base_delay = 0.5
+    # We will not wait any longer than this for a rate limit to be reset
+    max_delay = 60.0
+
+    def __init__(self) -> None:
+        self._queues: defaultdict[str | None, _HostQueue] = defaultdict(
+            lambda: _HostQueue(self.burst)
+        )
+        self._counter = count()
+
+    def _dispatch(self, queue: _HostQueue) -> None:
+        now = time.monotonic()
+        queue.tokens = min(self.burst, queue.tokens + (now - queue.updated_at) * self.rate)
+        queue.updated_at = now
+
+        while queue.waiters and queue.in_flight < self.max_concurrency:
+            blocked_for = queue.blocked_until - now
+            delay = max(
+                # Let requests through if we're not gonna wait for the limit to be reset;
+                # they'll fail and the error will be reported back to the user
+                blocked_for if blocked_for <= self.max_delay else 0,
+                (1 - queue.tokens) / self.rate,
+            )
+            if delay > 0:
+                if queue.wakeup is None:
+                    queue.wakeup = asyncio.get_running_loop().call_later(delay, self._wake, queue)
+                return
+
+            *_, future = heapq.heappop(queue.waiters)
+            if not future.done():  # Cancelled
+                future.set_result(None)
+                queue.tokens -= 1
+                queue.in_flight += 1
+
+    def _wake(self, queue: _HostQueue) -> None:
+        queue.wakeup = None
+        self._dispatch(queue)
+
+    async def _acquire(self, queue: _HostQueue, priority: RequestPriority) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._counter), future))
+        self._dispatch(queue)
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self._release(queue)
+            raise
+
+    def _release(self, queue: _HostQueue) -> None:
+        queue.in_flight -= 1
+        self._dispatch(queue)
+
+    def _get_retry_delay(
+        self, queue: _HostQueue, status: int, headers: Mapping[str, str], attempt: int
+    ) -> float | None:
+        rate_limit_delay = parse_rate_limit_delay(headers)
+        if rate_limit_delay is not None and (
+            status in {403, 429, 503} or headers.get('X-RateLimit-Remaining') == '0'
+        ):
+            queue.blocked_until = max(queue.blocked_until, time.monotonic() + rate_limit_delay)
+
+        is_retriable = (
+            status == 429 or status >= 500 or (status == 403 and rate_limit_delay is not None)
+        )
+        if not is_retriable or attempt >= self.max_retries:
+            return None
+        elif rate_limit_delay is None:
+            return random.uniform(0, min(self.retry_base_delay * 2**attempt, self.max_delay))
+        elif rate_limit_delay <= self.max_delay:
+            return rate_limit_delay
+
+    @asynccontextmanager
+    async def request(
+        self,
+        web_client: _deferred_types.aiohttp.ClientSession,
+        method: str,
+        url: str | URL,
+        *,
+        priority: RequestPriority = RequestPriority.interactive,
+        **kwargs: Any,
+    ) -> AsyncIterator[_deferred_types.aiohttp.ClientResponse]:
+        "Make a request once the host's budget allows it, retrying it if it fails."
+        from aiohttp import ClientResponseError
+
+        queue = self._queues[URL(url).host]
+
+        for attempt in count():
+            await self._acquire(queue, priority)
+            try:
+                try:
+                    response = await web_client.request(method, url, **kwargs)
+                except ClientResponseError as error:
+                    retry_delay = self._get_retry_delay(
+                        queue, error.status, error.headers or {}, attempt
+                    )
+                    if retry_delay is None:
+                        raise
+                else:
+                    retry_delay = self._get_retry_delay(
+                        queue, response.status, response.headers, attempt
+                    )
+                    if retry_delay is None:
+                        async with response:
+                            yield response
+                        return
+
+                    response.release()
+            finally:
+                self._release(queue)
+
+            logger.debug(f'retrying {method} {url} in {retry_delay:.1f}s')
+            await asyncio.sleep(retry_delay)
+
+
+_request_schedulers: WeakKeyDictionary[
+    _deferred_types.aiohttp.ClientSession, RequestScheduler
+] = WeakKeyDictionary()
+
+
+def get_request_scheduler(web_client: _deferred_types.aiohttp.ClientSession) -> RequestScheduler:
+    "Retrieve the request scheduler of a web client session."
+    request_scheduler = _request_schedulers.get(web_client)
+    if request_scheduler is None:
+        request_scheduler = _request_schedulers[web_client] = RequestScheduler()
+    return request_scheduler
+
+
+def schedule_request(
+    web_client: _deferred_types.aiohttp.ClientSession,
+    method: str,
+    url: str | URL,
+    *,
+    priority: RequestPriority = RequestPriority.interactive,
+    **kwargs: Any,
+) -> AsyncContextManager[_deferred_types.aiohttp.ClientResponse]:
+    """Make a request through the web client's scheduler.
+
+    This is to be used as an async context manager in place of
+    ``web_client.request``.
+    """
+    return get_request_scheduler(web_client).request(
+        web_client, method, url, priority=priority, **kwargs
+    )
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from collections.abc import AsyncIterator, Sequence, Set
-from datetime import datetime, timezone
+from collections import deque
+from collections.abc import AsyncIterator, Iterator, Mapping, Sequence, Set
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from enum import IntEnum
-from itertools import chain, takewhile
+from itertools import chain, islice, takewhile
 import re
 import typing
 from typing import TYPE_CHECKING, Any, ClassVar
@@ -17,7 +19,15 @@ from . import _deferred_types, manager, models
 from . import results as R
 from .common import Strategy
 from .config import Flavour
-from .utils import StrEnum, bucketise, cached_property, gather, normalise_names, uniq
+from .request_scheduler import RequestPriority, schedule_request
+from .utils import (
+    StrEnum,
+    cached_property,
+    gather,
+    merge_async_iterables,
+    normalise_names,
+    uniq,
+)
 
 if TYPE_CHECKING:  # pragma: no cover
     from typing_extensions import NotRequired as N
@@ -72,7 +82,10 @@ def _format_data_changelog(changelog: str = '') -> str:
     return f'data:,{urllib.parse.quote(changelog)}'
 
 
-class CatatalogueBaseEntry(BaseModel):
+class CatatalogueBaseEntry(
+    BaseModel,
+    json_encoders={set: sorted},
+):
     source: str
     id: str
     slug: str = ''
@@ -94,32 +107,175 @@ class Catalogue(
 ):
     __root__: typing.List[CatalogueEntry]
 
-    @classmethod
-    async def collate(cls, start_date: datetime | None) -> Catalogue:
+    @staticmethod
+    @asynccontextmanager
+    async def collate(start_date: datetime | None) -> AsyncIterator[Iterator[CatalogueEntry]]:
+        """Collect add-ons from every source concurrently.
+
+        The download score of an add-on can only be derived once every add-on
+        of its source has been collected; in the meantime add-ons are spooled
+        to a temporary file, which is removed on exiting the context.
+        The context yields an iterator which reads them back.
+        """
+        from tempfile import TemporaryFile
+
+        most_downloads_per_source: dict[str, int] = {}
+
+        with TemporaryFile('w+', encoding='utf-8') as spool:
+            async with manager.init_web_client() as web_client:
+                async for item in merge_async_iterables(
+                    r.catalogue(web_client) for r in manager.Manager.RESOLVERS
+                ):
+                    most_downloads_per_source[item.source] = max(
+                        most_downloads_per_source.get(item.source, 0), item.download_count
+                    )
+                    if start_date is None or item.last_updated >= start_date:
+                        spool.write(item.json() + '\n')
+
+            def read_entries():
+                spool.seek(0)
+                for line in spool:
+                    item = CatatalogueBaseEntry.parse_raw(line)
+                    yield CatalogueEntry.construct(
+                        **item.__dict__,
+                        derived_download_score=item.download_count
+                        / most_downloads_per_source[item.source],
+                    )
+
+            yield read_entries()
+
+    async def update(
+        self, start_date: datetime | None, *, refresh: bool = False
+    ) -> tuple[list[CatalogueEntry], list[CatalogueEntry], list[tuple[str, str]]]:
+        """Collect add-ons which have been updated since the catalogue was collated
+        and merge them into it.
+
+        Add-ons are only retrieved from a source if they were updated after
+        the most recently updated add-on of that source in the catalogue,
+        which means that the download counts of the remaining add-ons go stale.
+        If ``refresh`` is true, every add-on is retrieved instead, refreshing
+        download counts and dropping add-ons which have been deleted from
+        their source; this should be done periodically.
+        Returns the merged entries, the entries which were added or modified
+        and the ``(source, id)`` pairs of entries which were removed.
+        """
+        since_per_source: dict[str, datetime] = {}
+        if not refresh:
+            for entry in self.__root__:
+                since = since_per_source.get(entry.source)
+                if since is None or entry.last_updated > since:
+                    since_per_source[entry.source] = entry.last_updated
+
+        entries = {(e.source, e.id): e for e in self.__root__}
+        retrieved_keys: set[tuple[str, str]] = set()
+        changed_keys: set[tuple[str, str]] = set()
+
         async with manager.init_web_client() as web_client:
-            items = [a for r in manager.Manager.RESOLVERS async for a in r.catalogue(web_client)]
+            async for item in merge_async_iterables(
+                r.catalogue(web_client, since_per_source.get(r.source))
+                for r in manager.Manager.RESOLVERS
+            ):
+                key = (item.source, item.id)
+                retrieved_keys.add(key)
 
-        most_downloads_per_source = {
-            s: max(e.download_count for e in i)
-            for s, i in bucketise(items, key=lambda v: v.source).items()
-        }
-        entries = (
-            CatalogueEntry(
-                **i.__dict__,
-                derived_download_score=i.download_count / most_downloads_per_source[i.source],
+                if start_date is not None and item.last_updated < start_date:
+                    continue
+
+                entry = entries.get(key)
+                if entry is None or entry.dict(exclude={'derived_download_score'}) != item.dict():
+                    entries[key] = CatalogueEntry.construct(
+                        **item.__dict__, derived_download_score=0.0
+                    )
+                    changed_keys.add(key)
+
+        removed_keys = [
+            k
+            for k, e in entries.items()
+            if (start_date is not None and e.last_updated < start_date)
+            or (refresh and k not in retrieved_keys)
+        ]
+        for key in removed_keys:
+            del entries[key]
+            changed_keys.discard(key)
+
+        # Download scores are normalised against the most downloaded add-on
+        # of each source; if that has changed, every add-on of the source is rescored
+        most_downloads_per_source: dict[str, int] = {}
+        for entry in entries.values():
+            most_downloads_per_source[entry.source] = max(
+                most_downloads_per_source.get(entry.source, 0), entry.download_count
             )
-            for i in items
+
+        for key, entry in entries.items():
+            derived_download_score = entry.download_count / most_downloads_per_source[entry.source]
+            if entry.derived_download_score != derived_download_score:
+                entries[key] = CatalogueEntry.construct(
+                    **{**entry.__dict__, 'derived_download_score': derived_download_score}
+                )
+                changed_keys.add(key)
+
+        return (
+            list(entries.values()),
+            [e for k, e in entries.items() if k in changed_keys],
+            removed_keys,
         )
-        if start_date is not None:
-            entries = (e for e in entries if e.last_updated >= start_date)
-        catalogue = cls.parse_obj(list(entries))
-        return catalogue
 
     @cached_property
     def curse_slugs(self) -> dict[str, str]:
         return {a.slug: a.id for a in self.__root__ if a.source == 'curse'}
 
 
+class CatalogueDeltaPatch(
+    BaseModel,
+    json_encoders={set: sorted},
+):
+    """A set of changes to a catalogue.
+
+    Catalogue versions are the ``shasum`` of the compact catalogue
+    and entries are identified by their source and ID.
+    """
+
+    base_version: str
+    version: str
+    upserted: typing.List[CatalogueEntry] = []
+    removed: typing.List[typing.Tuple[str, str]] = []
+
+    def apply(self, entries: Sequence[CatalogueEntry]) -> list[CatalogueEntry]:
+        """Apply the patch to the entries of the base catalogue.
+
+        Modified entries retain their position and new entries are appended,
+        as they are when the catalogue is updated.
+        """
+        removed = set(self.removed)
+        upserted = {(e.source, e.id): e for e in self.upserted}
+        patched_entries = [
+            upserted.pop((e.source, e.id), e) for e in entries if (e.source, e.id) not in removed
+        ]
+        patched_entries.extend(upserted.values())
+        return patched_entries
+
+
+class CatalogueDelta(
+    BaseModel,
+    json_encoders={set: sorted},
+):
+    "The patches leading up to the latest version of the catalogue, oldest first."
+
+    __root__: typing.List[CatalogueDeltaPatch]
+
+    def get_patches_since(self, version: str) -> list[CatalogueDeltaPatch] | None:
+        """Retrieve the patches which bring a catalogue at ``version`` up to date.
+
+        ``None`` is returned if ``version`` predates the oldest patch.
+        """
+        for index, patch in enumerate(self.__root__):
+            if patch.base_version == version:
+                return self.__root__[index:]
+        if self.__root__ and self.__root__[-1].version == version:
+            return []
+        return None
+
+
 class Resolver(Protocol):
     source: ClassVar[str]
     name: ClassVar[str]
@@ -143,9 +299,12 @@ class Resolver(Protocol):
 
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
-        "Yield add-ons from source for cataloguing."
+        """Yield add-ons from source for cataloguing.
+
+        If ``since`` is given, add-ons which have not been updated since may be omitted.
+        """
         return
         yield
 
@@ -182,7 +341,7 @@ class BaseResolver(Resolver):
 
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
         return
         yield
@@ -208,6 +367,7 @@ class _CurseAddon(TypedDict):
     gameVersionLatestFiles: list[_CurseAddon_GameVersionFile]
     slug: str  # URL slug; 'molinari' in 'https://www.curseforge.com/wow/addons/molinari'
     dateReleased: str  # ISO datetime of latest release
+    dateModified: str  # ISO datetime of last modification
 
 
 class _CurseAddon_File(TypedDict):
@@ -272,6 +432,11 @@ class _CurseFile(TypedDict):
     gameVersionFlavor: Literal['wow_burning_crusade', 'wow_classic', 'wow_retail']
 
 
+class _CurseFileIndex(TypedDict):
+    display_names: dict[str, _CurseFile]
+    ids: dict[str, _CurseFile]
+
+
 class CurseResolver(BaseResolver):
     source = 'curse'
     name = 'CurseForge'
@@ -288,6 +453,16 @@ class CurseResolver(BaseResolver):
     # Reference: https://twitchappapi.docs.apiary.io/
     addon_api_url = URL('https://addons-ecs.forgesvc.net/api/v2/addon')
 
+    # The number of search pages to fetch ahead when cataloguing
+    catalogue_page_concurrency = 8
+
+    # The maximum number of add-on file lists to fetch concurrently
+    file_list_concurrency = 8
+
+    def __init__(self, manager: manager.Manager) -> None:
+        super().__init__(manager)
+        self._file_indices: dict[str, tuple[float, _CurseFileIndex]] = {}
+
     @staticmethod
     def get_alias_from_url(url: URL) -> str | None:
         if (
@@ -319,6 +494,26 @@ class CurseResolver(BaseResolver):
             json_response = []
 
         api_results = {str(r['id']): r for r in json_response}
+
+        # Fetch the file lists of add-ons pinned to a version ahead of
+        # resolving them, once per add-on and a few at a time.
+        # Errors are re-raised in ``resolve_one``
+        versioned_ids = uniq(
+            i
+            for d, i in defns_to_ids.items()
+            if d.strategy is Strategy.version and i in api_results
+        )
+        if versioned_ids:
+            import asyncio
+
+            semaphore = asyncio.Semaphore(self.file_list_concurrency)
+
+            async def prefetch_file_index(addon_id: str):
+                async with semaphore:
+                    await self._get_file_index(addon_id)
+
+            await asyncio.gather(*map(prefetch_file_index, versioned_ids), return_exceptions=True)
+
         results = await gather(
             (self.resolve_one(d, api_results.get(i)) for d, i in defns_to_ids.items()),
             manager.capture_manager_exc_async,
@@ -330,14 +525,11 @@ class CurseResolver(BaseResolver):
             raise R.PkgNonexistent
 
         if defn.strategy is Strategy.version:
-            all_files: list[_CurseFile] = await manager.cache_response(
-                self.manager,
-                self.addon_api_url / str(metadata['id']) / 'files',
-                {'hours': 1},
-                label=f'Fetching metadata from {self.name}',
+            assert defn.version
+            file_index = await self._get_file_index(str(metadata['id']))
+            file = file_index['display_names'].get(defn.version) or file_index['ids'].get(
+                defn.version
             )
-
-            file = next((f for f in all_files if defn.version == f['displayName']), None)
             if file is None:
                 raise R.PkgFileUnavailable(f'version {defn.version} not found')
 
@@ -422,10 +614,44 @@ class CurseResolver(BaseResolver):
             deps=[{'id': d['addonId']} for d in file['dependencies'] if d['type'] == 3],
         )
 
+    async def _get_file_index(self, addon_id: str) -> _CurseFileIndex:
+        """Retrieve the files of an add-on indexed by display name and file ID.
+
+        The file list is persisted and revalidated by ``cache_response``
+        and the index is kept on the resolver for as long as the file list is fresh.
+        """
+        import time
+
+        ttl = {'hours': 1}
+
+        cached_file_index = self._file_indices.get(addon_id)
+        if cached_file_index is not None:
+            expires_at, file_index = cached_file_index
+            if expires_at > time.time():
+                return file_index
+
+        all_files: list[_CurseFile] = await manager.cache_response(
+            self.manager,
+            self.addon_api_url / addon_id / 'files',
+            ttl,
+            label=f'Fetching metadata from {self.name}',
+        )
+        file_index: _CurseFileIndex = {
+            # The first file with a given display name wins
+            'display_names': {f['displayName']: f for f in reversed(all_files)},
+            'ids': {str(f['id']): f for f in all_files},
+        }
+        self._file_indices[addon_id] = (time.time() + timedelta(**ttl).total_seconds(), file_index)
+        return file_index
+
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
+        import asyncio
+
+        from pydantic.datetime_parse import parse_datetime
+
         def supports_x(files: list[_CurseAddon_File]):
             def excise_flavour(
                 curse_flavor: _CurseFlavor,
@@ -459,34 +685,61 @@ class CurseResolver(BaseResolver):
             )
 
         step = 50
-        sort_order = '3'  # Alphabetical
-        for index in range(0, 10001 - step, step):
-            async with web_client.get(
+        if since is None:
+            query = {'sort': '3'}  # Alphabetical
+        else:
+            # Most recently updated first; we stop at the first add-on updated before ``since``
+            query = {'sort': '2', 'sortDescending': 'true'}
+
+        async def fetch_page(index: int) -> list[_CurseAddon]:
+            async with schedule_request(
+                web_client,
+                'GET',
                 (cls.addon_api_url / 'search').with_query(
-                    gameId='1', sort=sort_order, pageSize=step, index=index
-                )
+                    gameId='1', pageSize=step, index=index, **query
+                ),
+                priority=RequestPriority.background,
             ) as response:
-                items: list[_CurseAddon] = await response.json()
-
-            if not items:
-                break
+                return await response.json()
 
-            for item in items:
-                folders = uniq(
-                    frozenset(m['foldername'] for m in f['modules'])
-                    for f in item['latestFiles']
-                    if not f['exposeAsAlternative']
-                )
-                yield CatatalogueBaseEntry(
-                    source=cls.source,
-                    id=item['id'],
-                    slug=item['slug'],
-                    name=item['name'],
-                    game_flavours=supports_x(item['latestFiles']),
-                    folders=folders,
-                    download_count=item['downloadCount'],
-                    last_updated=item['dateReleased'],
-                )
+        # Pages are fetched a few at a time ahead of being consumed
+        indices = iter(range(0, 10001 - step, step))
+        pages = deque(
+            asyncio.ensure_future(fetch_page(i))
+            for i in islice(indices, cls.catalogue_page_concurrency)
+        )
+        try:
+            while pages:
+                items = await pages.popleft()
+                if not items:
+                    break
+
+                next_index = next(indices, None)
+                if next_index is not None:
+                    pages.append(asyncio.ensure_future(fetch_page(next_index)))
+
+                for item in items:
+                    if since is not None and parse_datetime(item['dateModified']) < since:
+                        return
+
+                    folders = uniq(
+                        frozenset(m['foldername'] for m in f['modules'])
+                        for f in item['latestFiles']
+                        if not f['exposeAsAlternative']
+                    )
+                    yield CatatalogueBaseEntry(
+                        source=cls.source,
+                        id=item['id'],
+                        slug=item['slug'],
+                        name=item['name'],
+                        game_flavours=supports_x(item['latestFiles']),
+                        folders=folders,
+                        download_count=item['downloadCount'],
+                        last_updated=item['dateReleased'],
+                    )
+        finally:
+            for page in pages:
+                page.cancel()
 
 
 class _WowiCommonTerms(TypedDict):
@@ -629,15 +882,17 @@ class WowiResolver(BaseResolver):
 
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
         flavours = set(Flavour)
 
-        async with web_client.get(cls.list_api_url) as response:
+        async with schedule_request(
+            web_client, 'GET', cls.list_api_url, priority=RequestPriority.background
+        ) as response:
             items: list[_WowiListApiItem] = await response.json()
 
         for item in items:
-            yield CatatalogueBaseEntry(
+            entry = CatatalogueBaseEntry(
                 source=cls.source,
                 id=item['UID'],
                 name=item['UIName'],
@@ -646,6 +901,8 @@ class WowiResolver(BaseResolver):
                 download_count=item['UIDownloadTotal'],
                 last_updated=item['UIDate'],
             )
+            if since is None or entry.last_updated >= since:
+                yield entry
 
 
 class _TukuiUi(TypedDict):
@@ -797,24 +1054,43 @@ class TukuiResolver(BaseResolver):
 
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
         async def fetch_ui(ui_slug: str) -> list[_TukuiUi]:
-            async with web_client.get(cls.api_url.with_query({'ui': ui_slug})) as response:
+            async with schedule_request(
+                web_client,
+                'GET',
+                cls.api_url.with_query({'ui': ui_slug}),
+                priority=RequestPriority.background,
+            ) as response:
                 return [await response.json(content_type=None)]  # text/html
 
         async def fetch_addons(query: str) -> list[_TukuiAddon]:
-            async with web_client.get(cls.api_url.with_query({query: 'all'})) as response:
+            async with schedule_request(
+                web_client,
+                'GET',
+                cls.api_url.with_query({query: 'all'}),
+                priority=RequestPriority.background,
+            ) as response:
                 return await response.json(content_type=None)  # text/html
 
-        for flavours, item_coro in [
+        flavours_and_item_coros = [
             ({Flavour.retail}, fetch_ui('tukui')),
             ({Flavour.retail}, fetch_ui('elvui')),
             ({Flavour.retail}, fetch_addons('addons')),
             ({Flavour.vanilla_classic}, fetch_addons('classic-addons')),
             ({Flavour.burning_crusade_classic}, fetch_addons('classic-tbc-addons')),
-        ]:
-            for item in await item_coro:
+        ]
+        for (flavours, _), items in zip(
+            flavours_and_item_coros, await gather(c for _, c in flavours_and_item_coros)
+        ):
+            for item in items:
+                last_updated = datetime.fromisoformat(item['lastupdate']).replace(
+                    tzinfo=timezone.utc
+                )
+                if since is not None and last_updated < since:
+                    continue
+
                 yield CatatalogueBaseEntry(
                     source=cls.source,
                     id=item['id'],
@@ -826,9 +1102,7 @@ class TukuiResolver(BaseResolver):
                     # This should help with scoring other add-ons on the
                     # Tukui catalogue higher
                     download_count=int(item['downloads']) // (2 if item['id'] in {-1, -2} else 1),
-                    last_updated=datetime.fromisoformat(item['lastupdate']).replace(
-                        tzinfo=timezone.utc
-                    ),
+                    last_updated=last_updated,
                 )
 
 
@@ -889,20 +1163,38 @@ class GithubResolver(BaseResolver):
         if url.host == 'github.com' and len(url.parts) > 2:
             return '/'.join(url.parts[1:3])
 
-    async def resolve_one(self, defn: Defn, metadata: None) -> models.Pkg:
-        from aiohttp import ClientResponseError
+    async def _cache_response(self, url: URL, ttl: Mapping[str, float]) -> Any:
+        """Make a cached request, reporting when we've run out of requests.
 
-        repo_url = self.repos_api_url / defn.alias
+        Unauthenticated clients are allowed 60 requests an hour.  Revalidating
+        a cached response does not count towards the limit.  The request scheduler
+        waits for the limit to be reset if it is reset soon enough.
+        """
+        from aiohttp import ClientResponseError
 
         try:
-            project_metadata: _GithubRepo = await manager.cache_response(
-                self.manager, repo_url, {'hours': 1}
-            )
+            return await manager.cache_response(self.manager, url, ttl)
         except ClientResponseError as error:
-            if error.status == 404:
-                raise R.PkgNonexistent
+            if (
+                error.status in {403, 429}
+                and error.headers
+                and error.headers.get('X-RateLimit-Remaining') == '0'
+            ):
+                reset = datetime.fromtimestamp(
+                    float(error.headers.get('X-RateLimit-Reset', 0)), timezone.utc
+                )
+                raise R.PkgFileUnavailable(
+                    f'{self.name} rate limit exceeded until {reset:%Y-%m-%d %H:%M:%S} UTC'
+                )
             raise
 
+    async def resolve_one(self, defn: Defn, metadata: None) -> models.Pkg:
+        import asyncio
+
+        from aiohttp import ClientResponseError
+
+        repo_url = self.repos_api_url / defn.alias
+
         if defn.strategy is Strategy.version:
             assert defn.version
             release_url = repo_url / 'releases/tags' / defn.version
@@ -914,14 +1206,28 @@ class GithubResolver(BaseResolver):
             # See: https://docs.github.com/en/free-pro-team@latest/rest/reference/repos#get-the-latest-release
             release_url = repo_url / 'releases/latest'
 
-        async with self.manager.web_client.get(release_url) as response:
-            if response.status == 404:
+        # The repo and the release are fetched concurrently
+        repo_response, release_response = await asyncio.gather(
+            self._cache_response(repo_url, {'hours': 1}),
+            self._cache_response(release_url, {'hours': 1}),
+            return_exceptions=True,
+        )
+        if isinstance(repo_response, BaseException):
+            if isinstance(repo_response, ClientResponseError) and repo_response.status == 404:
+                raise R.PkgNonexistent
+            raise repo_response
+        elif isinstance(release_response, BaseException):
+            if (
+                isinstance(release_response, ClientResponseError)
+                and release_response.status == 404
+            ):
                 raise R.PkgFileUnavailable('release not found')
+            raise release_response
 
-            response_json = await response.json()
-            if defn.strategy is Strategy.latest:
-                (response_json,) = response_json
-            release_metadata: _GithubRelease = response_json
+        project_metadata: _GithubRepo = repo_response
+        if defn.strategy is Strategy.latest:
+            (release_response,) = release_response
+        release_metadata: _GithubRelease = release_response
 
         assets = release_metadata['assets']
 
@@ -1050,7 +1356,7 @@ class InstawowResolver(BaseResolver):
 
     @classmethod
     async def catalogue(
-        cls, web_client: _deferred_types.aiohttp.ClientSession
+        cls, web_client: _deferred_types.aiohttp.ClientSession, since: datetime | None = None
     ) -> AsyncIterator[CatatalogueBaseEntry]:
         yield CatatalogueBaseEntry(
             source=cls.source,
@@ -2,7 +2,17 @@ from __future__ import annotations
 
 import asyncio
 from collections import defaultdict
-from collections.abc import Awaitable, Callable, Iterable, Iterator, Mapping, Sequence, Set
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+    Set,
+)
 from datetime import datetime, timedelta
 import enum
 from functools import partial, wraps
@@ -45,6 +55,13 @@ class TocReader:
     def from_addon_path(cls, path: Path, suffix: str = '.toc') -> TocReader:
         return cls((path / (path.name + suffix)).read_text(encoding='utf-8-sig', errors='replace'))
 
+    @classmethod
+    def from_entries(cls, entries: dict[str, str]) -> TocReader:
+        "Recreate a reader from previously extracted entries."
+        toc_reader = cls.__new__(cls)
+        toc_reader.entries = entries
+        return toc_reader
+
 
 class cached_property(Generic[_T, _U]):
     def __init__(self, f: Callable[[_T], _U]) -> None:
@@ -86,19 +103,96 @@ def uniq(it: Iterable[_H]) -> list[_H]:
     return list(dict.fromkeys(it))
 
 
-def merge_intersecting_sets(it: Iterable[frozenset[_T]]) -> Iterator[frozenset[_T]]:
-    "Recursively merge intersecting sets in a collection."
-    many_sets = list(it)
-    while many_sets:
-        this_set = many_sets.pop(0)
-        while True:
-            for idx, other_set in enumerate(many_sets):
-                if not this_set.isdisjoint(other_set):
-                    this_set |= many_sets.pop(idx)
-                    break
+async def merge_async_iterables(iterables: Iterable[AsyncIterable[_U]]) -> AsyncIterator[_U]:
+    """Consume async iterables concurrently, yielding their items in the order they arrive.
+
+    If any of the iterables raises, the rest are cancelled and the exception
+    is re-raised.
+    """
+    queue: asyncio.Queue[tuple[bool, Any]] = asyncio.Queue(maxsize=1024)
+
+    async def drain(iterable: AsyncIterable[_U]):
+        try:
+            async for item in iterable:
+                await queue.put((False, item))
+        except Exception as error:
+            await queue.put((True, error))
+        else:
+            await queue.put((True, None))
+
+    tasks = [asyncio.ensure_future(drain(i)) for i in iterables]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            is_done, value = await queue.get()
+            if not is_done:
+                yield value
+            elif value is not None:
+                raise value
             else:
-                break
-        yield this_set
+                remaining -= 1
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class DisjointSet(Generic[_H]):
+    "A union-find of hashable elements."
+
+    def __init__(self) -> None:
+        self._parents: dict[_H, _H] = {}
+        self._sizes: dict[_H, int] = {}
+
+    def find(self, element: _H) -> _H:
+        "Retrieve the representative element of the set ``element`` belongs to."
+        parents = self._parents
+        parent = parents.setdefault(element, element)
+        while parent != element:
+            # Path halving
+            grandparent = parents[element] = parents[parent]
+            element, parent = grandparent, parents[grandparent]
+        return element
+
+    def union(self, element: _H, *elements: _H) -> _H:
+        "Merge the sets of the given elements, returning the new representative."
+        root = self.find(element)
+        for other_element in elements:
+            other_root = self.find(other_element)
+            if other_root != root:
+                # The smaller tree is attached to the larger one
+                if self._sizes.get(root, 1) < self._sizes.get(other_root, 1):
+                    root, other_root = other_root, root
+                self._parents[other_root] = root
+                self._sizes[root] = self._sizes.get(root, 1) + self._sizes.pop(other_root, 1)
+        return root
+
+    def groups(self) -> dict[_H, list[_H]]:
+        "Group elements by their representative, in the order they were added."
+        return bucketise(self._parents, self.find)
+
+    def components(self) -> dict[_H, frozenset[_H]]:
+        """Map every element to the set of elements it has been merged with.
+
+        Elements of the same set share the same ``frozenset``.
+        """
+        components: dict[_H, frozenset[_H]] = {}
+        for members in self.groups().values():
+            components.update(dict.fromkeys(members, frozenset(members)))
+        return components
+
+
+def merge_intersecting_sets(it: Iterable[Set[_H]]) -> Iterator[frozenset[_H]]:
+    "Merge intersecting sets in a collection."
+    disjoint_set: DisjointSet[_H] = DisjointSet()
+    empty_set_count = 0
+    for set_ in it:
+        if set_:
+            disjoint_set.union(*set_)
+        else:
+            empty_set_count += 1
+
+    yield from map(frozenset, disjoint_set.groups().values())
+    yield from repeat(frozenset(), empty_set_count)
 
 
 @overload
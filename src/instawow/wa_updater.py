@@ -182,15 +182,18 @@ class WaCompanionBuilder:
                 logger.info(f'{file} not found')
             else:
                 content = file.read_text(encoding='utf-8-sig', errors='replace')
-                aura_group_cache = self.manager.config.cache_dir / shasum(content)
-                if aura_group_cache.exists():
+                key = shasum(content)
+                aura_group_cache = self.manager.cache_store.get('aura', key)
+                if aura_group_cache:
                     logger.info(f'loading {file} from cache at {aura_group_cache}')
                     aura_groups = model.parse_file(aura_group_cache)
                 else:
                     start = time.perf_counter()
                     aura_groups = self.extract_auras(model, content)
                     logger.debug(f'{model.__name__} extracted in {time.perf_counter() - start}s')
-                    aura_group_cache.write_text(aura_groups.json(), encoding='utf-8')
+                    self.manager.cache_store.put_bytes(
+                        'aura', key, aura_groups.json().encode('utf-8')
+                    )
                 yield aura_groups
 
     async def _fetch_wago_metadata(
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from functools import lru_cache
 from io import BytesIO
 import json
@@ -10,10 +12,12 @@ from typing import Any
 from zipfile import ZipFile
 
 import pytest
+import sqlalchemy as sa
 
 from instawow import __version__
 from instawow.config import Config, Flavour
 from instawow.manager import Manager, init_web_client
+from instawow.models import Pkg
 
 inf = float('inf')
 
@@ -104,6 +108,57 @@ def iw_manager(iw_config: Config, iw_web_client):
     yield manager
 
 
+@dataclass
+class DatabaseActivity:
+    statements: list[tuple[str, Any]] = field(default_factory=list)
+    commits: int = 0
+
+
+@pytest.fixture
+def iw_db_activity(iw_manager: Manager):
+    activity = DatabaseActivity()
+
+    def record_statement(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ):
+        activity.statements.append((statement, parameters))
+
+    def count_commit(connection: sa.engine.Connection):
+        activity.commits += connection.connection.dbapi_connection.in_transaction
+
+    listeners = [('before_cursor_execute', record_statement), ('commit', count_commit)]
+    for identifier, fn in listeners:
+        sa.event.listen(iw_manager.database, identifier, fn)
+    yield activity
+    for identifier, fn in listeners:
+        sa.event.remove(iw_manager.database, identifier, fn)
+
+
+@pytest.fixture
+def iw_make_pkg():
+    def make_pkg(index: int, **overrides: Any):
+        return Pkg.parse_obj(
+            {
+                'source': 'curse',
+                'id': str(index),
+                'slug': f'foo-{index}',
+                'name': f'Foo {index}',
+                'description': '',
+                'url': '',
+                'download_url': '',
+                'date_published': datetime.now(timezone.utc),
+                'version': str(index),
+                'changelog_url': '',
+                'options': {'strategy': 'default'},
+                'folders': [{'name': f'Foo{index}'}],
+                'deps': [],
+                **overrides,
+            }
+        )
+
+    yield make_pkg
+
+
 @pytest.fixture
 @should_mock
 def mock_pypi(aresponses):
@@ -119,6 +174,13 @@ def mock_pypi(aresponses):
 @pytest.fixture
 @should_mock
 def mock_master_catalogue(aresponses):
+    aresponses.add(
+        'raw.githubusercontent.com',
+        '/layday/instawow-data/data/master-catalogue-v4.delta.json',
+        'get',
+        aresponses.Response(status=404),
+        repeat=inf,
+    )
     aresponses.add(
         'raw.githubusercontent.com',
         aresponses.ANY,
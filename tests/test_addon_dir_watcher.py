@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable
+import errno
+from pathlib import Path
+import sys
+
+import pytest
+
+from instawow import results as R
+from instawow.addon_dir_watcher import _IN_CREATE, AddonDirModel, AddonDirWatcher, _Inotify
+from instawow.manager import Manager
+from instawow.matchers import get_unreconciled_folder_set
+from instawow.resolvers import Defn
+
+
+def write_addon(iw_manager: Manager, addon: str, toc_contents: str = ''):
+    (iw_manager.config.addon_dir / addon).mkdir(exist_ok=True)
+    (iw_manager.config.addon_dir / addon / f'{addon}.toc').write_text(toc_contents)
+
+
+@pytest.fixture
+def addon_dir_model(iw_manager: Manager):
+    return AddonDirModel(iw_manager.config.addon_dir, iw_manager.config.game_flavour)
+
+
+async def wait_for(predicate: Callable[[], bool], timeout: float = 5):
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_addon_dir_model_is_updated_incrementally(
+    iw_manager: Manager, addon_dir_model: AddonDirModel
+):
+    write_addon(iw_manager, 'foo')
+    (iw_manager.config.addon_dir / 'bar').mkdir()
+    (iw_manager.config.addon_dir / 'baz').touch()
+    addon_dir_model.scan()
+    assert addon_dir_model.get_names() == {'foo', 'bar', 'baz'}
+    assert addon_dir_model.get_addon_folders() == ['foo']
+
+    write_addon(iw_manager, 'bar', '## Version: 1.0')
+    (iw_manager.config.addon_dir / 'baz').unlink()
+    addon_dir_model.update(['bar', 'baz'])
+    assert addon_dir_model.get_names() == {'foo', 'bar'}
+    (bar,) = (a for a in addon_dir_model.get_addon_folders() if a.name == 'bar')
+    assert bar.version == '1.0'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'use_inotify',
+    [
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(sys.platform != 'linux', reason='inotify is Linux-only'),
+        ),
+        False,
+    ],
+)
+async def test_addon_dir_watcher_picks_up_changes(
+    iw_manager: Manager, addon_dir_model: AddonDirModel, use_inotify: bool
+):
+    write_addon(iw_manager, 'foo')
+    addon_dir_watcher = AddonDirWatcher(addon_dir_model, use_inotify)
+    addon_dir_watcher.poll_interval = 0.05
+    await addon_dir_watcher.start()
+    try:
+        assert addon_dir_watcher.is_using_inotify is use_inotify
+        assert addon_dir_model.get_addon_folders() == ['foo']
+
+        write_addon(iw_manager, 'bar')
+        await wait_for(lambda: 'bar' in addon_dir_model.get_addon_folders())
+
+        write_addon(iw_manager, 'foo', '## Version: 1.0')
+        await wait_for(
+            lambda: [a.version for a in addon_dir_model.get_addon_folders() if a.name == 'foo']
+            == ['1.0']
+        )
+
+        (iw_manager.config.addon_dir / 'bar' / 'bar.toc').unlink()
+        await wait_for(lambda: 'bar' not in addon_dir_model.get_addon_folders())
+        assert 'bar' in addon_dir_model.get_names()
+    finally:
+        addon_dir_watcher.close()
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='inotify is Linux-only')
+def test_inotify_errors_are_raised_as_os_errors(tmp_path: Path):
+    inotify = _Inotify()
+    try:
+        with pytest.raises(FileNotFoundError):
+            inotify.add_watch(str(tmp_path / 'foo'), _IN_CREATE)
+    finally:
+        inotify.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform != 'linux', reason='inotify is Linux-only')
+async def test_addon_dir_watcher_polls_when_out_of_inotify_watches(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager, addon_dir_model: AddonDirModel
+):
+    add_watch = _Inotify.add_watch
+
+    def add_watch_to_addon_dir_only(self: _Inotify, path: str, mask: int):
+        if path != str(iw_manager.config.addon_dir):
+            raise OSError(errno.ENOSPC, 'No space left on device', path)
+        return add_watch(self, path, mask)
+
+    monkeypatch.setattr(_Inotify, 'add_watch', add_watch_to_addon_dir_only)
+
+    write_addon(iw_manager, 'foo')
+    addon_dir_watcher = AddonDirWatcher(addon_dir_model, True)
+    addon_dir_watcher.poll_interval = 0.05
+    await addon_dir_watcher.start()
+    try:
+        assert not addon_dir_watcher.is_using_inotify
+        assert addon_dir_model.get_addon_folders() == ['foo']
+
+        write_addon(iw_manager, 'foo', '## Version: 1.0')
+        await wait_for(
+            lambda: [a.version for a in addon_dir_model.get_addon_folders() if a.name == 'foo']
+            == ['1.0']
+        )
+    finally:
+        addon_dir_watcher.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'use_inotify',
+    [
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(sys.platform != 'linux', reason='inotify is Linux-only'),
+        ),
+        False,
+    ],
+)
+async def test_addon_dir_watcher_survives_errors(
+    monkeypatch: pytest.MonkeyPatch,
+    iw_manager: Manager,
+    addon_dir_model: AddonDirModel,
+    use_inotify: bool,
+):
+    update = addon_dir_model.update
+    failed = False
+
+    def fail_to_update_once(names: Iterable[str]):
+        nonlocal failed
+        if not failed:
+            failed = True
+            raise PermissionError
+        update(names)
+
+    monkeypatch.setattr(addon_dir_model, 'update', fail_to_update_once)
+
+    addon_dir_watcher = AddonDirWatcher(addon_dir_model, use_inotify)
+    addon_dir_watcher.poll_interval = 0.05
+    await addon_dir_watcher.start()
+    try:
+        write_addon(iw_manager, 'foo')
+        await wait_for(lambda: failed)
+        write_addon(iw_manager, 'bar')
+        await wait_for(lambda: 'bar' in addon_dir_model.get_addon_folders())
+    finally:
+        addon_dir_watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_manager_consults_addon_dir_model(
+    iw_manager: Manager, addon_dir_model: AddonDirModel
+):
+    addon_dir_model.scan()
+    iw_manager.addon_dir_model = addon_dir_model
+
+    write_addon(iw_manager, 'Molinari')
+    addon_dir_model.update(['Molinari'])
+    assert get_unreconciled_folder_set(iw_manager) == {'Molinari'}
+
+    defn = Defn('curse', 'molinari')
+    result = await iw_manager.install([defn], replace=False)
+    assert type(result[defn]) is R.PkgConflictsWithUnreconciled
+
+    result = await iw_manager.install([defn], replace=True)
+    assert type(result[defn]) is R.PkgInstalled
+    assert 'Molinari' in addon_dir_model.get_addon_folders()
+    assert get_unreconciled_folder_set(iw_manager) == frozenset()
+
+    result = await iw_manager.remove([defn], keep_folders=False)
+    assert type(result[defn]) is R.PkgRemoved
+    assert 'Molinari' not in addon_dir_model.get_names()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import re
+import time
 
 import pytest
 from yarl import URL
@@ -8,7 +9,7 @@ from yarl import URL
 from instawow import results as R
 from instawow.common import Strategy
 from instawow.config import Flavour
-from instawow.manager import Manager
+from instawow.manager import Manager, cache_response
 from instawow.models import Pkg
 from instawow.resolvers import (
     CurseResolver,
@@ -80,6 +81,35 @@ async def test_curse_version_pinning(iw_manager: Manager):
     )
 
 
+@pytest.mark.asyncio
+async def test_curse_version_pinning_fetches_file_list_once(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    urls: list[str] = []
+
+    async def cache_response_and_record_url(manager: Manager, url: object, *args, **kwargs):
+        urls.append(str(url))
+        return await cache_response(manager, url, *args, **kwargs)
+
+    monkeypatch.setattr('instawow.manager.cache_response', cache_response_and_record_url)
+
+    by_display_name = Defn('curse', 'molinari').with_version('70300.51-Release')
+    by_file_id = Defn('curse', '20338').with_version('2415279')
+    nonexistent = Defn('curse', 'molinari').with_version('foo')
+    results = await iw_manager.resolve([by_display_name, by_file_id, nonexistent])
+    assert results[by_display_name].version == '70300.51-Release'
+    assert results[by_file_id].version == '70200.47-Release'
+    assert type(results[nonexistent]) is R.PkgFileUnavailable
+    assert [u for u in urls if u.endswith('/files')] == [
+        'https://addons-ecs.forgesvc.net/api/v2/addon/20338/files'
+    ]
+
+    # The index is kept on the resolver as is
+    resolver = iw_manager.resolvers['curse']
+    assert isinstance(resolver, CurseResolver)
+    assert await resolver._get_file_index('20338') is await resolver._get_file_index('20338')
+
+
 @pytest.mark.parametrize(
     'iw_config_dict_no_config_dir',
     [Flavour.retail],
@@ -213,6 +243,65 @@ async def test_github_basic(iw_manager: Manager):
     assert type(results[nonexistent]) is R.PkgNonexistent
 
 
+@pytest.mark.asyncio
+async def test_github_rate_limit_is_waited_out(aresponses, iw_manager: Manager):
+    def make_rate_limited_response(reset_in: int = 1):
+        return aresponses.Response(
+            status=403,
+            headers={
+                'X-RateLimit-Remaining': '0',
+                'X-RateLimit-Reset': str(int(time.time()) + reset_in),
+            },
+        )
+
+    for path in ['/repos/layday/rate-limited', '/repos/layday/rate-limited/releases/latest']:
+        aresponses.add('api.github.com', path, 'get', make_rate_limited_response())
+    aresponses.add(
+        'api.github.com',
+        '/repos/layday/rate-limited',
+        'get',
+        {
+            'full_name': 'layday/rate-limited',
+            'name': 'rate-limited',
+            'description': None,
+            'html_url': 'https://github.com/layday/rate-limited',
+        },
+    )
+    aresponses.add(
+        'api.github.com',
+        '/repos/layday/rate-limited/releases/latest',
+        'get',
+        {
+            'tag_name': 'v1',
+            'published_at': '2021-01-01T00:00:00Z',
+            'body': '',
+            'assets': [
+                {
+                    'name': 'rate-limited-v1.zip',
+                    'content_type': 'application/zip',
+                    'state': 'uploaded',
+                    'browser_download_url': 'https://github.com/layday/rate-limited-v1.zip',
+                }
+            ],
+        },
+    )
+
+    defn = Defn('github', 'layday/rate-limited')
+    results = await iw_manager.resolve([defn])
+    assert type(results[defn]) is Pkg
+
+    for path in [
+        '/repos/layday/rate-limited-too',
+        '/repos/layday/rate-limited-too/releases/latest',
+    ]:
+        aresponses.add('api.github.com', path, 'get', make_rate_limited_response(3600))
+
+    defn = Defn('github', 'layday/rate-limited-too')
+    results = await iw_manager.resolve([defn])
+    assert type(results[defn]) is R.PkgFileUnavailable
+    assert 'rate limit exceeded' in results[defn].message
+
+
 @pytest.mark.asyncio
 async def test_github_changelog_is_data_url(iw_manager: Manager):
     adibuttonauras = Defn('github', 'AdiAddons/AdiButtonAuras')
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+import os
+from pathlib import Path
+import time
+
+import pytest
+
+from instawow.cache import EVICTION_GRACE_PERIOD, CacheStore, MemoryCache
+
+
+@pytest.fixture
+def cache_store(tmp_path: Path):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    cache_store = CacheStore(cache_dir, 2**20)
+    yield cache_store
+    cache_store.close()
+
+
+def test_identical_files_are_stored_once(cache_store: CacheStore):
+    foo = cache_store.put_bytes('response', 'foo', b'content')
+    bar = cache_store.put_bytes('response', 'bar', b'content')
+    assert foo == bar
+    assert cache_store.get('response', 'foo') == cache_store.get('response', 'bar') == foo
+    assert cache_store.get_stats()['size'] == len(b'content')
+
+
+def test_source_file_is_moved_unless_kept(cache_store: CacheStore, tmp_path: Path):
+    source = tmp_path / 'source'
+    source.write_bytes(b'foo')
+    cache_store.put_file('archive', 'foo', source, keep_source=True)
+    assert source.exists()
+    cache_store.put_file('archive', 'foo', source)
+    assert not source.exists()
+    assert not [p for p in cache_store.cache_dir.iterdir() if p.name.startswith('.put-')]
+
+
+def test_expired_entry_is_a_miss(cache_store: CacheStore):
+    cache_store.put_bytes('response', 'foo', b'foo')
+    assert cache_store.get('response', 'foo', {'seconds': 60})
+    assert cache_store.get('response', 'foo', {'seconds': 0}) is None
+    assert cache_store.get_stats()['kinds'] == [
+        {'kind': 'response', 'entries': 1, 'size': 3, 'hits': 1, 'misses': 1}
+    ]
+
+
+def test_missing_file_is_a_miss(cache_store: CacheStore):
+    os.remove(cache_store.put_bytes('response', 'foo', b'foo'))
+    assert cache_store.get('response', 'foo') is None
+    assert cache_store.get_stats()['size'] == 0
+
+
+def test_least_recently_accessed_files_are_evicted(cache_store: CacheStore):
+    for key in ['foo', 'bar', 'baz']:
+        cache_store.put_bytes('archive', key, key.encode() * 100)
+        time.sleep(0.01)
+
+    cache_store.get('archive', 'foo')
+    assert cache_store.evict(600) == (1, 300)
+    assert cache_store.get('archive', 'bar') is None
+    assert cache_store.get('archive', 'foo')
+    assert cache_store.get('archive', 'baz')
+    assert cache_store.evict(0) == (2, 600)
+    assert not list(cache_store.objects_dir.glob('*/*'))
+
+
+def test_store_is_not_evicted_when_putting_files(cache_store: CacheStore):
+    cache_store.max_size = 600
+    for key in ['foo', 'bar', 'baz']:
+        cache_store.put_bytes('archive', key, key.encode() * 100)
+    assert cache_store.get_stats()['size'] == 900
+    assert cache_store.is_over_budget()
+
+    # Recently accessed files are spared
+    assert cache_store.evict(grace_period=60) == (0, 0)
+    assert cache_store.is_over_budget()
+    assert cache_store.evict() == (1, 300)
+    assert not cache_store.is_over_budget()
+
+
+def test_digest_is_not_recomputed_if_given(
+    monkeypatch: pytest.MonkeyPatch, cache_store: CacheStore, tmp_path: Path
+):
+    def digest_file(path: Path):
+        raise AssertionError
+
+    monkeypatch.setattr('instawow.cache._digest_file', digest_file)
+    source = tmp_path / 'source'
+    source.write_bytes(b'foo')
+    digest = sha256(b'foo').hexdigest()
+    assert cache_store.put_file('archive', 'foo', source, digest=digest).name == digest
+
+
+def test_untracked_files_are_removed(cache_store: CacheStore):
+    (cache_store.cache_dir / 'legacy').write_bytes(b'')
+    path = cache_store.put_bytes('archive', 'foo', b'foo')
+    assert cache_store.remove_untracked_files() == 1
+    assert path.exists()
+
+
+def test_recent_temp_files_are_not_removed(cache_store: CacheStore):
+    download = cache_store.cache_dir / '.download-foo'
+    download.write_bytes(b'')
+    stale_download = cache_store.cache_dir / '.download-bar'
+    stale_download.write_bytes(b'')
+    stale_time = time.time() - EVICTION_GRACE_PERIOD - 1
+    os.utime(stale_download, (stale_time, stale_time))
+
+    assert cache_store.remove_untracked_files() == 1
+    assert download.exists()
+    assert not stale_download.exists()
+
+
+def test_store_can_be_shared_between_threads(cache_store: CacheStore):
+    with ThreadPoolExecutor(4) as executor:
+        paths = list(
+            executor.map(
+                lambda i: cache_store.put_bytes('response', str(i), str(i).encode()), range(20)
+            )
+        )
+    assert all(cache_store.get('response', str(i)) == p for i, p in enumerate(paths))
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_coalesces_concurrent_loads():
+    memory_cache: MemoryCache[int] = MemoryCache()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return (time.time() + 60, loads)
+
+    assert (
+        await asyncio.gather(*(memory_cache.get_or_load('foo', load) for _ in range(5))) == [1] * 5
+    )
+    assert await memory_cache.get_or_load('foo', load) == 1
+    assert loads == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_expired_and_least_recently_used_values():
+    memory_cache: MemoryCache[str] = MemoryCache(max_entries=2)
+
+    def make_load(value: str, ttl: float = 60):
+        async def load():
+            return (time.time() + ttl, value)
+
+        return load
+
+    assert await memory_cache.get_or_load('foo', make_load('foo', ttl=0)) == 'foo'
+    assert await memory_cache.get_or_load('foo', make_load('new foo')) == 'new foo'
+    await memory_cache.get_or_load('bar', make_load('bar'))
+    await memory_cache.get_or_load('foo', make_load('newer foo'))
+    await memory_cache.get_or_load('baz', make_load('baz'))
+    assert await memory_cache.get_or_load('foo', make_load('newer foo')) == 'new foo'
+    assert await memory_cache.get_or_load('bar', make_load('new bar')) == 'new bar'
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_values_are_shared():
+    memory_cache: MemoryCache[dict[str, list[int]]] = MemoryCache()
+
+    async def load():
+        return (time.time() + 60, {'foo': [1]})
+
+    value = await memory_cache.get_or_load('foo', load)
+    assert await memory_cache.get_or_load('foo', load) is value
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_is_bounded_by_size():
+    memory_cache: MemoryCache[str] = MemoryCache(max_size=2000)
+    loads: list[str] = []
+
+    def make_load(value: str):
+        async def load():
+            loads.append(value)
+            return (time.time() + 60, value)
+
+        return load
+
+    await memory_cache.get_or_load('foo', make_load('f' * 900))
+    await memory_cache.get_or_load('bar', make_load('b' * 900))
+    await memory_cache.get_or_load('baz', make_load('b' * 900))
+    await memory_cache.get_or_load('qux', make_load('q' * 3000))
+    await memory_cache.get_or_load('baz', make_load('b' * 900))
+    await memory_cache.get_or_load('foo', make_load('f' * 900))
+    assert [len(v) for v in loads] == [900, 900, 900, 3000, 900]
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_does_not_store_failed_loads():
+    memory_cache: MemoryCache[str] = MemoryCache()
+
+    async def fail():
+        raise ValueError
+
+    async def load():
+        return (time.time() + 60, 'foo')
+
+    with pytest.raises(ValueError):
+        await memory_cache.get_or_load('foo', fail)
+    assert await memory_cache.get_or_load('foo', load) == 'foo'
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+from datetime import datetime, timezone
 from functools import partial
 import json
 import shutil
@@ -13,9 +15,12 @@ import pytest
 
 from instawow import __version__
 from instawow.cli import main
+from instawow.compact_catalogue import CompactCatalogue
 from instawow.config import Config, Flavour
 from instawow.manager import Manager
 from instawow.models import PkgList
+from instawow.resolvers import BaseResolver, Catalogue, CatalogueDelta, CatatalogueBaseEntry
+from instawow.utils import shasum
 
 
 @pytest.fixture
@@ -504,6 +509,15 @@ def test_json_export(install_molinari_and_run):
     assert PkgList.parse_raw(output).__root__[0].name == 'Molinari'
 
 
+def test_cache_stats_and_prune(install_molinari_and_run):
+    stats_output = install_molinari_and_run('cache stats').output
+    assert any(l.startswith('archive') for l in stats_output.splitlines())
+    assert install_molinari_and_run('cache prune --all').output.startswith('Evicted ')
+    assert install_molinari_and_run('cache stats').output.splitlines()[-1].startswith(
+        'Total: 0 B of '
+    )
+
+
 def test_show_version(run):
     assert run('--version').output == f'instawow, version {__version__}\n'
 
@@ -511,3 +525,148 @@ def test_show_version(run):
 def test_plugin_hook_command_can_be_invoked(run):
     pytest.importorskip('instawow_test_plugin')
     assert run('foo').output == 'success!\n'
+
+
+def test_generate_catalogue(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    def make_resolver(source: str, download_counts: list[int]):
+        class Resolver(BaseResolver):
+            @classmethod
+            async def catalogue(cls, web_client):
+                for download_count in download_counts:
+                    await asyncio.sleep(0)
+                    yield CatatalogueBaseEntry(
+                        source=source,
+                        id=str(download_count),
+                        name=f'{source} {download_count}',
+                        game_flavours={Flavour.retail, Flavour.vanilla_classic},
+                        folders=[{'Foo', 'Bar'}],
+                        download_count=download_count,
+                        last_updated=datetime(2021, 1, download_count, tzinfo=timezone.utc),
+                    )
+
+        Resolver.source = source
+        return Resolver
+
+    monkeypatch.setattr(
+        'instawow.manager.Manager.RESOLVERS',
+        [make_resolver('foo', [1, 2, 4]), make_resolver('bar', [3, 6])],
+    )
+
+    file = tmp_path / 'catalogue.json'
+    result = CliRunner().invoke(
+        main,
+        f'generate-catalogue --start-date 2021-01-02 {file}',
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+
+    catalogue = Catalogue.parse_file(file)
+    assert sorted((e.source, e.id, e.derived_download_score) for e in catalogue.__root__) == [
+        ('bar', '3', 0.5),
+        ('bar', '6', 1),
+        ('foo', '2', 0.5),
+        ('foo', '4', 1),
+    ]
+    assert file.read_text() == catalogue.json(indent=2)
+    assert file.with_suffix('.compact.json').read_text() == catalogue.json(separators=(',', ':'))
+    assert list(CompactCatalogue.from_file(file.with_suffix('.compact.bin'))) == catalogue.__root__
+
+
+def test_generate_catalogue_incrementally(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    download_counts = {'1': 1, '2': 2, '4': 4}
+    sinces = []
+
+    class Resolver(BaseResolver):
+        source = 'foo'
+
+        @classmethod
+        async def catalogue(cls, web_client, since=None):
+            sinces.append(since)
+            for id_, download_count in download_counts.items():
+                last_updated = datetime(2021, 1, int(id_), tzinfo=timezone.utc)
+                if since is None or last_updated >= since:
+                    yield CatatalogueBaseEntry(
+                        source=cls.source,
+                        id=id_,
+                        name=f'{cls.source} {id_}',
+                        game_flavours={Flavour.retail},
+                        download_count=download_count,
+                        last_updated=last_updated,
+                    )
+
+    monkeypatch.setattr('instawow.manager.Manager.RESOLVERS', [Resolver])
+
+    def generate(filename: str, *args: str):
+        result = CliRunner().invoke(
+            main,
+            ['generate-catalogue', str(tmp_path / filename), *args],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+        return (
+            Catalogue.parse_file(tmp_path / filename),
+            (tmp_path / filename).with_suffix('.compact.json').read_text(),
+        )
+
+    _, raw_first = generate('first.json')
+    assert CatalogueDelta.parse_file(tmp_path / 'first.delta.json').__root__ == []
+
+    download_counts.update({'4': 8, '5': 1})
+    second, raw_second = generate('second.json', '--previous', str(tmp_path / 'first.json'))
+    assert sinces[-1] == datetime(2021, 1, 4, tzinfo=timezone.utc)
+    assert [(e.id, e.download_count, e.derived_download_score) for e in second.__root__] == [
+        ('1', 1, 0.125),
+        ('2', 2, 0.25),
+        ('4', 8, 1),
+        ('5', 1, 0.125),
+    ]
+    (patch,) = CatalogueDelta.parse_file(tmp_path / 'second.delta.json').__root__
+    assert patch.base_version == shasum(raw_first)
+    assert patch.version == shasum(raw_second)
+    # Every entry was rescored against the new most downloaded add-on
+    assert patch.upserted == second.__root__
+    assert patch.removed == []
+
+    third, raw_third = generate(
+        'third.json', '--previous', str(tmp_path / 'second.json'), '--start-date', '2021-01-02'
+    )
+    assert [e.id for e in third.__root__] == ['2', '4', '5']
+    delta = CatalogueDelta.parse_file(tmp_path / 'third.delta.json').__root__
+    assert [(p.base_version, p.version) for p in delta] == [
+        (shasum(raw_first), shasum(raw_second)),
+        (shasum(raw_second), shasum(raw_third)),
+    ]
+    assert delta[-1].upserted == []
+    assert delta[-1].removed == [('foo', '1')]
+
+    _, raw_fourth = generate(
+        'fourth.json', '--previous', str(tmp_path / 'third.json'), '--max-patches', '1'
+    )
+    (patch,) = CatalogueDelta.parse_file(tmp_path / 'fourth.delta.json').__root__
+    assert (patch.base_version, patch.version) == (shasum(raw_third), shasum(raw_fourth))
+
+    # Stale download counts are only refreshed when every add-on is retrieved
+    download_counts.update({'2': 16})
+    del download_counts['5']
+    fifth, _ = generate('fifth.json', '--previous', str(tmp_path / 'fourth.json'))
+    assert [(e.id, e.download_count) for e in fifth.__root__] == [('2', 2), ('4', 8), ('5', 1)]
+
+    sixth, raw_sixth = generate(
+        'sixth.json', '--previous', str(tmp_path / 'fifth.json'), '--refresh'
+    )
+    assert sinces[-1] is None
+    assert [(e.id, e.download_count, e.derived_download_score) for e in sixth.__root__] == [
+        ('2', 16, 1),
+        ('4', 8, 0.5),
+        ('1', 1, 0.0625),
+    ]
+    patch = CatalogueDelta.parse_file(tmp_path / 'sixth.delta.json').__root__[-1]
+    assert [e.id for e in patch.upserted] == ['2', '4', '1']
+    assert patch.removed == [('foo', '5')]
+
+    # Regenerating the catalogue in full discards the patches leading up to it
+    # so that clients download it in full
+    generate('sixth.json')
+    delta = CatalogueDelta.parse_file(tmp_path / 'sixth.delta.json')
+    assert delta.__root__ == []
+    assert delta.get_patches_since(shasum(raw_sixth)) is None
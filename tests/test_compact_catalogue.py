@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from instawow.compact_catalogue import CompactCatalogue, normalise_search_terms
+from instawow.config import Flavour
+from instawow.resolvers import Catalogue
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+@pytest.fixture(scope='module')
+def catalogue():
+    return Catalogue.parse_file(FIXTURES / 'master-catalogue.json')
+
+
+@pytest.fixture
+def compact_catalogue_file(tmp_path: Path, catalogue: Catalogue):
+    file = tmp_path / 'catalogue.bin'
+    file.write_bytes(CompactCatalogue.encode(catalogue.__root__))
+    yield file
+
+
+def test_compact_catalogue_round_trips(catalogue: Catalogue, compact_catalogue_file: Path):
+    compact_catalogue = CompactCatalogue.from_file(compact_catalogue_file)
+    assert len(compact_catalogue) == len(catalogue.__root__)
+    assert list(compact_catalogue) == catalogue.__root__
+    assert compact_catalogue[-1] == catalogue.__root__[-1]
+    assert compact_catalogue[:2] == catalogue.__root__[:2]
+    assert compact_catalogue.curse_slugs == catalogue.curse_slugs
+    with pytest.raises(IndexError):
+        compact_catalogue[len(compact_catalogue)]
+
+
+def test_compact_catalogue_columns(catalogue: Catalogue, compact_catalogue_file: Path):
+    compact_catalogue = CompactCatalogue.from_file(compact_catalogue_file)
+    assert list(compact_catalogue.get_column('name')) == [e.name for e in catalogue.__root__]
+    assert compact_catalogue.get_column('name') is compact_catalogue.get_column('name')
+    assert compact_catalogue.get_indices_for_flavour(Flavour.vanilla_classic) == [
+        i for i, e in enumerate(catalogue.__root__) if Flavour.vanilla_classic in e.game_flavours
+    ]
+
+
+def test_compact_catalogue_can_be_closed(compact_catalogue_file: Path):
+    with CompactCatalogue.from_file(compact_catalogue_file) as compact_catalogue:
+        assert compact_catalogue[0]
+    with pytest.raises(ValueError):
+        compact_catalogue[0]
+    compact_catalogue_file.unlink()
+
+
+def test_compact_catalogue_rejects_foreign_files():
+    with pytest.raises(ValueError, match='not a compact catalogue'):
+        CompactCatalogue(b'\x00' * 128)
+
+
+def test_compact_catalogue_search_index(catalogue: Catalogue, compact_catalogue_file: Path):
+    compact_catalogue = CompactCatalogue.from_file(compact_catalogue_file)
+
+    search_tokens = compact_catalogue.find_search_tokens(normalise_search_terms('Molinari'), 10)
+    assert len(search_tokens) == 10
+    assert compact_catalogue.get_search_token(search_tokens[0]) == 'molinari'
+    assert {
+        (catalogue.__root__[i].source, catalogue.__root__[i].id)
+        for i in compact_catalogue.get_search_token_entries(search_tokens[0])
+    } == {('curse', '20338'), ('wowi', '13188')}
+
+    assert all(
+        'mo' in compact_catalogue.get_search_token(t)
+        for t in compact_catalogue.find_search_tokens('mo', 10)
+    )
+
+
+def test_compact_catalogue_folder_name_index(catalogue: Catalogue, compact_catalogue_file: Path):
+    compact_catalogue = CompactCatalogue.from_file(compact_catalogue_file)
+    folder_name_index = compact_catalogue.get_folder_name_index(Flavour.retail)
+    assert folder_name_index is compact_catalogue.get_folder_name_index(Flavour.retail)
+
+    entries = catalogue.__root__
+    for folder_name, pairs in folder_name_index.items():
+        for index, folder_set_index in pairs:
+            folder_set = compact_catalogue.get_folder_set(folder_set_index)
+            assert folder_name in folder_set
+            assert set(folder_set) in entries[index].folders
+            assert Flavour.retail in entries[index].game_flavours
+    assert sum(map(len, folder_name_index.values())) == sum(
+        len(f) for e in entries if Flavour.retail in e.game_flavours for f in e.folders
+    )
@@ -1,17 +1,43 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Callable
 import datetime
+import os
 from pathlib import Path
-
-from aiohttp import ClientError
+import threading
+import time
+from zipfile import ZipFile
+
+from aiohttp import ClientError, TraceConfig, web
+from aiohttp.test_utils import TestServer
+import alembic.command
+import alembic.config
 import pytest
+import sqlalchemy as sa
+from sqlalchemy.exc import MultipleResultsFound
 
+from instawow import _deferred_types, db
 from instawow import results as R
+from instawow.cache import CacheStore
 from instawow.common import Strategy
-from instawow.config import Flavour
-from instawow.manager import Manager, is_outdated
+from instawow.config import Config, Flavour
+from instawow.manager import (
+    CATALOGUE_DELTA_URL,
+    CATALOGUE_URL,
+    DB_REVISION,
+    STAGING_GRACE_PERIOD,
+    Manager,
+    _download_pkg_archive,
+    _open_pkg_archive,
+    cache_response,
+    init_web_client,
+    is_outdated,
+    migrate_database,
+)
 from instawow.models import Pkg
-from instawow.resolvers import Defn
+from instawow.resolvers import Catalogue, CatalogueDeltaPatch, CatalogueEntry, Defn
+from instawow.utils import shasum
 
 
 @pytest.mark.asyncio
@@ -28,6 +54,17 @@ async def test_pinning_supported_pkg(iw_manager: Manager):
         assert pinned_pkg.options.strategy is new_defn.strategy
         assert version == pinned_pkg.version
 
+        # The strategy is persisted
+        with iw_manager.database.engine.connect() as connection:
+            assert (
+                connection.execute(
+                    sa.select(db.pkg_options.c.strategy).filter_by(
+                        pkg_source='curse', pkg_id=pkg.id
+                    )
+                ).scalar_one()
+                == new_defn.strategy
+            )
+
 
 @pytest.mark.asyncio
 async def test_pinning_unsupported_pkg(iw_manager: Manager):
@@ -128,6 +165,190 @@ async def test_install_cannot_replace_reconciled_folders(iw_manager: Manager):
     assert type(result[wowi_defn]) is R.PkgConflictsWithInstalled
 
 
+@pytest.mark.asyncio
+async def test_install_applies_conflicting_archives_one_at_a_time(iw_manager: Manager):
+    curse_defn = Defn('curse', 'molinari')
+    wowi_defn = Defn('wowi', '13188-molinari')
+
+    result = await iw_manager.install([curse_defn, wowi_defn], replace=False)
+    assert {type(result[curse_defn]), type(result[wowi_defn])} == {
+        R.PkgInstalled,
+        R.PkgConflictsWithInstalled,
+    }
+
+
+@pytest.mark.asyncio
+async def test_install_failed_download_does_not_hold_up_other_pkgs(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    async def fail_wowi_download(manager: Manager, pkg: Pkg):
+        if pkg.source == 'wowi':
+            raise ClientError('wowi')
+        return await _download_pkg_archive(manager, pkg)
+
+    monkeypatch.setattr('instawow.manager._download_pkg_archive', fail_wowi_download)
+
+    curse_defn = Defn('curse', 'molinari')
+    wowi_defn = Defn('wowi', '13188-molinari')
+
+    result = await iw_manager.install([wowi_defn, curse_defn], replace=False)
+    assert type(result[wowi_defn]) is R.InternalError
+    assert type(result[curse_defn]) is R.PkgInstalled
+
+
+def test_large_archive_is_extracted_in_parallel(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    archive = tmp_path / 'archive.zip'
+    with ZipFile(archive, 'w') as file:
+        file.writestr('Foo/Foo.toc', b'')
+        file.writestr('Bar/', b'')
+        for i in range(500):
+            file.writestr(f'Foo/{i % 7}/{i % 3}/{i}.lua', str(i))
+        file.writestr('Foo/empty/', b'')
+        file.writestr('../Baz/Baz.lua', b'')
+        file.writestr('Baz/Baz.lua', b'')
+
+    dest = tmp_path / 'addons'
+    monkeypatch.setattr('os.cpu_count', lambda: 4)
+    monkeypatch.setattr('zipfile.ZipFile.extractall', None)
+    with _open_pkg_archive(archive) as pkg_archive:
+        assert pkg_archive.base_dirs == {'Foo'}
+        pkg_archive.extract(dest)
+
+    assert {p.name for p in dest.iterdir()} == {'Foo'}
+    assert len([p for p in dest.rglob('*.lua')]) == 500
+    assert (dest / 'Foo/2/1/499.lua').read_text() == '499'
+    assert (dest / 'Foo/empty').is_dir()
+
+
+def test_archive_with_unsafe_member_names_is_not_extracted_in_parallel(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    archive = tmp_path / 'archive.zip'
+    with ZipFile(archive, 'w') as file:
+        file.writestr('Foo/Foo.toc', b'')
+        for i in range(500):
+            file.writestr(f'Foo/{i}.lua', str(i))
+        file.writestr('Foo/what?.lua', b'')
+
+    monkeypatch.setattr('os.cpu_count', lambda: 4)
+    monkeypatch.setattr('instawow.manager._extract_zip_members', None)
+    with _open_pkg_archive(archive) as pkg_archive:
+        pkg_archive.extract(tmp_path / 'addons')
+
+    assert len([p for p in (tmp_path / 'addons').rglob('*.lua')]) == 501
+
+
+def test_archive_patch_only_extracts_changed_files(tmp_path: Path):
+    addon_dir = tmp_path / 'addons'
+    addon_dir.mkdir()
+    staging_dir = tmp_path / 'staging'
+    staging_dir.mkdir()
+    trash_dir = tmp_path / 'trash'
+    trash_dir.mkdir()
+
+    old_archive = tmp_path / 'old.zip'
+    with ZipFile(old_archive, 'w') as file:
+        file.writestr('Foo/Foo.toc', b'')
+        file.writestr('Foo/same.lua', b'same')
+        file.writestr('Foo/edited.lua', b'same')
+        file.writestr('Foo/changed.lua', b'old')
+        file.writestr('Foo/removed.lua', b'')
+
+    new_archive = tmp_path / 'new.zip'
+    with ZipFile(new_archive, 'w') as file:
+        file.writestr('Foo/Foo.toc', b'')
+        file.writestr('Foo/same.lua', b'same')
+        file.writestr('Foo/edited.lua', b'same')
+        file.writestr('Foo/changed.lua', b'new')
+        file.writestr('Foo/sub/added.lua', b'added')
+
+    with _open_pkg_archive(old_archive) as pkg_archive:
+        pkg_archive.extract(addon_dir)
+        installed_files = {
+            n: (c, s, (addon_dir / n).stat().st_mtime_ns)
+            for n, (c, s) in pkg_archive.file_manifest.items()
+        }
+
+    same_inode = (addon_dir / 'Foo/same.lua').stat().st_ino
+
+    # A local edit which doesn't change the size of the file
+    edited = addon_dir / 'Foo/edited.lua'
+    edited.write_bytes(b'SAME')
+    os.utime(edited, ns=(installed_files['Foo/edited.lua'][2] + 10**9,) * 2)
+
+    with _open_pkg_archive(new_archive) as pkg_archive:
+        assert pkg_archive.is_patchable
+        pkg_archive.patch(addon_dir, 'Foo', installed_files, staging_dir, trash_dir)
+
+    assert {p.name for p in addon_dir.iterdir()} == {'Foo'}
+    assert not any(staging_dir.iterdir())
+    assert {str(p.relative_to(addon_dir)) for p in addon_dir.rglob('*.lua')} == {
+        'Foo/same.lua',
+        'Foo/edited.lua',
+        'Foo/changed.lua',
+        'Foo/sub/added.lua',
+    }
+    assert (addon_dir / 'Foo/same.lua').stat().st_ino == same_inode
+    assert (addon_dir / 'Foo/edited.lua').read_bytes() == b'same'
+    assert (addon_dir / 'Foo/changed.lua').read_bytes() == b'new'
+    assert (addon_dir / 'Foo/sub/added.lua').read_bytes() == b'added'
+
+
+@pytest.mark.asyncio
+async def test_installed_files_are_recorded(iw_manager: Manager):
+    defn = Defn('curse', 'molinari')
+    versioned_defn = defn.with_version('80000.57-Release')
+
+    await iw_manager.install([versioned_defn], replace=False)
+    pkg = iw_manager.get_pkg(defn)
+    assert pkg
+    installed_files = iw_manager._get_pkg_files(pkg)
+    assert installed_files
+    assert all(n.partition('/')[0] == 'Molinari' for n in installed_files)
+
+    await iw_manager.remove([defn], keep_folders=False)
+    assert not iw_manager.database.execute(sa.select(db.pkg_file)).all()
+
+
+@pytest.mark.asyncio
+async def test_pkgs_can_share_file_paths(iw_manager: Manager):
+    defn = Defn('curse', 'molinari')
+
+    await iw_manager.install([defn], replace=False)
+    pkg = iw_manager.get_pkg(defn)
+    assert pkg
+    installed_files = iw_manager._get_pkg_files(pkg)
+
+    other_pkg = Pkg.parse_obj(
+        {**pkg.__dict__, 'source': 'wowi', 'id': '13188', 'folders': [{'name': 'Foo'}]}
+    )
+    with iw_manager._pkg_changes():
+        other_pkg.insert(iw_manager.database)
+        iw_manager._insert_pkg_files(
+            other_pkg, {n: (c, s) for n, (c, s, _) in installed_files.items()}
+        )
+
+    assert iw_manager._get_pkg_files(other_pkg) == installed_files
+
+    with iw_manager._pkg_changes():
+        other_pkg.delete(iw_manager.database)
+
+    assert iw_manager._get_pkg_files(pkg) == installed_files
+
+
+def test_stale_staging_folders_are_removed(iw_config: Config):
+    stale_staging_dir = iw_config.staging_dir / 'Foo-stale'
+    stale_staging_dir.mkdir(parents=True)
+    stale_time = time.time() - STAGING_GRACE_PERIOD - 1
+    os.utime(stale_staging_dir, (stale_time, stale_time))
+    staging_dir = iw_config.staging_dir / 'Foo-in-progress'
+    staging_dir.mkdir()
+
+    Manager.from_config(iw_config)
+    assert list(iw_config.staging_dir.iterdir()) == [staging_dir]
+    staging_dir.rmdir()
+
+
 @pytest.mark.asyncio
 async def test_update_lifecycle_while_varying_retain_defn_strategy(iw_manager: Manager):
     defn = Defn('curse', 'molinari')
@@ -192,6 +413,92 @@ async def test_removing_pkg_with_missing_folders(iw_manager: Manager, keep_folde
     assert not iw_manager.get_pkg(defn)
 
 
+def test_pkgs_are_loaded_in_bulk(
+    iw_manager: Manager, iw_make_pkg: Callable[..., Pkg], iw_db_activity
+):
+    pkgs = [
+        iw_make_pkg(
+            i,
+            folders=[{'name': f'Foo{i}'}, {'name': f'Foo{i}_Options'}],
+            deps=[{'id': str(i + 1)}] if i % 2 else [],
+        )
+        for i in range(500)
+    ]
+    for pkg in pkgs:
+        pkg.insert(iw_manager.database)
+
+    iw_db_activity.statements.clear()
+    row_mappings = iw_manager.database.execute(sa.select(db.pkg)).mappings().all()
+    loaded_pkgs = Pkg.from_row_mappings(iw_manager.database, row_mappings)
+    # One query for the packages and two for each of the four related tables
+    assert len(iw_db_activity.statements) == 1 + 4 * 2
+    assert [(p.id, p.folders, p.deps) for p in loaded_pkgs] == [
+        (p.id, p.folders, p.deps) for p in pkgs
+    ]
+    assert all(p.logged_versions[0].version == p.version for p in loaded_pkgs)
+
+
+def test_only_last_ten_logged_versions_are_loaded(
+    iw_manager: Manager, iw_make_pkg: Callable[..., Pkg]
+):
+    pkgs = [iw_make_pkg(i) for i in range(2)]
+    for pkg in pkgs:
+        pkg.insert(iw_manager.database)
+    iw_manager.database.execute(
+        sa.insert(db.pkg_version_log),
+        [
+            {
+                'version': f'{p.id}.{v}',
+                'install_time': datetime.datetime(2020, 1, 1 + v, tzinfo=datetime.timezone.utc),
+                'pkg_source': p.source,
+                'pkg_id': p.id,
+            }
+            for p in pkgs
+            for v in range(12)
+        ],
+    )
+
+    row_mappings = iw_manager.database.execute(sa.select(db.pkg)).mappings().all()
+    for pkg in Pkg.from_row_mappings(iw_manager.database, row_mappings):
+        assert [v.version for v in pkg.logged_versions] == [
+            pkg.version,
+            *(f'{pkg.id}.{v}' for v in range(11, 2, -1)),
+        ]
+
+
+def test_pkgs_are_looked_up_in_bulk(
+    iw_manager: Manager, iw_make_pkg: Callable[..., Pkg], iw_db_activity
+):
+    for i in range(300):
+        iw_make_pkg(i).insert(iw_manager.database)
+
+    defns = [
+        d
+        for i in range(0, 400, 2)
+        for d in (Defn('curse', str(i)), Defn('curse', f'foo-{i + 1}'), Defn('wowi', str(i)))
+    ]
+
+    iw_db_activity.statements.clear()
+    assert iw_manager.check_pkgs_exist(defns) == [
+        d.source == 'curse' and int(d.alias.rpartition('-')[2]) < 300 for d in defns
+    ]
+    # One query for every 200 definitions, staying under SQLite's
+    # historical limit of 999 parameters
+    assert [len(p) for _, p in iw_db_activity.statements] == [800, 800, 800]
+    assert [p and p.slug for p in iw_manager.get_pkgs(defns)] == [
+        f'foo-{d.alias.rpartition("-")[2]}' if e else None
+        for d, e in zip(defns, iw_manager.check_pkgs_exist(defns))
+    ]
+
+
+def test_ambiguous_pkg_lookup_is_rejected(iw_manager: Manager, iw_make_pkg: Callable[..., Pkg]):
+    iw_make_pkg(1).insert(iw_manager.database)
+    iw_make_pkg(2, slug='1').insert(iw_manager.database)
+
+    with pytest.raises(MultipleResultsFound):
+        iw_manager.get_pkg(Defn('curse', '1'))
+
+
 @pytest.mark.asyncio
 async def test_basic_search(iw_manager: Manager):
     limit = 5
@@ -273,6 +580,175 @@ async def test_get_changelog_from_web_url(iw_manager: Manager):
     ).startswith('<h3>Changes in 90100.79-Release:</h3>')
 
 
+@pytest.mark.iw_no_mock
+@pytest.mark.parametrize('pooled, expected_connections', [(True, 1), (False, 5)])
+@pytest.mark.asyncio
+async def test_pooled_web_client_reuses_connections(pooled: bool, expected_connections: int):
+    async def handle(request: web.Request):
+        return web.Response(text='foo')
+
+    app = web.Application()
+    app.router.add_get('/', handle)
+
+    connections_created = 0
+
+    async def on_connection_create_end(*args: object):
+        nonlocal connections_created
+        connections_created += 1
+
+    trace_config = TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.freeze()
+
+    async with TestServer(app) as server, init_web_client(
+        pooled=pooled, trace_configs=[trace_config]
+    ) as web_client:
+        for _ in range(5):
+            async with web_client.get(server.make_url('/')) as response:
+                assert await response.text() == 'foo'
+
+    assert connections_created == expected_connections
+
+
+@pytest.mark.parametrize('pooled', [True, False])
+@pytest.mark.asyncio
+async def test_pooled_web_client_saves_handshakes_during_update(
+    aresponses, iw_manager: Manager, tmp_path: Path, pooled: bool
+):
+    defns = [
+        Defn('curse', 'molinari'),
+        Defn('tukui', '1'),
+        Defn('github', 'nebularg/PackagerTest'),
+    ]
+    await iw_manager.install(defns, replace=False)
+    iw_manager.database.execute(sa.update(db.pkg).values(version='0'))
+    iw_manager.database.commit()
+
+    connections_created = 0
+
+    async def on_connection_create_end(*args: object):
+        nonlocal connections_created
+        connections_created += 1
+
+    trace_config = TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.freeze()
+
+    # Start from an empty cache so that every request is made again
+    manager = Manager.from_config(
+        iw_manager.config.copy(update={'temp_dir': tmp_path / 'temp'}).ensure_dirs()
+    )
+    request_count = len(aresponses.history)
+    async with init_web_client(pooled=pooled, trace_configs=[trace_config]) as web_client:
+        manager.contextualise(web_client=web_client)
+        await manager.update(defns, retain_defn_strategy=True)
+    request_count = len(aresponses.history) - request_count
+
+    if pooled:
+        assert connections_created < request_count
+    else:
+        assert connections_created == request_count
+
+
+@pytest.mark.asyncio
+async def test_cache_is_evicted_after_a_batch_of_downloads(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    evicted = threading.Event()
+    monkeypatch.setattr(iw_manager.cache_store, 'max_size', 0)
+    monkeypatch.setattr(iw_manager.cache_store, 'evict', lambda **kwargs: evicted.set())
+
+    await iw_manager.install([Defn('curse', 'molinari')], replace=False)
+    assert evicted.wait(5)
+
+
+@pytest.mark.iw_no_mock
+@pytest.mark.asyncio
+async def test_concurrent_cached_responses_share_one_request(iw_manager: Manager):
+    requests_received = 0
+
+    async def handle(request: web.Request):
+        nonlocal requests_received
+        requests_received += 1
+        await asyncio.sleep(0.01)
+        return web.json_response({'foo': 'bar'})
+
+    app = web.Application()
+    app.router.add_get('/', handle)
+
+    async with TestServer(app) as server, init_web_client() as web_client:
+        Manager.contextualise(web_client=web_client)
+        url = server.make_url('/')
+
+        responses = await asyncio.gather(
+            *(cache_response(iw_manager, url, {'minutes': 5}) for _ in range(5))
+        )
+        assert responses == [{'foo': 'bar'}] * 5
+        assert requests_received == 1
+        # Decoded responses are memoised and shared between callers
+        assert await cache_response(iw_manager, url, {'minutes': 5}) is responses[0]
+        assert requests_received == 1
+
+        # Responses are read from disk in a new manager
+        new_manager = Manager(iw_manager.config, iw_manager.database)
+        assert await cache_response(new_manager, url, {'minutes': 5}) == {'foo': 'bar'}
+        assert requests_received == 1
+
+
+@pytest.mark.iw_no_mock
+@pytest.mark.parametrize(
+    'validator_headers',
+    [
+        {'ETag': '"foo"'},
+        {'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+    ],
+)
+@pytest.mark.asyncio
+async def test_expired_responses_are_revalidated(
+    iw_manager: Manager, validator_headers: dict[str, str]
+):
+    body = 'foo' * 1000
+
+    async def handle(request: web.Request):
+        if any(
+            request.headers.get(r) == validator_headers.get(v)
+            for r, v in [('If-None-Match', 'ETag'), ('If-Modified-Since', 'Last-Modified')]
+            if r in request.headers
+        ):
+            return web.Response(status=304, headers=validator_headers)
+        return web.json_response(body, headers=validator_headers)
+
+    app = web.Application()
+    app.router.add_get('/', handle)
+
+    bytes_received = 0
+
+    async def on_response_chunk_received(
+        session: object,
+        ctx: object,
+        params: _deferred_types.aiohttp.TraceResponseChunkReceivedParams,
+    ):
+        nonlocal bytes_received
+        bytes_received += len(params.chunk)
+
+    trace_config = TraceConfig()
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    trace_config.freeze()
+
+    async with TestServer(app) as server, init_web_client(
+        trace_configs=[trace_config]
+    ) as web_client:
+        Manager.contextualise(web_client=web_client)
+        url = server.make_url('/')
+
+        assert await cache_response(iw_manager, url, {'seconds': 0}) == body
+        assert bytes_received > len(body)
+
+        bytes_received = 0
+        assert await cache_response(iw_manager, url, {'seconds': 0}) == body
+        assert bytes_received == 0
+
+
 @pytest.mark.iw_no_mock
 @pytest.mark.asyncio
 async def test_is_outdated_works_in_variety_of_scenarios(
@@ -356,3 +832,222 @@ async def test_is_outdated_works_in_variety_of_scenarios(
             {'info': {'version': '1.0.0'}},
         )
         assert await is_outdated() == (False, '1.0.0')
+
+
+def test_database_is_configured_for_concurrent_access(iw_manager: Manager):
+    assert iw_manager.database.execute(sa.text('PRAGMA journal_mode')).scalar() == 'wal'
+    # NORMAL
+    assert iw_manager.database.execute(sa.text('PRAGMA synchronous')).scalar() == 1
+
+
+def test_database_migration_indexes_pkg_foreign_keys(iw_manager: Manager):
+    engine = iw_manager.database.engine
+    alembic_config = alembic.config.Config()
+    alembic_config.set_main_option('script_location', 'instawow:migrations')
+    alembic_config.set_main_option('sqlalchemy.url', str(engine.url))
+    alembic.command.downgrade(alembic_config, 'a3b1c7d90e2f')
+    assert not sa.inspect(engine).get_indexes('pkg_folder')
+
+    migrate_database(engine)
+    assert (
+        iw_manager.database.execute(sa.text('SELECT version_num FROM alembic_version')).scalar()
+        == DB_REVISION
+    )
+    assert {
+        (t, tuple(i['column_names']))
+        for t in ['pkg', 'pkg_folder', 'pkg_dep', 'pkg_version_log', 'pkg_file']
+        for i in sa.inspect(engine).get_indexes(t)
+    } == {
+        ('pkg', ('slug',)),
+        ('pkg_folder', ('pkg_source', 'pkg_id')),
+        ('pkg_dep', ('pkg_source', 'pkg_id')),
+        ('pkg_version_log', ('pkg_source', 'pkg_id', 'install_time')),
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_changes_are_committed_together(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager, iw_db_activity
+):
+    # The WoWI fixture is also Molinari
+    defns = [Defn('curse', 'molinari'), Defn('wowi', '13188'), Defn('tukui', '1')]
+
+    # Archives are only applied once they've all been downloaded
+    downloaded = 0
+    all_downloaded = asyncio.Event()
+
+    async def download_pkg_archive(manager: Manager, pkg: Pkg):
+        nonlocal downloaded
+        archive = await _download_pkg_archive(manager, pkg)
+        downloaded += 1
+        if downloaded == len(defns):
+            all_downloaded.set()
+        await all_downloaded.wait()
+        return archive
+
+    monkeypatch.setattr('instawow.manager._download_pkg_archive', download_pkg_archive)
+
+    results = await iw_manager.install(defns, False)
+    # Whichever of Molinari's archives is applied first wins
+    assert {type(results[defns[0]]), type(results[defns[1]])} == {
+        R.PkgInstalled,
+        R.PkgConflictsWithInstalled,
+    }
+    assert type(results[defns[2]]) is R.PkgInstalled
+    assert iw_db_activity.commits == 1
+
+    results = await iw_manager.remove(defns, False)
+    assert [type(r) for r in results.values()].count(R.PkgRemoved) == 2
+    assert iw_db_activity.commits == 2
+
+
+@pytest.mark.asyncio
+async def test_changes_are_committed_while_downloads_are_pending(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    defns = [Defn('curse', 'molinari'), Defn('tukui', '1')]
+
+    loop = asyncio.get_running_loop()
+    checkpointed = asyncio.Event()
+    checkpoint = iw_manager._checkpoint
+
+    def checkpoint_and_notify():
+        checkpoint()
+        loop.call_soon_threadsafe(checkpointed.set)
+
+    monkeypatch.setattr(iw_manager, '_checkpoint', checkpoint_and_notify)
+
+    # Tukui is only downloaded after Molinari has been applied
+    async def download_pkg_archive(manager: Manager, pkg: Pkg):
+        if pkg.source == 'tukui':
+            await asyncio.wait_for(checkpointed.wait(), 10)
+            assert iw_manager._uncommitted_pkg_changes is None
+            with iw_manager.database.engine.connect() as connection:
+                assert connection.execute(sa.select(db.pkg.c.slug)).scalars().all() == ['molinari']
+        return await _download_pkg_archive(manager, pkg)
+
+    monkeypatch.setattr('instawow.manager._download_pkg_archive', download_pkg_archive)
+
+    results = await iw_manager.install(defns, False)
+    assert [type(r) for r in results.values()] == [R.PkgInstalled, R.PkgInstalled]
+
+
+@pytest.mark.asyncio
+async def test_outermost_unit_of_work_is_rolled_back_on_error(
+    iw_manager: Manager, iw_make_pkg: Callable[..., Pkg]
+):
+    pkg = iw_make_pkg(1)
+
+    with pytest.raises(ValueError), iw_manager._unit_of_work():
+        with iw_manager._pkg_changes():
+            pkg.insert(iw_manager.database)
+        raise ValueError
+
+    assert iw_manager._uncommitted_pkg_changes is None
+    assert iw_manager.database.execute(sa.select(db.pkg)).all() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_pkg_changes_are_rolled_back(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    defn = Defn('curse', 'molinari')
+    versioned_defn = defn.with_version('80000.57-Release')
+
+    await iw_manager.install([versioned_defn], False)
+
+    def insert_pkg_files(pkg: Pkg, file_manifest: dict[str, tuple[int, int]]):
+        raise ValueError
+
+    monkeypatch.setattr(iw_manager, '_insert_pkg_files', insert_pkg_files)
+
+    results = await iw_manager.update([defn], True)
+    assert type(results[defn]) is R.InternalError
+
+    with iw_manager.database.engine.connect() as connection:
+        assert connection.execute(sa.select(db.pkg.c.version)).scalars().all() == [
+            '80000.57-Release'
+        ]
+        assert connection.execute(sa.select(sa.func.count()).select_from(db.pkg_file)).scalar()
+
+
+def _make_catalogue_entry(id_: str, download_count: int):
+    return CatalogueEntry(
+        source='curse',
+        id=id_,
+        slug=f'foo-{id_}',
+        name=f'Foo {id_}',
+        game_flavours=set(Flavour),
+        folders=[{f'Foo{id_}'}],
+        download_count=download_count,
+        last_updated=datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc),
+        derived_download_score=download_count / 4,
+    )
+
+
+@pytest.mark.asyncio
+async def test_superseded_catalogue_is_closed(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager
+):
+    catalogue = await iw_manager.synchronise()
+    assert await iw_manager.synchronise() is catalogue
+
+    # The catalogue is only replaced if it's changed since it was loaded
+    monkeypatch.setattr(iw_manager, '_catalogue_expires_at', 0)
+    assert await iw_manager.synchronise() is catalogue
+
+    monkeypatch.setattr(iw_manager, '_catalogue_expires_at', 0)
+    monkeypatch.setattr(iw_manager, '_catalogue_key', '')
+    new_catalogue = await iw_manager.synchronise()
+    assert new_catalogue is not catalogue
+    assert len(new_catalogue)
+    with pytest.raises(ValueError, match='released'):
+        len(catalogue)
+
+
+@pytest.mark.iw_no_mock
+@pytest.mark.asyncio
+@pytest.mark.parametrize('is_patchable', [True, False])
+async def test_catalogue_is_patched_from_delta(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    aresponses,
+    iw_manager: Manager,
+    is_patchable: bool,
+):
+    base_entries = [_make_catalogue_entry('1', 1), _make_catalogue_entry('2', 4)]
+    patch = CatalogueDeltaPatch(
+        base_version='',
+        version='',
+        upserted=[_make_catalogue_entry('2', 4), _make_catalogue_entry('3', 2)],
+        removed=[('curse', '1')],
+    )
+    raw_base_catalogue = Catalogue.parse_obj(base_entries).json(separators=(',', ':'))
+    raw_catalogue = Catalogue.parse_obj(patch.apply(base_entries)).json(separators=(',', ':'))
+    patch.base_version = shasum(raw_base_catalogue) if is_patchable else 'too-old'
+    patch.version = shasum(raw_catalogue)
+
+    # The cache is otherwise shared between tests
+    monkeypatch.setattr(
+        iw_manager, 'cache_store', CacheStore(tmp_path / 'cache', iw_manager.config.cache_max_size)
+    )
+    iw_manager.cache_store.cache_dir.mkdir()
+    iw_manager.cache_store.put_bytes('catalogue', CATALOGUE_URL.name, raw_base_catalogue.encode())
+    aresponses.add(
+        CATALOGUE_DELTA_URL.host,
+        CATALOGUE_DELTA_URL.path,
+        'get',
+        aresponses.Response(body=f'[{patch.json()}]', content_type='application/json'),
+    )
+    if not is_patchable:
+        aresponses.add(
+            CATALOGUE_URL.host,
+            CATALOGUE_URL.path,
+            'get',
+            aresponses.Response(body=raw_catalogue, content_type='application/json'),
+        )
+
+    catalogue = await iw_manager.synchronise()
+    assert [(e.id, e.derived_download_score) for e in catalogue] == [('2', 1), ('3', 0.5)]
+    assert iw_manager.cache_store.get('catalogue', CATALOGUE_URL.name).read_text() == raw_catalogue
+    aresponses.assert_plan_strictly_followed()
@@ -62,6 +62,34 @@ async def test_reconcile_invalid_addons_discarded(iw_manager: Manager, invalid_a
     assert await match_folder_name_subsets(iw_manager, folders) == []
 
 
+def test_reconcile_unchanged_tocs_are_read_from_cache(
+    monkeypatch: pytest.MonkeyPatch, iw_manager: Manager, molinari: Path
+):
+    write_addons(iw_manager, 'foo', 'bar')
+    assert sorted(get_unreconciled_folder_set(iw_manager)) == ['Molinari', 'bar', 'foo']
+
+    read_tocs: list[str] = []
+    from_addon_path = TocReader.from_addon_path
+
+    def record_read(path: Path, suffix: str = '.toc'):
+        read_tocs.append(path.name)
+        return from_addon_path(path, suffix)
+
+    monkeypatch.setattr(TocReader, 'from_addon_path', record_read)
+
+    folders = get_unreconciled_folder_set(iw_manager)
+    assert read_tocs == []
+    (molinari_folder,) = (f for f in folders if f.name == 'Molinari')
+    assert molinari_folder.defns_from_toc == {Defn('curse', '20338'), Defn('wowi', '13188')}
+
+    (molinari / 'Molinari.toc').write_text('## X-Curse-Project-ID: 20338\n')
+    (molinari_folder,) = (
+        f for f in get_unreconciled_folder_set(iw_manager) if f.name == 'Molinari'
+    )
+    assert read_tocs == ['Molinari']
+    assert molinari_folder.defns_from_toc == {Defn('curse', '20338')}
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     'test_func',
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import time
+
+import pytest
+
+from instawow.manager import init_web_client
+from instawow.request_scheduler import (
+    RequestPriority,
+    RequestScheduler,
+    get_request_scheduler,
+    parse_rate_limit_delay,
+    schedule_request,
+)
+
+
+def test_parse_rate_limit_delay():
+    assert parse_rate_limit_delay({'Retry-After': '120'}) == 120
+    retry_at = datetime.now(timezone.utc) + timedelta(minutes=2)
+    assert 110 < parse_rate_limit_delay({'Retry-After': format_datetime(retry_at)}) <= 120
+    assert (
+        55
+        < parse_rate_limit_delay(
+            {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 60)}
+        )
+        <= 60
+    )
+    assert parse_rate_limit_delay({'X-RateLimit-Remaining': '1'}) is None
+    assert parse_rate_limit_delay({'Retry-After': 'foo'}) is None
+
+
+@pytest.mark.asyncio
+async def test_requests_are_admitted_in_order_of_priority():
+    request_scheduler = RequestScheduler()
+    request_scheduler.max_concurrency = 1
+    queue = request_scheduler._queues['example.com']
+
+    await request_scheduler._acquire(queue, RequestPriority.interactive)
+    admitted: list[str] = []
+
+    async def acquire(label: str, priority: RequestPriority):
+        await request_scheduler._acquire(queue, priority)
+        admitted.append(label)
+        request_scheduler._release(queue)
+
+    tasks = [
+        asyncio.create_task(acquire('background', RequestPriority.background)),
+        asyncio.create_task(acquire('interactive', RequestPriority.interactive)),
+    ]
+    await asyncio.sleep(0)
+    assert admitted == []
+    request_scheduler._release(queue)
+    await asyncio.gather(*tasks)
+    assert admitted == ['interactive', 'background']
+
+
+@pytest.mark.asyncio
+async def test_requests_are_admitted_at_rate():
+    request_scheduler = RequestScheduler()
+    request_scheduler.rate = 20.0
+    request_scheduler.burst = 2
+    queue = request_scheduler._queues['example.com']
+
+    start = time.monotonic()
+    for _ in range(4):
+        await request_scheduler._acquire(queue, RequestPriority.interactive)
+        request_scheduler._release(queue)
+    # Two requests are made straight away and the other two 50 ms apart
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.iw_no_mock
+@pytest.mark.asyncio
+async def test_failed_requests_are_retried():
+    from aiohttp import ClientResponseError, web
+    from aiohttp.test_utils import TestServer
+
+    statuses = [503, 429, 200]
+
+    async def handle(request: web.Request):
+        status = statuses.pop(0)
+        return web.json_response(
+            {'status': status},
+            status=status,
+            headers={'Retry-After': '0'} if status == 429 else {},
+        )
+
+    app = web.Application()
+    app.router.add_get('/', handle)
+
+    async with TestServer(app) as server, init_web_client() as web_client:
+        get_request_scheduler(web_client).retry_base_delay = 0.01
+        async with schedule_request(
+            web_client, 'GET', server.make_url('/'), raise_for_status=True
+        ) as response:
+            assert await response.json() == {'status': 200}
+        assert not statuses
+
+        statuses[:] = [500] * 4
+        with pytest.raises(ClientResponseError) as exc_info:
+            async with schedule_request(
+                web_client, 'GET', server.make_url('/'), raise_for_status=True
+            ):
+                pass
+        assert exc_info.value.status == 500
+        assert not statuses
@@ -171,3 +171,86 @@ def test_table_key_overrides():
         2: 4,
         5: 6,
     }
+
+
+def test_decode_large_saved_variables():
+    def make_aura(i: int):
+        custom_text = (
+            r'function(event, ...)\n    if event == \"UNIT_AURA\" then\n'
+            r'        return UnitExists(...)\n    end\nend\n'
+        ) * (i % 5)
+        return f'''\
+		["Aura {i}"] = {{
+			["id"] = "Aura {i}",
+			["uid"] = "u{i:010x}",
+			["regionType"] = "icon",
+			["xOffset"] = -12.5,
+			["yOffset"] = {i % 100},
+			["load"] = {{
+				["class"] = {{
+					["multi"] = {{
+					}},
+				}},
+				["use_never"] = false,
+			}},
+			["color"] = {{
+				1, -- [1]
+				0.5, -- [2]
+				0, -- [3]
+				1, -- [4]
+			}},
+			["triggers"] = {{
+				{{
+					["trigger"] = {{
+						["type"] = "aura2",
+						["auranames"] = {{
+							"Renew", -- [1]
+							"139", -- [2]
+						}},
+						["unit"] = "player",
+					}},
+					["untrigger"] = {{
+					}},
+				}}, -- [1]
+				["activeTriggerMode"] = -10,
+			}},
+			["customText"] = "{custom_text}",
+			["url"] = "https://wago.io/abc{i}/1",
+			["version"] = {i},
+		}},
+'''
+
+    # Saved variables in the shape of WeakAuras'
+    aura_count = 1_000
+    saved_variables = (
+        '{\n\t["displays"] = {\n'
+        + ''.join(map(make_aura, range(aura_count)))
+        + '\t},\n\t["login_squelch_time"] = 10,\n}\n'
+    )
+
+    decoded = decode(saved_variables)
+
+    assert decoded['login_squelch_time'] == 10
+    assert len(decoded['displays']) == aura_count
+    assert decoded['displays']['Aura 1'] == {
+        'id': 'Aura 1',
+        'uid': 'u0000000001',
+        'regionType': 'icon',
+        'xOffset': -12.5,
+        'yOffset': 1,
+        'load': {'class': {'multi': {}}, 'use_never': False},
+        'color': [1, 0.5, 0, 1],
+        'triggers': {
+            1: {
+                'trigger': {'type': 'aura2', 'auranames': ['Renew', '139'], 'unit': 'player'},
+                'untrigger': {},
+            },
+            'activeTriggerMode': -10,
+        },
+        'customText': (
+            r'function(event, ...)\n    if event == "UNIT_AURA" then\n'
+            r'        return UnitExists(...)\n    end\nend\n'
+        ),
+        'url': 'https://wago.io/abc1/1',
+        'version': 1,
+    }
@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 from itertools import product
 from pathlib import Path
+import random
 import sys
 import time
 
@@ -10,9 +11,11 @@ import pytest
 
 from instawow.manager import find_addon_zip_base_dirs, make_zip_member_filter
 from instawow.utils import (
+    DisjointSet,
     TocReader,
     bucketise,
     file_uri_to_path,
+    merge_async_iterables,
     merge_intersecting_sets,
     run_in_thread,
     tabulate,
@@ -118,6 +121,82 @@ def test_merge_intersecting_sets_in_noncontiguous_collection():
     assert sorted(merge_intersecting_sets(collection)) == output
 
 
+def test_disjoint_set_groups_elements_in_insertion_order():
+    disjoint_set = DisjointSet[str]()
+    disjoint_set.union('a', 'b')
+    disjoint_set.union('c')
+    disjoint_set.union('d', 'e', 'b')
+    assert disjoint_set.find('e') == disjoint_set.find('a')
+    assert disjoint_set.find('c') == 'c'
+    assert sorted(disjoint_set.groups().values()) == [['a', 'b', 'd', 'e'], ['c']]
+
+
+def _merge_intersecting_sets_naively(collection: list[set[int]]):
+    merged: list[set[int]] = []
+    for set_ in collection:
+        overlapping = [m for m in merged if not m.isdisjoint(set_)]
+        merged = [m for m in merged if m.isdisjoint(set_)]
+        merged.append(set_.union(*overlapping))
+    return sorted(map(sorted, merged))
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_merge_intersecting_sets_properties(seed: int):
+    random_ = random.Random(seed)
+    collection = [
+        set(random_.sample(range(200), random_.randint(0, 4)))
+        for _ in range(random_.randint(0, 100))
+    ]
+    merged = list(merge_intersecting_sets(collection))
+
+    # The merged sets are the same as those of a naive merge
+    assert sorted(map(sorted, merged)) == _merge_intersecting_sets_naively(collection)
+    # Every element is in exactly one non-empty merged set
+    non_empty_merged = [m for m in merged if m]
+    assert sum(map(len, non_empty_merged)) == len(frozenset().union(*collection))
+    # Every input set is contained by a merged set
+    assert all(any(s <= m for m in merged) for s in collection)
+
+    disjoint_set = DisjointSet[int]()
+    for set_ in collection:
+        if set_:
+            disjoint_set.union(*set_)
+    components = disjoint_set.components()
+    assert sorted(map(sorted, set(components.values()))) == sorted(map(sorted, non_empty_merged))
+    assert all(e in components[e] for e in components)
+    assert all(components[e] is components[next(iter(s))] for s in collection for e in s)
+
+
+def test_merge_intersecting_sets_scales_linearly():
+    operation_count = 0
+
+    class Element(int):
+        def __hash__(self):
+            nonlocal operation_count
+            operation_count += 1
+            return super().__hash__()
+
+        def __eq__(self, other: object):
+            nonlocal operation_count
+            operation_count += 1
+            return super().__eq__(other)
+
+        def __ne__(self, other: object):
+            return not self == other
+
+    # Ten thousand sets which make up a thousand groups, the members of
+    # which are spread out; merging these pairwise takes a quadratic number
+    # of operations
+    collection = [{Element(i), Element(i + 1_000)} for i in range(9_000)] + [
+        {Element(i)} for i in range(9_000, 10_000)
+    ]
+    operation_count = 0
+    merged = list(merge_intersecting_sets(collection))
+    # Elements are hashed and compared a constant number of times on average
+    assert operation_count < 50 * len(collection)
+    assert set(merged) == {frozenset(range(i, 10_000, 1_000)) for i in range(1_000)}
+
+
 @pytest.mark.skipif(sys.platform == 'win32', reason='platform dependent')
 def test_file_uri_to_path_posix_leading_slash_is_preserved():
     uri = Path('/foo/bar').as_uri()
@@ -146,3 +225,32 @@ async def test_generator_in_run_in_thread_does_not_lock_up_loop():
         ['bar'],
         ['foo'],
     ]
+
+
+@pytest.mark.asyncio
+async def test_merge_async_iterables_interleaves_items():
+    async def foo():
+        yield 'foo'
+        await asyncio.sleep(0.1)
+        yield 'foo'
+
+    async def bar():
+        await asyncio.sleep(0.05)
+        yield 'bar'
+
+    assert [i async for i in merge_async_iterables([foo(), bar()])] == ['foo', 'bar', 'foo']
+
+
+@pytest.mark.asyncio
+async def test_merge_async_iterables_propagates_errors():
+    async def foo():
+        yield 'foo'
+        raise ValueError
+
+    async def bar():
+        await asyncio.sleep(10)
+        yield 'bar'
+
+    with pytest.raises(ValueError):
+        async for _ in merge_async_iterables([foo(), bar()]):
+            pass